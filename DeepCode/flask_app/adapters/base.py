@@ -1,6 +1,7 @@
 # adapters/base.py
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional, Tuple
 
 class ModelAdapter(ABC):
     """
@@ -22,6 +23,72 @@ class ModelAdapter(ABC):
         """
         raise NotImplementedError
 
+    async def agenerate(
+        self,
+        prompt: str,
+        max_tokens: int = 256,
+        temperature: float = 0.0,
+        **kwargs,
+    ) -> str:
+        """
+        Async counterpart of generate().
+        Adapters without a native async client run generate() in a worker thread.
+        """
+        return await asyncio.to_thread(
+            self.generate, prompt, max_tokens=max_tokens, temperature=temperature, **kwargs
+        )
+
+    def generate_with_model(
+        self,
+        prompt: str,
+        max_tokens: int = 256,
+        temperature: float = 0.0,
+        **kwargs,
+    ) -> Tuple[str, Optional[str]]:
+        """
+        generate(), also returning the model that produced the text.
+        Routing adapters override this when a request can be answered by another backend.
+        """
+        return self.generate(prompt, max_tokens=max_tokens, temperature=temperature, **kwargs), getattr(self, "model", None)
+
+    async def agenerate_with_model(
+        self,
+        prompt: str,
+        max_tokens: int = 256,
+        temperature: float = 0.0,
+        **kwargs,
+    ) -> Tuple[str, Optional[str]]:
+        """Async counterpart of generate_with_model()."""
+        out = await self.agenerate(prompt, max_tokens=max_tokens, temperature=temperature, **kwargs)
+        return out, getattr(self, "model", None)
+
+    @property
+    def cache_identity(self) -> Optional[str]:
+        """
+        What cached responses are keyed on. A single backend uses its model; routing
+        adapters, whose answer may come from any of several models, name their configuration.
+        """
+        return getattr(self, "model", None)
+
+    def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 256,
+        temperature: float = 0.0,
+        **kwargs,
+    ) -> Iterator[str]:
+        """
+        Yield generated text in chunks as they arrive.
+        Adapters without native streaming yield the full generate() result once.
+        """
+        yield self.generate(prompt, max_tokens=max_tokens, temperature=temperature, **kwargs)
+
+    def warm_up(self) -> None:
+        """
+        Load SDKs and build clients ahead of the first request.
+        Safe to call from a background thread; the default has nothing to load.
+        """
+
     @abstractmethod
     def info(self) -> Dict[str, Any]:
         """
@@ -0,0 +1,168 @@
+# adapters/cascade.py
+"""
+Model cascade: answer with the cheapest tier that does the job.
+
+A prompt classifier (length and structure only, no model call) picks the starting
+tier: short, plain prompts go to the fast model, long or structured ones (code,
+multi-part instructions, large inputs) start at the larger one. If a tier errors
+or its answer fails the confidence/format check, the prompt escalates to the next
+tier. Every answer is counted per tier in /api/metrics for threshold tuning.
+
+Configure with MODEL_CASCADE, cheapest tier first, same entry syntax as MODEL_BACKENDS:
+    MODEL_CASCADE="gemini:gemini-1.5-flash,gemini:gemini-1.5-pro"
+"""
+import os
+import re
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from .base import ModelAdapter
+from services.metrics_service import metrics
+from services.token_service import count_tokens, context_window
+
+# Prompts above this many (estimated) tokens skip the fast tier
+CASCADE_SIMPLE_MAX_TOKENS = int(os.getenv("CASCADE_SIMPLE_MAX_TOKENS", "200"))
+CASCADE_SIMPLE_MAX_LINES = int(os.getenv("CASCADE_SIMPLE_MAX_LINES", "8"))
+
+_COMPLEX_MARKERS = re.compile(
+    r"```|\b(step[- ]by[- ]step|prove|derive|analy[sz]e|compare|refactor|implement|debug|"
+    r"write (a|an|the) (function|class|program|script|essay))\b",
+    re.IGNORECASE,
+)
+_HEDGES = re.compile(
+    r"\b(i'?m not sure|i am not sure|i don'?t know|i cannot|i can'?t (help|answer)|as an ai|"
+    r"i'?m unable|i am unable)\b",
+    re.IGNORECASE,
+)
+_WANTS_JSON = re.compile(r"\bjson\b", re.IGNORECASE)
+_FENCE = re.compile(r"^```[a-zA-Z]*\n|\n?```$")
+
+def classify(prompt: str) -> Tuple[str, str]:
+    """Return ("simple" | "complex", reason) from prompt length and structure."""
+    if count_tokens(prompt) > CASCADE_SIMPLE_MAX_TOKENS:
+        return "complex", "long"
+    if prompt.count("\n") >= CASCADE_SIMPLE_MAX_LINES:
+        return "complex", "multiline"
+    if _COMPLEX_MARKERS.search(prompt):
+        return "complex", "structure"
+    return "simple", "short"
+
+def check_answer(prompt: str, answer: Optional[str]) -> Optional[str]:
+    """Return why the answer should be escalated, or None if it is acceptable."""
+    text = (answer or "").strip()
+    if not text:
+        return "empty"
+    if _HEDGES.search(text[:300]):
+        return "low_confidence"
+    if text.count("```") % 2:
+        return "truncated"
+    if _WANTS_JSON.search(prompt):
+        try:
+            json.loads(_FENCE.sub("", text))
+        except ValueError:
+            return "format"
+    return None
+
+class CascadeAdapter(ModelAdapter):
+    def __init__(self, tiers: List[Tuple[str, ModelAdapter]]):
+        if not tiers:
+            raise ValueError("CascadeAdapter needs at least one tier")
+        self.tiers = list(tiers)
+
+    @property
+    def model(self):
+        # validation uses the most capable tier
+        return self.tiers[-1][1].model
+
+    @property
+    def cache_identity(self):
+        # any tier may answer, so cached answers are keyed on the whole cascade
+        return "cascade:" + ",".join(name for name, _ in self.tiers)
+
+    def start_tier(self, prompt: str, max_tokens: int) -> Tuple[int, str]:
+        kind, reason = classify(prompt)
+        if kind == "simple" and len(self.tiers) > 1:
+            fast_model = self.tiers[0][1].model
+            if count_tokens(prompt) + max_tokens > context_window(fast_model):
+                return 1, "context"
+            return 0, reason
+        return min(1, len(self.tiers) - 1), reason
+
+    def _answered(self, index: int, reason: str):
+        metrics.inc("cascade_answers_total", help="Generations answered per cascade tier",
+                    tier=self.tiers[index][0], start_reason=reason)
+
+    def _escalated(self, index: int, why: str):
+        metrics.inc("cascade_escalations_total", help="Cascade escalations to the next tier",
+                    tier=self.tiers[index][0], reason=why)
+
+    def generate(self, prompt, max_tokens=256, temperature=0.0):
+        return self.generate_with_model(prompt, max_tokens=max_tokens, temperature=temperature)[0]
+
+    def generate_with_model(self, prompt, max_tokens=256, temperature=0.0):
+        start, reason = self.start_tier(prompt, max_tokens)
+        last_error = None
+        for index in range(start, len(self.tiers)):
+            final = index == len(self.tiers) - 1
+            try:
+                answer, model = self.tiers[index][1].generate_with_model(
+                    prompt, max_tokens=max_tokens, temperature=temperature)
+            except Exception as e:
+                last_error = e
+                if not final:
+                    self._escalated(index, "error")
+                continue
+            why = None if final else check_answer(prompt, answer)
+            if why is None:
+                self._answered(index, reason)
+                return answer, model
+            self._escalated(index, why)
+        raise RuntimeError(f"All cascade tiers failed: {last_error}")
+
+    async def agenerate(self, prompt, max_tokens=256, temperature=0.0):
+        return (await self.agenerate_with_model(prompt, max_tokens=max_tokens, temperature=temperature))[0]
+
+    async def agenerate_with_model(self, prompt, max_tokens=256, temperature=0.0):
+        start, reason = self.start_tier(prompt, max_tokens)
+        last_error = None
+        for index in range(start, len(self.tiers)):
+            final = index == len(self.tiers) - 1
+            try:
+                answer, model = await self.tiers[index][1].agenerate_with_model(
+                    prompt, max_tokens=max_tokens, temperature=temperature)
+            except Exception as e:
+                last_error = e
+                if not final:
+                    self._escalated(index, "error")
+                continue
+            why = None if final else check_answer(prompt, answer)
+            if why is None:
+                self._answered(index, reason)
+                return answer, model
+            self._escalated(index, why)
+        raise RuntimeError(f"All cascade tiers failed: {last_error}")
+
+    def generate_stream(self, prompt, max_tokens=256, temperature=0.0):
+        """Streams go to the classified tier without escalation (chunks are already sent)."""
+        index, reason = self.start_tier(prompt, max_tokens)
+        self._answered(index, reason)
+        yield from self.tiers[index][1].generate_stream(prompt, max_tokens=max_tokens, temperature=temperature)
+
+    def warm_up(self):
+        for _, adapter in self.tiers:
+            adapter.warm_up()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "backend": "cascade",
+            "configured": True,
+            "tiers": {name: adapter.info() for name, adapter in self.tiers},
+            "simple_max_tokens": CASCADE_SIMPLE_MAX_TOKENS,
+        }
+
+def build_cascade(spec: str, api_key=None, api_key_file=None) -> CascadeAdapter:
+    """Build a cascade from "kind:model[@base_url],..." ordered cheapest first."""
+    from .registry import build_adapter
+    entries = [part.strip() for part in spec.split(",") if part.strip()]
+    return CascadeAdapter([(entry, build_adapter(entry, api_key, api_key_file)) for entry in entries])
@@ -0,0 +1,267 @@
+# adapters/dispatch.py
+"""
+Resolve the Gemini generation entrypoint once and reuse model handles.
+
+The candidate order mirrors what probe_generate.py explores, but resolution only
+inspects module attributes, so it never makes a network call. The winning plan is
+saved to a small JSON manifest; later processes (and probe_generate.py, which can
+verify a plan with a real call) load it instead of probing again.
+
+The manifest lives in the per-user cache directory, not in the source tree; set
+GEMINI_DISPATCH_MANIFEST to put it elsewhere (e.g. a writable volume in a container).
+"""
+import os
+import json
+import asyncio
+import time
+import threading
+import importlib
+import logging
+import concurrent.futures
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MANIFEST_PATH = os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "deepcode", "gemini_dispatch.json",
+)
+
+# Candidate entrypoints in preference order: (sdk module, entrypoint name). Each must be
+# checkable from attributes alone; google.generativeai.get_model() is not (it fetches model
+# metadata over the network, and what it returns has no generate_content).
+ENTRYPOINTS = (
+    ("google.generativeai", "GenerativeModel.generate_content"),
+    ("google.genai", "Client.models.generate_content"),
+    ("google.genai", "generate_text"),
+)
+
+_plan: Optional[Dict[str, Any]] = None
+# Threads for entrypoints without their own timeout (see _within)
+_untimed_pool = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.getenv("GEMINI_UNTIMED_WORKERS", "8")), thread_name_prefix="gemini-untimed")
+_plan_lock = threading.Lock()
+
+
+def manifest_path() -> str:
+    return os.getenv("GEMINI_DISPATCH_MANIFEST", DEFAULT_MANIFEST_PATH)
+
+
+def _try_import(name: str):
+    try:
+        return importlib.import_module(name)
+    except Exception:
+        return None
+
+
+def _supports(module, entrypoint: str) -> bool:
+    if entrypoint == "GenerativeModel.generate_content":
+        return hasattr(getattr(module, "GenerativeModel", None), "generate_content")
+    if entrypoint == "Client.models.generate_content":
+        return hasattr(module, "Client")
+    if entrypoint == "generate_text":
+        return hasattr(module, "generate_text")
+    return False
+
+
+def _sdk_version(module) -> Optional[str]:
+    return getattr(module, "__version__", None)
+
+
+def load_manifest(path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Return the saved plan if it still matches the installed SDK, else None."""
+    path = path or manifest_path()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            plan = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (plan.get("sdk"), plan.get("entrypoint")) not in ENTRYPOINTS:
+        return None
+    module = _try_import(plan["sdk"])
+    if module is None or not _supports(module, plan["entrypoint"]):
+        return None
+    if plan.get("sdk_version") != _sdk_version(module):
+        return None
+    return plan
+
+
+def save_manifest(plan: Dict[str, Any], path: Optional[str] = None):
+    """Write the plan atomically; a read-only filesystem only costs a re-probe next start."""
+    path = path or manifest_path()
+    tmp = f"{path}.tmp"
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(plan, f, indent=2)
+        os.replace(tmp, path)
+    except OSError:
+        logger.warning("Could not write dispatch manifest to %s", path)
+
+
+def probe_plan(preferred_sdk: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Inspect installed SDKs (attributes only) and return the first usable plan."""
+    for sdk, entrypoint in ENTRYPOINTS:
+        if preferred_sdk and sdk != preferred_sdk:
+            continue
+        module = _try_import(sdk)
+        if module is not None and _supports(module, entrypoint):
+            return {
+                "sdk": sdk,
+                "entrypoint": entrypoint,
+                "sdk_version": _sdk_version(module),
+                "resolved_at": time.time(),
+                "verified": False,
+            }
+    return None
+
+
+def resolve_plan(refresh: bool = False, path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Return the process-wide dispatch plan, resolving it at most once.
+    Loads the manifest when valid, otherwise probes and saves the result.
+    """
+    global _plan
+    if _plan is not None and not refresh:
+        return _plan
+    with _plan_lock:
+        if _plan is not None and not refresh:
+            return _plan
+        plan = None if refresh else load_manifest(path)
+        if plan is None:
+            plan = probe_plan()
+            if plan is not None:
+                save_manifest(plan, path)
+        _plan = plan
+        return plan
+
+
+def configure_sdk(plan: Dict[str, Any], api_key: Optional[str]):
+    """Apply the API key to SDKs that use module-level configuration."""
+    module = importlib.import_module(plan["sdk"])
+    if api_key and plan["sdk"] == "google.generativeai" and hasattr(module, "configure"):
+        module.configure(api_key=api_key)
+    return module
+
+
+def build_handle(plan: Dict[str, Any], model: str, api_key: Optional[str] = None):
+    """Create the reusable object the plan's entrypoint is called on."""
+    module = importlib.import_module(plan["sdk"])
+    entrypoint = plan["entrypoint"]
+    if entrypoint == "GenerativeModel.generate_content":
+        return module.GenerativeModel(model)
+    if entrypoint == "Client.models.generate_content":
+        return module.Client(api_key=api_key) if api_key else module.Client()
+    return module
+
+
+def _request_options(timeout: Optional[float]) -> Dict[str, Any]:
+    """Per-call timeout for google.generativeai (seconds)."""
+    return {"request_options": {"timeout": timeout}} if timeout else {}
+
+
+def _genai_config(max_tokens: int, temperature: float, timeout: Optional[float]) -> Dict[str, Any]:
+    """GenerateContentConfig for google.genai; its HTTP timeout is in milliseconds."""
+    config = {"max_output_tokens": max_tokens, "temperature": temperature}
+    if timeout:
+        config["http_options"] = {"timeout": int(timeout * 1000)}
+    return config
+
+
+def _within(timeout: Optional[float], fn: Callable[..., Any], *args, **kwargs):
+    """
+    Call fn but stop waiting after timeout seconds, for entrypoints that take no timeout
+    (generate_text). The abandoned call cannot be interrupted and finishes on its thread.
+    """
+    if not timeout:
+        return fn(*args, **kwargs)
+    future = _untimed_pool.submit(fn, *args, **kwargs)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise TimeoutError(f"no response within {timeout:g}s")
+
+
+def invoke(plan: Dict[str, Any], handle, model: str, prompt: str, max_tokens: int = 256, temperature: float = 0.0,
+           timeout: Optional[float] = None):
+    """Call the resolved entrypoint directly and return the raw SDK response."""
+    entrypoint = plan["entrypoint"]
+    if entrypoint == "GenerativeModel.generate_content":
+        return handle.generate_content(
+            prompt,
+            generation_config={"max_output_tokens": max_tokens, "temperature": temperature},
+            **_request_options(timeout),
+        )
+    if entrypoint == "Client.models.generate_content":
+        return handle.models.generate_content(
+            model=model,
+            contents=prompt,
+            config=_genai_config(max_tokens, temperature, timeout),
+        )
+    resp = _within(timeout, handle.generate_text, model=model, prompt=prompt, max_output_tokens=max_tokens,
+                   temperature=temperature)
+    return getattr(resp, "result", resp)
+
+
+async def ainvoke(plan: Dict[str, Any], handle, model: str, prompt: str, max_tokens: int = 256, temperature: float = 0.0,
+                  timeout: Optional[float] = None):
+    """Async variant of invoke(); entrypoints without an async client run in a thread."""
+    entrypoint = plan["entrypoint"]
+    if entrypoint == "GenerativeModel.generate_content":
+        return await handle.generate_content_async(
+            prompt,
+            generation_config={"max_output_tokens": max_tokens, "temperature": temperature},
+            **_request_options(timeout),
+        )
+    if entrypoint == "Client.models.generate_content":
+        return await handle.aio.models.generate_content(
+            model=model,
+            contents=prompt,
+            config=_genai_config(max_tokens, temperature, timeout),
+        )
+    return await asyncio.to_thread(invoke, plan, handle, model, prompt, max_tokens, temperature, timeout)
+
+
+def invoke_stream(plan: Dict[str, Any], handle, model: str, prompt: str, max_tokens: int = 256, temperature: float = 0.0,
+                  timeout: Optional[float] = None):
+    """Iterate raw SDK response chunks; entrypoints without streaming yield one response."""
+    entrypoint = plan["entrypoint"]
+    if entrypoint == "GenerativeModel.generate_content":
+        return handle.generate_content(
+            prompt,
+            generation_config={"max_output_tokens": max_tokens, "temperature": temperature},
+            stream=True,
+            **_request_options(timeout),
+        )
+    if entrypoint == "Client.models.generate_content":
+        return handle.models.generate_content_stream(
+            model=model,
+            contents=prompt,
+            config=_genai_config(max_tokens, temperature, timeout),
+        )
+    return iter([invoke(plan, handle, model, prompt, max_tokens=max_tokens, temperature=temperature, timeout=timeout)])
+
+
+class HandleCache:
+    """Thread-safe cache of model handles keyed by model name."""
+
+    def __init__(self, factory: Callable[[str], Any]):
+        self._factory = factory
+        self._handles: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        handle = self._handles.get(key)
+        if handle is not None:
+            return handle
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                handle = self._factory(key)
+                self._handles[key] = handle
+        return handle
+
+    def clear(self):
+        with self._lock:
+            self._handles.clear()
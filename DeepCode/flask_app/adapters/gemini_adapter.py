@@ -1,47 +1,84 @@
 import os
+import asyncio
+import threading
 from .base import ModelAdapter
+from .dispatch import resolve_plan, configure_sdk, build_handle, invoke, ainvoke, invoke_stream, HandleCache
+from .singleflight import SingleFlight
+from .resilience import CircuitBreaker, AdaptiveTimeout, retry_budget, record_outcome, guarded_call, aguarded_call
+from services.metrics_service import metrics
+from services.scheduler_service import SCHEDULER_MAX_INFLIGHT
+
+# Cap on concurrent async generations against the upstream model (per process). Requests
+# admitted by the scheduler never exceed SCHEDULER_MAX_INFLIGHT, so that is the limit that
+# binds for HTTP traffic; the semaphore defaults to the same value and only bites for
+# callers outside the scheduler. Set GEMINI_MAX_CONCURRENCY lower to cap one backend below it.
+DEFAULT_MAX_CONCURRENCY = SCHEDULER_MAX_INFLIGHT
+# Retries per call for transient upstream errors (each one also needs the shared retry budget)
+DEFAULT_MAX_RETRIES = 1
 
 class GeminiAdapter(ModelAdapter):
-    def __init__(self, api_key=None, api_key_file=None, model=None):
+    def __init__(self, api_key=None, api_key_file=None, model=None, max_concurrency=None):
         self.api_key = api_key
         self.api_key_file = api_key_file
         self.model = model or os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+        self.max_concurrency = int(max_concurrency or os.getenv("GEMINI_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+        self._async_slots = None  # asyncio.Semaphore, created on the serving loop
 
         self.backend = None
         self.client = None
+        self.plan = None
 
-        # Try google.generativeai first
-        try:
-            import google.generativeai as ggen
-            if self.api_key:
-                ggen.configure(api_key=self.api_key)
-            elif self.api_key_file and os.path.exists(self.api_key_file):
-                with open(self.api_key_file) as f:
-                    ggen.configure(api_key=f.read().strip())
-            self.backend = "google.generativeai"
-            self.client = ggen
-        except Exception:
-            pass
-
-        # Try google.genai fallback
-        if not self.backend:
+        key = self.api_key
+        if not key and self.api_key_file and os.path.exists(self.api_key_file):
+            with open(self.api_key_file) as f:
+                key = f.read().strip()
+        self._key = key
+
+        # The SDK is imported on warm_up() or the first call, not here: importing it
+        # costs seconds and /api/health must answer as soon as the process is up
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+        # Model handles are built on first use and shared across requests/threads
+        self._handles = HandleCache(lambda name: build_handle(self.plan, name, api_key=self._key))
+
+        # Identical (prompt, params) calls already in flight share one upstream call
+        self._inflight = SingleFlight()
+
+        # Failure handling: breaker per backend+model, EWMA-derived timeouts, bounded retries
+        self.breaker = CircuitBreaker(f"gemini:{self.model}")
+        self.timeout = AdaptiveTimeout()
+        self.max_retries = int(os.getenv("GEMINI_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+
+    def warm_up(self):
+        """Resolve the SDK entrypoint (attribute inspection only, no network) and configure it once."""
+        if self._ready:
+            return
+        with self._ready_lock:
+            if self._ready:
+                return
             try:
-                import google.genai as gapi
-                if self.api_key:
-                    gapi.configure(api_key=self.api_key)
-                elif self.api_key_file and os.path.exists(self.api_key_file):
-                    with open(self.api_key_file) as f:
-                        gapi.configure(api_key=f.read().strip())
-                self.backend = "google.genai"
-                self.client = gapi
+                plan = resolve_plan()
+                if plan:
+                    client = configure_sdk(plan, self._key)
+                    self.plan, self.backend = plan, plan["sdk"]
+                    self.client = self.client or client
             except Exception:
-                pass
+                self.plan = None
+            self._ready = True
 
     def info(self):
         return {
             "model": self.model,
             "backend": self.backend,
             "configured": bool(self.client),
+            "ready": self._ready,
+            "entrypoint": self.plan["entrypoint"] if self.plan else None,
+            "max_concurrency": self.max_concurrency,
+            "coalesced": self._inflight.collapsed,
+            "breaker": self.breaker.snapshot(),
+            **self.timeout.snapshot(),
+            "retry_budget": retry_budget.snapshot(),
         }
 
     def _coerce_response_to_text(self, resp):
@@ -63,46 +100,91 @@ class GeminiAdapter(ModelAdapter):
         return str(resp)
 
     def generate(self, prompt, max_tokens=256, temperature=0.0):
+        self.warm_up()
         if not self.client:
             raise RuntimeError("No Gemini client configured")
 
-        if self.backend == "google.generativeai":
-            ggen = self.client
-            try:
-                # Preferred modern API: GenerativeModel.generate_content
-                if hasattr(ggen, "GenerativeModel"):
-                    model = ggen.GenerativeModel(self.model)
-                    resp = model.generate_content(prompt)
-                    text = self._coerce_response_to_text(resp)
-                    if text:
-                        return text
-                    return str(resp)
-
-                # Fallback: get_model path
-                if hasattr(ggen, "get_model"):
-                    model_obj = ggen.get_model(self.model)
-                    if hasattr(model_obj, "generate_content"):
-                        resp = model_obj.generate_content(prompt)
-                        text = self._coerce_response_to_text(resp)
-                        if text:
-                            return text
-                        return str(resp)
-
-                raise RuntimeError("No supported generation method found in google.generativeai")
-
-            except Exception as e:
-                raise RuntimeError(f"GeminiAdapter (google.generativeai) call failed: {e}")
-
-        if self.backend == "google.genai":
-            gapi = self.client
-            try:
-                return gapi.generate_text(
-                    model=self.model,
-                    prompt=prompt,
-                    max_output_tokens=max_tokens,
-                    temperature=temperature,
-                ).result
-            except Exception as e:
-                raise RuntimeError(f"GeminiAdapter (google.genai) call failed: {e}")
-
-        raise RuntimeError("Unsupported backend")
+        key = (self.model, prompt, max_tokens, temperature)
+        return self._inflight.do(key, lambda: self._generate_once(prompt, max_tokens, temperature))
+
+    def _count_retry(self):
+        metrics.inc("upstream_retries_total", help="Upstream model call retries", backend=self.backend)
+
+    def _generate_once(self, prompt, max_tokens, temperature):
+        return guarded_call(
+            lambda timeout: self._attempt(prompt, max_tokens, temperature, timeout),
+            self.breaker, self.timeout, max_retries=self.max_retries,
+            error_prefix=f"GeminiAdapter ({self.backend}) call failed", on_retry=self._count_retry,
+        )
+
+    def _attempt(self, prompt, max_tokens, temperature, timeout):
+        with metrics.span("adapter_resolve", backend=self.backend):
+            handle = self._handles.get(self.model)
+        with metrics.span("upstream", backend=self.backend):
+            resp = invoke(self.plan, handle, self.model, prompt, max_tokens=max_tokens, temperature=temperature,
+                          timeout=timeout)
+        with metrics.span("coerce_response", backend=self.backend):
+            text = self._coerce_response_to_text(resp)
+        return text or str(resp)
+
+    async def agenerate(self, prompt, max_tokens=256, temperature=0.0):
+        """Native async generation; waits for a free slot once max_concurrency calls are in flight."""
+        if not self._ready:
+            await asyncio.to_thread(self.warm_up)
+        if not self.client:
+            raise RuntimeError("No Gemini client configured")
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+
+        key = (self.model, prompt, max_tokens, temperature)
+        return await self._inflight.ado(key, lambda: self._agenerate_once(prompt, max_tokens, temperature))
+
+    async def _agenerate_once(self, prompt, max_tokens, temperature):
+        return await aguarded_call(
+            lambda timeout: self._aattempt(prompt, max_tokens, temperature, timeout),
+            self.breaker, self.timeout, max_retries=self.max_retries,
+            error_prefix=f"GeminiAdapter ({self.backend}) call failed", on_retry=self._count_retry,
+            slots=self._async_slots,
+        )
+
+    async def _aattempt(self, prompt, max_tokens, temperature, timeout):
+        with metrics.span("adapter_resolve", backend=self.backend):
+            handle = self._handles.get(self.model)
+        with metrics.span("upstream", backend=self.backend):
+            resp = await ainvoke(self.plan, handle, self.model, prompt, max_tokens=max_tokens, temperature=temperature,
+                                 timeout=timeout)
+        with metrics.span("coerce_response", backend=self.backend):
+            text = self._coerce_response_to_text(resp)
+        return text or str(resp)
+
+    def generate_stream(self, prompt, max_tokens=256, temperature=0.0):
+        """
+        Yield text chunks from the SDK's streaming generate_content. Streams go through
+        the same breaker as generate() and carry the adaptive timeout; stream durations
+        are not fed back into it, since they depend on the reply length.
+        """
+        self.warm_up()
+        if not self.client:
+            raise RuntimeError("No Gemini client configured")
+
+        token = self.breaker.check()
+        retry_budget.record_request()
+        try:
+            handle = self._handles.get(self.model)
+            for chunk in invoke_stream(self.plan, handle, self.model, prompt, max_tokens=max_tokens,
+                                       temperature=temperature, timeout=self.timeout.current):
+                try:
+                    text = chunk.text if hasattr(chunk, "text") else self._coerce_response_to_text(chunk)
+                except ValueError:
+                    # chunks without parts (e.g. the final finish_reason chunk) have no text
+                    text = None
+                if text:
+                    yield text
+        except Exception as e:
+            record_outcome(self.breaker, self.timeout, None, e, token)
+            raise RuntimeError(f"GeminiAdapter ({self.backend}) stream failed: {e}")
+        except BaseException:
+            # closed early (client disconnected): no verdict on the upstream
+            self.breaker.release_probe(token)
+            raise
+        record_outcome(self.breaker, self.timeout, None, token=token)
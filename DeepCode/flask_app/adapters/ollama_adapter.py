@@ -0,0 +1,72 @@
+# adapters/ollama_adapter.py
+import os
+import json
+import threading
+import requests
+from .base import ModelAdapter
+
+class OllamaAdapter(ModelAdapter):
+    """
+    Adapter for a local Ollama-compatible endpoint (POST {base_url}/api/generate).
+    Construction makes no network calls; one requests.Session is reused for
+    connection pooling.
+    """
+
+    def __init__(self, model=None, base_url=None, timeout=120):
+        self.model = model or os.getenv("OLLAMA_MODEL", "llama3")
+        self.base_url = (base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")).rstrip("/")
+        self.timeout = timeout
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _http(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = requests.Session()
+        return self._session
+
+    def _payload(self, prompt, max_tokens, temperature, stream):
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {"num_predict": max_tokens, "temperature": temperature},
+        }
+
+    def info(self):
+        return {"model": self.model, "backend": "ollama", "base_url": self.base_url, "configured": True}
+
+    def generate(self, prompt, max_tokens=256, temperature=0.0):
+        try:
+            resp = self._http().post(
+                f"{self.base_url}/api/generate",
+                json=self._payload(prompt, max_tokens, temperature, stream=False),
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            raise RuntimeError(f"OllamaAdapter call failed: {e}")
+        if resp.status_code != 200:
+            raise RuntimeError(f"OllamaAdapter call failed: status={resp.status_code} body={resp.text[:500]}")
+        return resp.json().get("response", "")
+
+    def generate_stream(self, prompt, max_tokens=256, temperature=0.0):
+        try:
+            with self._http().post(
+                f"{self.base_url}/api/generate",
+                json=self._payload(prompt, max_tokens, temperature, stream=True),
+                timeout=self.timeout,
+                stream=True,
+            ) as resp:
+                if resp.status_code != 200:
+                    raise RuntimeError(f"status={resp.status_code} body={resp.text[:500]}")
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        break
+        except (requests.RequestException, RuntimeError, ValueError) as e:
+            raise RuntimeError(f"OllamaAdapter stream failed: {e}")
@@ -0,0 +1,282 @@
+# adapters/registry.py
+"""
+Registry of ModelAdapter backends with a hedged routing policy.
+
+Requests go to the primary backend. If it has not answered within its observed
+p90 latency of starting (or fails first), the same request is sent to the next
+backend and whichever succeeds first is returned. The registry is itself a
+ModelAdapter, so app.py and the blueprints use it exactly like a single adapter;
+generate_with_model() tells them which backend's model answered. Responses are
+cached under the registry's cache_identity, so lookup and store use one key
+whichever backend answered.
+
+Configure with MODEL_BACKENDS, a comma-separated list of kind:model[@base_url]:
+    MODEL_BACKENDS="gemini:gemini-1.5-flash,gemini:gemini-1.5-pro,ollama:llama3@http://localhost:11434"
+"""
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, List, Optional
+
+from .base import ModelAdapter
+from services.scheduler_service import SCHEDULER_MAX_INFLIGHT
+
+# Hedge delay used until a backend has enough latency samples
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "2.0"))
+# Threads for sync hedged calls; every admitted request may run a primary and a hedge at once
+HEDGE_MAX_WORKERS = int(os.getenv("HEDGE_MAX_WORKERS", str(2 * SCHEDULER_MAX_INFLIGHT)))
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for one backend."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float, default: Optional[float] = None) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return default
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+class AdapterRegistry(ModelAdapter):
+    def __init__(self, hedge: bool = True, default_delay: float = HEDGE_DEFAULT_DELAY, max_workers: int = HEDGE_MAX_WORKERS):
+        self.hedge = hedge
+        self.default_delay = default_delay
+        self._adapters: Dict[str, ModelAdapter] = {}
+        self._order: List[str] = []
+        self._latency: Dict[str, LatencyTracker] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self.hedged = 0
+
+    def register(self, name: str, adapter: ModelAdapter, primary: bool = False):
+        with self._lock:
+            self._adapters[name] = adapter
+            self._latency[name] = LatencyTracker()
+            self._stats[name] = {"calls": 0, "wins": 0, "errors": 0}
+            if name in self._order:
+                self._order.remove(name)
+            if primary:
+                self._order.insert(0, name)
+            else:
+                self._order.append(name)
+
+    def get(self, name: str) -> ModelAdapter:
+        return self._adapters[name]
+
+    def route(self) -> List[str]:
+        """Backends in the order they are tried: primary first, then hedges; open breakers go last."""
+        return sorted(self._order, key=self._breaker_open)
+
+    def _breaker_open(self, name: str) -> bool:
+        breaker = getattr(self._adapters[name], "breaker", None)
+        return breaker is not None and breaker.state == "open"
+
+    @property
+    def model(self):
+        return self._adapters[self._order[0]].model if self._order else None
+
+    @property
+    def cache_identity(self):
+        # any backend may answer, so a cached answer belongs to the set, not the primary's model
+        return "registry:" + ",".join(self._order)
+
+    def hedge_delay(self, name: str) -> float:
+        return self._latency[name].percentile(90, default=self.default_delay)
+
+    def _count(self, name: str, field: str):
+        with self._lock:
+            self._stats[name][field] += 1
+
+    def _call(self, name, prompt, max_tokens, temperature, started=None):
+        if started is not None:
+            started.set()
+        self._count(name, "calls")
+        start = time.perf_counter()
+        try:
+            out = self._adapters[name].generate(prompt, max_tokens=max_tokens, temperature=temperature)
+        except Exception:
+            self._count(name, "errors")
+            raise
+        self._latency[name].record(time.perf_counter() - start)
+        return out
+
+    async def _acall(self, name, prompt, max_tokens, temperature):
+        self._count(name, "calls")
+        start = time.perf_counter()
+        try:
+            out = await self._adapters[name].agenerate(prompt, max_tokens=max_tokens, temperature=temperature)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._count(name, "errors")
+            raise
+        self._latency[name].record(time.perf_counter() - start)
+        return out
+
+    def _answer(self, name, out):
+        self._count(name, "wins")
+        return out, self._adapters[name].model
+
+    def generate(self, prompt, max_tokens=256, temperature=0.0):
+        return self.generate_with_model(prompt, max_tokens=max_tokens, temperature=temperature)[0]
+
+    def generate_with_model(self, prompt, max_tokens=256, temperature=0.0):
+        order = self.route()
+        if not order:
+            raise RuntimeError("No model backends registered")
+        if not self.hedge or len(order) == 1:
+            return self._failover(order, prompt, max_tokens, temperature)
+
+        primary, backups = order[0], order[1:]
+        started = threading.Event()
+        pending = {self._pool.submit(self._call, primary, prompt, max_tokens, temperature, started): primary}
+        # give the primary until its p90 before hedging, counted from when it gets a thread
+        # (time queued for the pool is not the backend being slow); an early failure also triggers the hedge.
+        # Queueing itself is bounded: a pool still full after default_delay on top of that p90 is stuck.
+        delay = self.hedge_delay(primary)
+        if started.wait(delay + self.default_delay):
+            done, _ = wait(list(pending), timeout=delay)
+        else:
+            # every hedge thread is busy: rather than queue behind them, try the backups on this thread
+            with self._lock:
+                self.hedged += 1
+            try:
+                answer = self._failover(backups, prompt, max_tokens, temperature)
+            except RuntimeError:
+                backups, done = [], set()  # all failed; wait for the queued primary below
+            else:
+                for fut in pending:
+                    fut.cancel()
+                return answer
+        last_error = None
+        while pending:
+            if done:
+                for fut in done:
+                    name = pending.pop(fut)
+                    if fut.exception() is None:
+                        return self._answer(name, fut.result())
+                    last_error = fut.exception()
+            if backups and (not done or not pending):
+                name = backups.pop(0)
+                with self._lock:
+                    self.hedged += 1
+                pending[self._pool.submit(self._call, name, prompt, max_tokens, temperature)] = name
+            if pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        raise RuntimeError(f"All model backends failed: {last_error}")
+
+    def _failover(self, order, prompt, max_tokens, temperature):
+        last_error = None
+        for name in order:
+            try:
+                out = self._call(name, prompt, max_tokens, temperature)
+            except Exception as e:
+                last_error = e
+                continue
+            return self._answer(name, out)
+        raise RuntimeError(f"All model backends failed: {last_error}")
+
+    async def agenerate(self, prompt, max_tokens=256, temperature=0.0):
+        return (await self.agenerate_with_model(prompt, max_tokens=max_tokens, temperature=temperature))[0]
+
+    async def agenerate_with_model(self, prompt, max_tokens=256, temperature=0.0):
+        order = self.route()
+        if not order:
+            raise RuntimeError("No model backends registered")
+        backups = order[1:] if self.hedge else []
+        tasks = {asyncio.ensure_future(self._acall(order[0], prompt, max_tokens, temperature)): order[0]}
+        timeout = self.hedge_delay(order[0]) if backups else None
+        last_error = None
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(list(tasks), timeout=timeout, return_when=FIRST_COMPLETED)
+                timeout = None
+                for task in done:
+                    name = tasks.pop(task)
+                    if task.cancelled():
+                        # cancelled from inside the backend, not by us: a failed backend
+                        self._count(name, "errors")
+                        last_error = RuntimeError(f"{name} call was cancelled")
+                    elif task.exception() is None:
+                        return self._answer(name, task.result())
+                    else:
+                        last_error = task.exception()
+                if backups and (not done or not tasks):
+                    name = backups.pop(0)
+                    with self._lock:
+                        self.hedged += 1
+                    tasks[asyncio.ensure_future(self._acall(name, prompt, max_tokens, temperature))] = name
+                elif not self.hedge and not tasks and order[1:]:
+                    # no hedging: plain failover to the next backend
+                    order = order[1:]
+                    tasks[asyncio.ensure_future(self._acall(order[0], prompt, max_tokens, temperature))] = order[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise RuntimeError(f"All model backends failed: {last_error}")
+
+    def generate_stream(self, prompt, max_tokens=256, temperature=0.0):
+        """Streams are not hedged; they come from the primary backend."""
+        order = self.route()
+        if not order:
+            raise RuntimeError("No model backends registered")
+        yield from self._adapters[order[0]].generate_stream(prompt, max_tokens=max_tokens, temperature=temperature)
+
+    def warm_up(self):
+        for name in self.route():
+            self._adapters[name].warm_up()
+
+    def info(self) -> Dict[str, Any]:
+        backends = {}
+        for name in self.route():
+            p90 = self._latency[name].percentile(90)
+            backends[name] = {
+                **self._adapters[name].info(),
+                **self._stats[name],
+                "p90_ms": round(p90 * 1000, 1) if p90 is not None else None,
+            }
+        return {
+            "model": self.model,
+            "backend": "registry",
+            "configured": bool(self._order),
+            "policy": "hedged" if self.hedge else "failover",
+            "hedged": self.hedged,
+            "backends": backends,
+        }
+
+def build_adapter(entry: str, api_key=None, api_key_file=None) -> ModelAdapter:
+    """Adapter for one "kind:model[@base_url]" entry (kinds: gemini, ollama, stub)."""
+    kind, _, rest = entry.partition(":")
+    model, _, base_url = rest.partition("@")
+    kind = kind.strip().lower()
+    if kind == "gemini":
+        from .gemini_adapter import GeminiAdapter
+        return GeminiAdapter(api_key=api_key, api_key_file=api_key_file, model=model or None)
+    if kind == "ollama":
+        from .ollama_adapter import OllamaAdapter
+        return OllamaAdapter(model=model or None, base_url=base_url or None)
+    if kind == "stub":
+        from .stub_adapter import StubAdapter
+        return StubAdapter(latency_ms=float(base_url or 50), model=model or "stub")
+    raise ValueError(f"Unknown model backend kind: {kind!r}")
+
+def build_registry(spec: str, api_key=None, api_key_file=None, hedge: bool = True) -> AdapterRegistry:
+    """Build a registry from "kind:model[@base_url],..." (kinds: gemini, ollama, stub)."""
+    registry = AdapterRegistry(hedge=hedge)
+    for entry in (part.strip() for part in spec.split(",")):
+        if entry:
+            registry.register(entry, build_adapter(entry, api_key, api_key_file))
+    return registry
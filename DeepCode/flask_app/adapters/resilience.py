@@ -0,0 +1,294 @@
+# adapters/resilience.py
+"""
+Failure-handling primitives shared by the model adapters:
+
+- CircuitBreaker: stops calling a backend after consecutive failures and lets a
+  single probe through once the cool-down has passed.
+- AdaptiveTimeout: per-call timeout derived from an EWMA of observed latency and
+  its deviation (the TCP RTO estimator), clamped to [min, max].
+- RetryBudget: retries may only spend a fixed fraction of recent request volume,
+  so a failing upstream never sees more than (1 + ratio) x normal traffic.
+
+guarded_call()/aguarded_call() combine the three around one upstream call; every
+Gemini call path goes through them so the policy lives in one place.
+"""
+import os
+import re
+import time
+import asyncio
+import threading
+import contextlib
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+TIMEOUT_MIN_SECONDS = float(os.getenv("UPSTREAM_TIMEOUT_MIN", "2"))
+TIMEOUT_MAX_SECONDS = float(os.getenv("UPSTREAM_TIMEOUT_MAX", "60"))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+RETRY_BUDGET_WINDOW = float(os.getenv("RETRY_BUDGET_WINDOW", "10"))
+RETRY_MIN_PER_SECOND = float(os.getenv("RETRY_MIN_PER_SECOND", "1"))
+
+# Upstream failures worth retrying and counting against the breaker: timeouts, throttling, 5xx.
+# Client errors (invalid argument, safety blocks, bad keys) say nothing about the backend's health.
+_TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+_TRANSIENT_TYPES = {
+    "deadlineexceeded", "serviceunavailable", "toomanyrequests", "resourceexhausted", "internalservererror",
+    "badgateway", "gatewaytimeout", "servererror", "timeout", "connecttimeout", "readtimeout", "connecterror",
+}
+# "503 Service Unavailable" (google.api_core), "status=503", "code: 429" ...
+_STATUS_IN_TEXT = re.compile(r"^\s*(\d{3})\b|\b(?:status|code)[\s:=]+(\d{3})\b", re.IGNORECASE)
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend whose breaker is open."""
+
+def status_code(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by an SDK/HTTP exception, or stated at the start of its message."""
+    for owner in (exc, getattr(exc, "response", None)):
+        for attr in ("code", "status_code", "status"):
+            value = getattr(owner, attr, None)
+            if isinstance(value, int) and 100 <= value < 600:
+                return value
+    match = _STATUS_IN_TEXT.search(str(exc))
+    if match:
+        return int(match.group(1) or match.group(2))
+    return None
+
+def is_transient(exc: BaseException) -> bool:
+    """True for timeouts, connection failures, throttling and 5xx; False for client errors."""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__.lower() in _TRANSIENT_TYPES for cls in type(exc).__mro__):
+        return True
+    code = status_code(exc)
+    return code is not None and code in _TRANSIENT_STATUS
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    PASS = True  # token for calls let through while closed; never owns the probe
+
+    def __init__(self, name: str, failure_threshold: Optional[int] = None, reset_seconds: Optional[float] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or BREAKER_FAILURE_THRESHOLD
+        self.reset_seconds = reset_seconds if reset_seconds is not None else BREAKER_RESET_SECONDS
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe: Optional[object] = None  # token held by the half-open probe in flight
+        self.opened = 0  # times the breaker has tripped
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> Optional[object]:
+        """
+        A token if a call may proceed, None if not. In half-open state only one probe
+        is let through; its token is the one release_probe() accepts.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return self.PASS
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    return None
+                self._state = self.HALF_OPEN
+            if self._probe is not None:
+                return None
+            self._probe = object()
+            return self._probe
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe = None
+
+    def release_probe(self, token: Optional[object]):
+        """End a call that proved nothing either way (client error, cancellation) without a verdict."""
+        with self._lock:
+            if token is not None and token is self._probe:
+                self._probe = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probe = None
+
+    def check(self) -> object:
+        """allow(), raising CircuitOpenError instead of returning None."""
+        token = self.allow()
+        if token is None:
+            raise CircuitOpenError(f"circuit open for {self.name}")
+        return token
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            retry_in = max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at)) if state == self.OPEN else 0.0
+            return {"state": state, "failures": self._failures, "opened": self.opened, "retry_in": round(retry_in, 1)}
+
+class AdaptiveTimeout:
+    """timeout = srtt + k * rttvar, updated on every successful call."""
+
+    def __init__(self, initial: Optional[float] = None, minimum: Optional[float] = None,
+                 maximum: Optional[float] = None, alpha: float = 0.125, beta: float = 0.25, k: float = 4.0):
+        self.minimum = minimum if minimum is not None else TIMEOUT_MIN_SECONDS
+        self.maximum = maximum if maximum is not None else TIMEOUT_MAX_SECONDS
+        self.alpha, self.beta, self.k = alpha, beta, k
+        self._initial = initial if initial is not None else self.maximum
+        self._srtt: Optional[float] = None
+        self._rttvar = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            if self._srtt is None:
+                self._srtt, self._rttvar = seconds, seconds / 2
+            else:
+                self._rttvar = (1 - self.beta) * self._rttvar + self.beta * abs(self._srtt - seconds)
+                self._srtt = (1 - self.alpha) * self._srtt + self.alpha * seconds
+
+    @property
+    def current(self) -> float:
+        with self._lock:
+            if self._srtt is None:
+                return self._initial
+            return min(self.maximum, max(self.minimum, self._srtt + self.k * self._rttvar))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            srtt = self._srtt
+        return {"timeout_s": round(self.current, 3), "ewma_s": round(srtt, 3) if srtt is not None else None}
+
+class RetryBudget:
+    """Retries allowed = ratio * requests in the last window, plus a small per-second floor."""
+
+    def __init__(self, ratio: Optional[float] = None, window: Optional[float] = None, min_per_second: Optional[float] = None):
+        self.ratio = ratio if ratio is not None else RETRY_BUDGET_RATIO
+        self.window = window if window is not None else RETRY_BUDGET_WINDOW
+        self.min_per_second = min_per_second if min_per_second is not None else RETRY_MIN_PER_SECOND
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+        self.denied = 0
+
+    def _trim(self, now: float):
+        cutoff = now - self.window
+        while self._requests and self._requests[0] < cutoff:
+            self._requests.popleft()
+        while self._retries and self._retries[0] < cutoff:
+            self._retries.popleft()
+
+    def record_request(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_acquire(self, now: Optional[float] = None) -> bool:
+        """Spend one retry if the budget allows it."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._trim(now)
+            allowed = self.ratio * len(self._requests) + self.min_per_second * self.window
+            if len(self._retries) >= allowed:
+                self.denied += 1
+                return False
+            self._retries.append(now)
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._trim(time.monotonic())
+            return {"requests": len(self._requests), "retries": len(self._retries), "denied": self.denied}
+
+# Shared by every adapter in the process: retries cannot amplify an outage
+retry_budget = RetryBudget()
+
+def record_outcome(breaker: CircuitBreaker, timeout: AdaptiveTimeout, started: Optional[float],
+                   error: Optional[BaseException] = None, token: Optional[object] = None):
+    """Only upstream failures count against the breaker; a rejected request still proves it is up."""
+    if error is None:
+        if started is not None:
+            timeout.observe(time.perf_counter() - started)
+        breaker.record_success()
+    elif is_transient(error):
+        breaker.record_failure()
+    else:
+        breaker.release_probe(token)
+
+def _may_retry(breaker: CircuitBreaker, attempt: int, max_retries: int, error: BaseException,
+               on_retry: Optional[Callable[[], None]]) -> bool:
+    """Retry transient errors while the breaker is closed and the shared budget allows it."""
+    if attempt >= max_retries or not is_transient(error):
+        return False
+    if breaker.state != CircuitBreaker.CLOSED or not retry_budget.try_acquire():
+        return False
+    if on_retry is not None:
+        on_retry()
+    return True
+
+def guarded_call(attempt: Callable[[float], Any], breaker: CircuitBreaker, timeout: AdaptiveTimeout,
+                 max_retries: int = 0, error_prefix: str = "upstream call failed",
+                 on_retry: Optional[Callable[[], None]] = None) -> Any:
+    """
+    Run attempt(timeout_seconds) behind the breaker, retrying transient failures within
+    the retry budget. Raises CircuitOpenError if the breaker refuses the call and
+    RuntimeError("<error_prefix>: ...") once the call has failed for good.
+    """
+    token = breaker.check()
+    retry_budget.record_request()
+    tries = 0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                result = attempt(timeout.current)
+            except Exception as e:
+                record_outcome(breaker, timeout, started, e, token)
+                if _may_retry(breaker, tries, max_retries, e, on_retry):
+                    tries += 1
+                    continue
+                raise RuntimeError(f"{error_prefix}: {str(e) or type(e).__name__}")
+            record_outcome(breaker, timeout, started, token=token)
+            return result
+    finally:
+        # an interrupted call reaches here without an outcome; never leave our probe marked in flight
+        breaker.release_probe(token)
+
+async def aguarded_call(attempt: Callable[[float], Awaitable[Any]], breaker: CircuitBreaker,
+                        timeout: AdaptiveTimeout, max_retries: int = 0, error_prefix: str = "upstream call failed",
+                        on_retry: Optional[Callable[[], None]] = None, slots: Optional[asyncio.Semaphore] = None) -> Any:
+    """Async counterpart of guarded_call(); attempts run while holding one of `slots`, if given."""
+    token = breaker.check()
+    retry_budget.record_request()
+    tries = 0
+    try:
+        async with slots if slots is not None else contextlib.nullcontext():
+            while True:
+                started = time.perf_counter()
+                seconds = timeout.current
+                try:
+                    # wait_for is a hard bound in case the SDK ignores its own timeout
+                    result = await asyncio.wait_for(attempt(seconds), seconds)
+                except Exception as e:
+                    record_outcome(breaker, timeout, started, e, token)
+                    if _may_retry(breaker, tries, max_retries, e, on_retry):
+                        tries += 1
+                        continue
+                    raise RuntimeError(f"{error_prefix}: {str(e) or type(e).__name__}")
+                record_outcome(breaker, timeout, started, token=token)
+                return result
+    finally:
+        # a cancelled call (client gone, hedge lost) reaches here without an outcome
+        breaker.release_probe(token)
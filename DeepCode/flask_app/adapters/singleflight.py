@@ -0,0 +1,87 @@
+# adapters/singleflight.py
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class _ACall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Collapse concurrent calls that share a key into one underlying call.
+    The first caller runs the call; callers arriving while it is in flight wait
+    for and share its result (or exception). `collapsed` counts those waiters.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._acalls: Dict[Hashable, _ACall] = {}  # only touched from the event loop
+        self.collapsed = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # The shared call runs in its own task so that cancelling one caller (a lost
+        # hedge, a client gone away) does not cancel it for the others; it is only
+        # cancelled once every caller waiting on it has gone.
+        call = self._acalls.get(key)
+        if call is None:
+            call = _ACall(asyncio.ensure_future(fn()))
+            self._acalls[key] = call
+            call.task.add_done_callback(lambda task: self._afinish(key, call))
+        else:
+            with self._lock:
+                self.collapsed += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._afinish(key, call)
+                call.task.cancel()
+
+    def _afinish(self, key: Hashable, call: "_ACall"):
+        if self._acalls.get(key) is call:
+            del self._acalls[key]
+        if call.task.done() and not call.task.cancelled():
+            call.task.exception()  # mark retrieved when nobody was waiting
@@ -0,0 +1,62 @@
+# adapters/stub_adapter.py
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+from .base import ModelAdapter
+
+class StubAdapter(ModelAdapter):
+    """
+    Offline stand-in for a model backend, used by loadtest.py and tests.
+    Each call sleeps latency_ms +/- jitter_ms (uniform) and returns a canned reply;
+    fail_rate makes that fraction of calls raise, to exercise error paths.
+    """
+
+    def __init__(self, latency_ms: float = 50.0, jitter_ms: float = 0.0, fail_rate: float = 0.0,
+                 model: str = "stub", seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fail_rate = fail_rate
+        self.model = model
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _next_delay(self) -> float:
+        with self._lock:
+            self.calls += 1
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+            failed = self.fail_rate > 0 and self._rng.random() < self.fail_rate
+        if failed:
+            raise RuntimeError("StubAdapter injected failure")
+        return max(0.0, self.latency_ms + jitter) / 1000.0
+
+    def _reply(self, prompt: str) -> str:
+        return f"stub reply to: {prompt[:40]}"
+
+    def generate(self, prompt, max_tokens=256, temperature=0.0, **kwargs) -> str:
+        time.sleep(self._next_delay())
+        return self._reply(prompt)
+
+    async def agenerate(self, prompt, max_tokens=256, temperature=0.0, **kwargs) -> str:
+        await asyncio.sleep(self._next_delay())
+        return self._reply(prompt)
+
+    def generate_stream(self, prompt, max_tokens=256, temperature=0.0, **kwargs) -> Iterator[str]:
+        words = self._reply(prompt).split(" ")
+        per_chunk = self._next_delay() / len(words)
+        for i, word in enumerate(words):
+            time.sleep(per_chunk)
+            yield word if i == 0 else " " + word
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "backend": "stub",
+            "configured": True,
+            "latency_ms": self.latency_ms,
+            "jitter_ms": self.jitter_ms,
+            "calls": self.calls,
+        }
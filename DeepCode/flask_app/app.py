@@ -2,7 +2,9 @@
 import os
 import logging
 import time
-from flask import Flask, request, jsonify
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from dotenv import load_dotenv
 
 # --- Load environment variables ---
@@ -16,90 +18,223 @@ if not os.getenv("GEMINI_API_KEY") and os.getenv("GOOGLE_API_KEY"):
 
 # --- Adapter import ---
 from adapters.gemini_adapter import GeminiAdapter
+from adapters.registry import build_registry
+from adapters.cascade import build_cascade
 
 # --- Prompt service ---
-from services.prompt_service import validate_and_prepare, ValidationError
+from services.prompt_service import ValidationError
+from services.generation_service import prepare, generate_prepared, output_payload
+from services.stream_service import wants_stream, stream_format, mimetype_for, relay
+from services.cache_service import response_cache
+from services.rate_limit_service import (
+    TokenBucketLimiter, SharedTokenBucketLimiter, parse_route_budgets, budget_for, retry_after_header
+)
+from services.state_service import kv as state_kv
+from services.scheduler_service import scheduler, SchedulerRejected
+from services.request_service import client_key, overloaded_response
+from services.metrics_service import metrics, record_request, PROMETHEUS_CONTENT_TYPE
 
 # --- Configure adapter ---
 api_key = os.getenv("GEMINI_API_KEY")
 api_key_file = os.getenv("GEMINI_API_KEY_FILE")
-adapter = GeminiAdapter(api_key=api_key, api_key_file=api_key_file)
+# MODEL_BACKENDS="gemini:gemini-1.5-flash,ollama:llama3@http://host:11434" routes across several
+# backends (hedged by default; MODEL_HEDGING=0 for plain failover)
+# MODEL_CASCADE="gemini:gemini-1.5-flash,gemini:gemini-1.5-pro" answers with the cheapest tier that
+# passes the confidence/format check (takes precedence over MODEL_BACKENDS)
+MODEL_BACKENDS = os.getenv("MODEL_BACKENDS", "").strip()
+MODEL_CASCADE = os.getenv("MODEL_CASCADE", "").strip()
+if MODEL_CASCADE:
+    adapter = build_cascade(MODEL_CASCADE, api_key=api_key, api_key_file=api_key_file)
+elif MODEL_BACKENDS:
+    adapter = build_registry(
+        MODEL_BACKENDS, api_key=api_key, api_key_file=api_key_file,
+        hedge=os.getenv("MODEL_HEDGING", "1").lower() not in ("0", "false", "no"),
+    )
+else:
+    adapter = GeminiAdapter(api_key=api_key, api_key_file=api_key_file)
 
 # --- Flask app setup ---
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 app.logger.setLevel(logging.INFO)
+app.extensions["model_adapter"] = adapter
 
-# Register API blueprints (api.py already exists)
-try:
-    from api import bp as api_bp
-    app.register_blueprint(api_bp, url_prefix="/api")
-    app.logger.info("Registered api blueprint at /api")
-except Exception:
-    app.logger.exception("Failed to register api blueprint")
+# Load the model SDK off the request path; the first generation waits for it if still running
+ADAPTER_WARMUP = os.getenv("ADAPTER_WARMUP", "1").lower() not in ("0", "false", "no")
+if ADAPTER_WARMUP:
+    threading.Thread(target=adapter.warm_up, name="adapter-warmup", daemon=True).start()
 
-# Register chat blueprint
-try:
-    from chat import bp as chat_bp
-    app.register_blueprint(chat_bp, url_prefix="/api")
-    app.logger.info("Registered chat blueprint at /api")
-except Exception:
-    app.logger.exception("Failed to register chat blueprint")
+# --- Request metrics (registered before the rate limiter so 429s are counted) ---
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
 
-# --- Simple in-memory rate limiter (dev only) ---
-RATE_LIMIT = {}  # ip -> list[timestamps]
+@app.after_request
+def _record_request_metrics(response):
+    if not request.path.startswith("/api/"):
+        return response
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    started = g.get("request_started")
+    record_request(route, response.status_code, time.perf_counter() - started if started is not None else None)
+    return response
+
+# --- Token-bucket rate limiter ---
 RATE_LIMIT_WINDOW = 60  # seconds
 RATE_LIMIT_MAX = 30  # requests per window per IP
-
-def _cleanup_timestamps(ts_list, now):
-    cutoff = now - RATE_LIMIT_WINDOW
-    return [t for t in ts_list if t >= cutoff]
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))  # tracked (ip, route) buckets
+# per-route budgets, e.g. RATE_LIMIT_ROUTES="/api/chat/=60/60,/api/generate=10/60"
+RATE_LIMIT_ROUTES = parse_route_budgets(os.getenv("RATE_LIMIT_ROUTES", ""))
+# (ip, route class) -> bucket; with STATE_BACKEND set, buckets are shared by all workers
+RATE_LIMIT = (TokenBucketLimiter(max_keys=RATE_LIMIT_MAX_KEYS) if state_kv is None
+              else SharedTokenBucketLimiter(state_kv))
+
+def _rate_limit_rejection(ip, path):
+    """Take a token for (ip, route class); returns (detail, retry_after_seconds) when limited."""
+    route_class, limit, window = budget_for(path, RATE_LIMIT_ROUTES, (RATE_LIMIT_MAX, RATE_LIMIT_WINDOW))
+    wait = RATE_LIMIT.acquire((ip, route_class), limit, window)
+    if not wait:
+        return None
+    return f"max {limit} requests per {window}s", wait
 
 @app.before_request
 def _simple_rate_limit():
     # only limit API routes
     if not request.path.startswith("/api/"):
         return None
-    ip = request.remote_addr or request.headers.get("X-Forwarded-For", "unknown")
-    now = time.time()
-    ts = RATE_LIMIT.get(ip, [])
-    ts = _cleanup_timestamps(ts, now)
-    if len(ts) >= RATE_LIMIT_MAX:
-        return jsonify({"error": "rate_limited", "detail": f"max {RATE_LIMIT_MAX} requests per {RATE_LIMIT_WINDOW}s"}), 429
-    ts.append(now)
-    RATE_LIMIT[ip] = ts
+    rejection = _rate_limit_rejection(client_key(), request.path)
+    if rejection:
+        detail, wait = rejection
+        resp = jsonify({"error": "rate_limited", "detail": detail})
+        resp.headers["Retry-After"] = retry_after_header(wait)
+        return resp, 429
     return None
 
+# --- Batch generation limits ---
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "8"))
+
+def _generate_prepared(prepared, route_class="generate", client=None):
+    """Generate for a validated request on this app's adapter. Returns (output, served_from_cache)."""
+    return generate_prepared(adapter, scheduler, prepared, route_class, client)
+
 @app.route("/api/health", methods=["GET"])
 def health():
     """Health check for Gemini adapter."""
-    return jsonify({"ok": True, "adapter": adapter.info()})
+    return jsonify({
+        "ok": True,
+        "adapter": adapter.info(),
+        "cache": response_cache.stats(),
+        "state": state_kv.info() if state_kv is not None else {"backend": "memory"},
+        "scheduler": scheduler.stats(),
+    })
 
 @app.route("/api/generate", methods=["POST"])
 def api_generate():
     """Generate text from Gemini model with validation and clamping."""
     data = request.get_json(silent=True) or {}
-    prompt = data.get("prompt") or data.get("text") or ""
-    max_tokens = data.get("max_output_tokens") or data.get("max_tokens")
-    temperature = data.get("temperature")
 
     # Validate input
     try:
-        prepared = validate_and_prepare(prompt, max_tokens=max_tokens, temperature=temperature)
+        prepared = prepare(data, adapter.model)
     except ValidationError as ve:
         return jsonify({"error": "invalid_input", "detail": str(ve)}), 400
 
+    # Streaming mode: send chunks as SSE (default) or JSON lines as they arrive.
+    # The slot is taken before the response starts, so a rejection is still a 503.
+    if wants_stream(data, request.args):
+        fmt = stream_format(request.headers.get("Accept"))
+        try:
+            chunks = scheduler.stream(adapter.generate_stream(
+                prepared["prompt"],
+                max_tokens=prepared["max_tokens"],
+                temperature=prepared["temperature"],
+            ), "generate", client_key())
+        except SchedulerRejected as e:
+            return overloaded_response(e)
+        resp = Response(stream_with_context(relay(chunks, fmt)), mimetype=mimetype_for(fmt))
+        resp.call_on_close(chunks.close)
+        return resp
+
     try:
-        out = adapter.generate(
-            prepared["prompt"],
-            max_tokens=prepared["max_tokens"],
-            temperature=prepared["temperature"],
-        )
-        return jsonify({"output": out})
+        out, cached = _generate_prepared(prepared, "generate", client_key())
+        with metrics.span("serialize"):
+            return jsonify(output_payload(out, cached))
+    except SchedulerRejected as e:
+        return overloaded_response(e)
     except Exception as e:
         app.logger.exception("Generation failed")
         return jsonify({"error": "generation_failed", "detail": str(e)}), 500
 
+@app.route("/api/generate/batch", methods=["POST"])
+def api_generate_batch():
+    """
+    Generate for many prompts in one request.
+    JSON: {"items": [{"prompt": "...", "max_output_tokens": optional, "temperature": optional}, ...],
+           "parallelism": optional} (a bare list of items is also accepted)
+    Returns: {"results": [{"index": i, "output": "..."} | {"index": i, "error": "...", "detail": "..."}]}
+    Items run concurrently, at most min(parallelism, BATCH_MAX_PARALLEL) at a time.
+    """
+    data = request.get_json(silent=True)
+    options = data if isinstance(data, dict) else {}
+    items = data if isinstance(data, list) else options.get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "invalid_input", "detail": "items must be a non-empty list"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": "invalid_input", "detail": f"too many items (max {BATCH_MAX_ITEMS})"}), 400
+    try:
+        parallelism = int(options.get("parallelism") or BATCH_MAX_PARALLEL)
+    except (TypeError, ValueError):
+        return jsonify({"error": "invalid_input", "detail": "parallelism must be an integer"}), 400
+    parallelism = max(1, min(parallelism, BATCH_MAX_PARALLEL))
+
+    results = [None] * len(items)
+    pending = []
+    for i, item in enumerate(items):
+        item = item if isinstance(item, dict) else {"prompt": item}
+        try:
+            prepared = prepare(item, adapter.model)
+        except ValidationError as ve:
+            results[i] = {"index": i, "error": "invalid_input", "detail": str(ve)}
+            continue
+        pending.append((i, prepared))
+
+    client = client_key()
+
+    def run(index, prepared):
+        try:
+            out, cached = _generate_prepared(prepared, "batch", client)
+            return {"index": index, **output_payload(out, cached)}
+        except SchedulerRejected as e:
+            return {"index": index, "error": "overloaded", "reason": e.reason, "detail": str(e)}
+        except Exception as e:
+            app.logger.exception("Batch item %d generation failed", index)
+            return {"index": index, "error": "generation_failed", "detail": str(e)}
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(parallelism, len(pending))) as pool:
+            for result in pool.map(lambda job: run(*job), pending):
+                results[result["index"]] = result
+
+    return jsonify({"results": results})
+
+@app.route("/api/metrics", methods=["GET"])
+def api_metrics():
+    """Counters and latency histograms in Prometheus text format."""
+    return Response(metrics.render(), mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE)
+
+# Register chat blueprint
+try:
+    from chat import bp as chat_bp
+    app.register_blueprint(chat_bp, url_prefix="/api")
+    app.logger.info("Registered chat blueprint at /api")
+except Exception:
+    app.logger.exception("Failed to register chat blueprint")
+
 if __name__ == "__main__":
     app.logger.info("Starting Flask - adapter info: %s", adapter.info())
-    app.run(host="0.0.0.0", port=5000)
+    if os.getenv("SERVE_MODE", "wsgi").lower() == "asgi":
+        # ASGI mode: async /api/generate with bounded upstream concurrency (see asgi.py)
+        import uvicorn
+        uvicorn.run("asgi:application", host="0.0.0.0", port=5000)
+    else:
+        app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,151 @@
+# asgi.py
+"""
+ASGI serving mode for the Flask app.
+
+Run with `uvicorn asgi:application` (or `SERVE_MODE=asgi python app.py`).
+POST /api/generate is served natively through adapter.agenerate(), so an in-flight
+generation holds a coroutine instead of a worker thread; upstream concurrency is
+capped by the shared scheduler (SCHEDULER_MAX_INFLIGHT, the limit that binds) and the
+adapter's semaphore (GEMINI_MAX_CONCURRENCY, which defaults to the same value). Streaming
+requests and every other route are delegated to the Flask app.
+"""
+import json
+import time
+import asyncio
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+
+import app as flask_module
+from services.prompt_service import ValidationError
+from services.generation_service import prepare, agenerate_prepared, output_payload
+from services.stream_service import wants_stream
+from services.rate_limit_service import retry_after_header
+from services.request_service import overloaded_body
+from services.metrics_service import metrics, record_request
+from services.scheduler_service import SchedulerRejected
+
+_flask_asgi = WsgiToAsgi(flask_module.app)
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    more = True
+    while more:
+        message = await receive()
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+    return body
+
+
+def _replay(body: bytes):
+    """Give the delegated Flask app a receive() that yields the already-read body."""
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return receive
+
+
+def _encode(payload: dict) -> bytes:
+    return json.dumps(payload).encode("utf-8")
+
+
+async def _send_json(send, payload: dict, status: int = 200, headers=None):
+    await _send_body(send, _encode(payload), status, headers)
+
+
+async def _send_body(send, body: bytes, status: int = 200, headers=None):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        + list(headers or []),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _query_args(scope) -> dict:
+    """First value of each query parameter, as request.args.get() sees them in Flask."""
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return {name: values[0] for name, values in query.items()}
+
+
+def _client_ip(scope) -> str:
+    if scope.get("client"):
+        return scope["client"][0]
+    for name, value in scope.get("headers", []):
+        if name == b"x-forwarded-for":
+            return value.decode("latin-1")
+    return "unknown"
+
+
+async def _generate(scope, receive, send):
+    body = await _read_body(receive)
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    if wants_stream(data, _query_args(scope)):
+        scope["deepcode.delegated"] = True  # Flask records this request's metrics
+        return await _flask_asgi(scope, _replay(body), send)
+
+    rejection = flask_module._rate_limit_rejection(_client_ip(scope), scope["path"])
+    if rejection:
+        detail, wait = rejection
+        retry = [(b"retry-after", retry_after_header(wait).encode())]
+        return await _send_json(send, {"error": "rate_limited", "detail": detail}, 429, headers=retry)
+
+    adapter = flask_module.adapter
+    try:
+        prepared = prepare(data, adapter.model)
+    except ValidationError as ve:
+        return await _send_json(send, {"error": "invalid_input", "detail": str(ve)}, 400)
+
+    try:
+        out, cached = await agenerate_prepared(adapter, flask_module.scheduler, prepared, "generate",
+                                               _client_ip(scope))
+    except SchedulerRejected as e:
+        payload, retry_after = overloaded_body(e)
+        headers = [(b"retry-after", retry_after.encode())] if retry_after else None
+        return await _send_json(send, payload, 503, headers=headers)
+    except asyncio.CancelledError:
+        if asyncio.current_task().cancelling():
+            raise  # this request was cancelled (client gone, shutdown)
+        # a backend's cancellation leaked out; the request still gets an answer
+        flask_module.app.logger.error("Generation cancelled inside the model backend")
+        return await _send_json(send, {"error": "generation_failed", "detail": "generation was cancelled"}, 500)
+    except Exception as e:
+        flask_module.app.logger.exception("Generation failed")
+        return await _send_json(send, {"error": "generation_failed", "detail": str(e)}, 500)
+    with metrics.span("serialize"):
+        body = _encode(output_payload(out, cached))
+    await _send_body(send, body)
+
+
+async def _generate_with_metrics(scope, receive, send):
+    started = time.perf_counter()
+    status = {"code": 500}
+
+    async def recording_send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+        await send(message)
+
+    try:
+        await _generate(scope, receive, recording_send)
+    finally:
+        if not scope.get("deepcode.delegated"):
+            record_request("/api/generate", status["code"], time.perf_counter() - started)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] == "/api/generate" and scope["method"] == "POST":
+        return await _generate_with_metrics(scope, receive, send)
+    return await _flask_asgi(scope, receive, send)
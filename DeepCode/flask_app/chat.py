@@ -1,52 +1,30 @@
 # chat.py
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from services.chat_service import (
     create_session, push_user_message, push_assistant_message,
-    get_history, cleanup_expired_sessions, session_exists, ChatError
+    get_history_page, get_context_prompt, cleanup_expired_sessions, session_exists, ChatError
 )
-import google.generativeai as ggen
-import os
+from services.stream_service import wants_stream, stream_format, mimetype_for, relay
+from services.metrics_service import metrics
+from services.token_service import count_tokens
+from services.prompt_service import fit_to_context, ValidationError
+from services.scheduler_service import scheduler, SchedulerRejected
+from services.request_service import client_key, overloaded_response
+from services.serialization_service import json_response
 
 bp = Blueprint("chat", __name__)
 
-# helper to produce assistant response using the adapter (ggen)
+HISTORY_PAGE_MAX = 200  # messages per history page
+CHAT_MAX_OUTPUT_TOKENS = 256
+
+# helper to produce assistant response using the app's shared adapter
 def _call_assistant_via_adapter(prompt: str, max_tokens: int = 256, temperature: float = 0.0) -> str:
     """
-    Use the same model flow as app: get model object and call adapter-compatible generation.
-    This expects google.generativeai configured (ggen.configure done at app startup).
+    Use the same adapter as app: it reuses the resolved generation entrypoint and a
+    cached model handle instead of building a model object on every turn.
     """
-    model_name = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
-    model = None
-    # prefer GenerativeModel API if available
-    if hasattr(ggen, "GenerativeModel"):
-        try:
-            gm = ggen.GenerativeModel(model_name)
-            # Many versions accept a single prompt string
-            resp = gm.generate_content(prompt)
-            # Attempt to return .text if present
-            if hasattr(resp, "text") and resp.text:
-                return resp.text
-            # fallback to candidates
-            if hasattr(resp, "candidates") and resp.candidates:
-                return str(resp.candidates[0])
-            return str(resp)
-        except Exception:
-            # fallback to get_model
-            pass
-
-    if hasattr(ggen, "get_model"):
-        model = ggen.get_model(model_name)
-        # try basic generate_content with prompt
-        if hasattr(model, "generate_content"):
-            resp = model.generate_content(prompt)
-            if hasattr(resp, "text") and resp.text:
-                return resp.text
-            if hasattr(resp, "candidates") and resp.candidates:
-                return str(resp.candidates[0])
-            return str(resp)
-
-    # if we reach here, raise to be handled by caller
-    raise RuntimeError("no_generation_entrypoint")
+    adapter = current_app.extensions["model_adapter"]
+    return adapter.generate(prompt, max_tokens=max_tokens, temperature=temperature)
 
 @bp.post("/chat/start")
 def chat_start():
@@ -64,8 +42,11 @@ def chat_start():
 def chat_message():
     """
     Send a user message to an existing session and get assistant reply.
-    JSON: {"session_id": "<id>", "message": "<text>", "max_output_tokens": optional, "temperature": optional}
+    JSON: {"session_id": "<id>", "message": "<text>", "max_output_tokens": optional, "temperature": optional,
+           "stream": optional}
     Returns: {"ok": True, "reply": "...", "session_id": "..."}
+    With "stream": true, reply chunks are sent as SSE (or JSON lines for Accept: application/x-ndjson)
+    and the assembled reply is stored when the stream finishes.
     """
     cleanup_expired_sessions()
     data = request.get_json(silent=True) or {}
@@ -76,32 +57,62 @@ def chat_message():
     if not session_exists(session_id):
         return jsonify({"error": "session_not_found"}), 404
 
+    adapter = current_app.extensions["model_adapter"]
+    # a message that cannot fit the model's context on its own is refused before it enters the history
+    try:
+        fit_to_context(f"user: {message}", CHAT_MAX_OUTPUT_TOKENS, adapter.model)
+    except ValidationError as ve:
+        return jsonify({"error": "invalid_input", "detail": str(ve)}), 400
+
     # push user message to history
     try:
         push_user_message(session_id, message)
     except ChatError:
         return jsonify({"error": "session_not_found"}), 404
 
-    # Compose a short context string for the assistant: join last few messages
-    history = get_history(session_id)
-    context_parts = []
-    for m in history[-10:]:
-        role = m["role"]
-        text = m["text"]
-        context_parts.append(f"{role}: {text}")
-    # include the new user message at the end
-    context_parts.append(f"user: {message}")
-    prompt_for_model = "\n".join(context_parts)
+    # Token-budgeted context (running summary + recent turns, including the new message),
+    # cut from the oldest end if it still overflows the model's context window
+    try:
+        with metrics.span("context"):
+            prompt_for_model = get_context_prompt(session_id)
+            prompt_for_model, prompt_tokens, max_tokens, _ = fit_to_context(
+                prompt_for_model, CHAT_MAX_OUTPUT_TOKENS, adapter.model, overflow="trim")
+    except ChatError:
+        return jsonify({"error": "session_not_found"}), 404
+
+    if wants_stream(data, request.args):
+        fmt = stream_format(request.headers.get("Accept"))
+        try:
+            chunks = scheduler.stream(adapter.generate_stream(prompt_for_model, max_tokens=max_tokens, temperature=0.0),
+                                      "chat", client_key())
+        except SchedulerRejected as e:
+            return overloaded_response(e)
+        resp = Response(
+            stream_with_context(relay(
+                chunks, fmt,
+                on_complete=lambda text: push_assistant_message(session_id, text),
+                extra={"session_id": session_id},
+            )),
+            mimetype=mimetype_for(fmt),
+        )
+        resp.call_on_close(chunks.close)
+        return resp
 
-    # call the underlying model via ggen-compatible flow
+    # call the underlying model via the shared adapter
+    metrics.inc("tokens_in_total", prompt_tokens, help="Estimated prompt tokens sent upstream")
     try:
-        reply = _call_assistant_via_adapter(prompt_for_model)
+        with scheduler.slot("chat", client_key()), metrics.span("adapter"):
+            reply = _call_assistant_via_adapter(prompt_for_model, max_tokens=max_tokens)
+    except SchedulerRejected as e:
+        return overloaded_response(e)
     except Exception as e:
         # return an error but keep session state
         current_app.logger.exception("Assistant generation failed")
         return jsonify({"error": "generation_failed", "detail": str(e)}), 500
 
     # store assistant reply and return
+    if reply:
+        metrics.inc("tokens_out_total", count_tokens(reply), help="Estimated completion tokens received")
     try:
         push_assistant_message(session_id, reply)
     except ChatError:
@@ -111,9 +122,41 @@ def chat_message():
 
 @bp.get("/chat/history/<session_id>")
 def chat_history(session_id):
+    """
+    Session history. With paging parameters every message carries its absolute "index":
+    ?since=<index> returns only messages from that index on (delta polling: pass back
+    "next_since"), ?limit=<n> pages the result (continue with ?cursor=<next_cursor>).
+    The ETag changes only when the session gets new messages, so If-None-Match polls
+    get 304; bodies are gzip-compressed for clients that accept it.
+    """
     cleanup_expired_sessions()
     try:
-        hist = get_history(session_id)
-        return jsonify({"ok": True, "session_id": session_id, "history": hist})
+        since = request.args.get("cursor") or request.args.get("since")
+        since = int(since) if since is not None else None
+        limit = request.args.get("limit")
+        limit = max(1, min(int(limit), HISTORY_PAGE_MAX)) if limit is not None else None
+    except ValueError:
+        return jsonify({"error": "invalid_input", "detail": "since, cursor and limit must be integers"}), 400
+    try:
+        page = get_history_page(session_id, since, limit)
     except ChatError:
         return jsonify({"error": "session_not_found"}), 404
+
+    etag = f'W/"{page["total"]}-{since}-{limit}"'
+    if etag in request.headers.get("If-None-Match", ""):
+        return Response(status=304, headers={"ETag": etag})
+    history = page["messages"]
+    if since is None and limit is None:
+        # plain call keeps the original message shape; the indices are in first_index/next_since
+        history = [{"role": m["role"], "text": m["text"]} for m in history]
+    payload = {
+        "ok": True,
+        "session_id": session_id,
+        "history": history,
+        "first_index": page["first_index"],
+        "total": page["total"],
+        "next_since": page["next"],
+    }
+    if page["next"] < page["total"]:
+        payload["next_cursor"] = str(page["next"])
+    return json_response(payload, headers={"ETag": etag})
@@ -1,7 +1,9 @@
 # gemini_client.py
 """
 Robust adapter for various Google Gemini SDK variants found on different installs.
-It tries multiple client libraries and multiple method signatures until one works.
+The generation entrypoint is resolved once (see adapters/dispatch.py) and model
+handles are reused; probing multiple client libraries and method signatures is
+only a fallback for installs where no entrypoint could be resolved.
 
 Place your GEMINI_API_KEY or GEMINI_API_KEY_FILE in the flask_app/.env or
 set environment variables before starting Flask.
@@ -12,6 +14,8 @@ Typical usage:
 """
 import os, json, traceback
 from dotenv import load_dotenv
+from adapters.dispatch import resolve_plan, configure_sdk, build_handle, invoke, HandleCache
+from adapters.resilience import CircuitBreaker, AdaptiveTimeout, guarded_call
 
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
@@ -31,6 +35,19 @@ def _ensure_key():
             "Gemini API key not found. Set GEMINI_API_KEY in flask_app/.env or point GEMINI_API_KEY_FILE to a file containing the key."
         )
 
+def _build_handle(model_name):
+    plan = resolve_plan()
+    configure_sdk(plan, api_key)
+    return build_handle(plan, model_name, api_key=api_key)
+
+# shared, thread-safe model handles (one per model name)
+_handles = HandleCache(_build_handle)
+
+# failure handling for the hot path (the retry budget is shared with the adapters)
+breaker = CircuitBreaker(f"gemini_client:{MODEL}")
+timeout = AdaptiveTimeout()
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "1"))
+
 def _try_call(fn, *args, **kwargs):
     try:
         return fn(*args, **kwargs)
@@ -222,7 +239,18 @@ def generate_text(prompt, max_output_tokens=256):
     """
     _ensure_key()
 
-    # Try google.generativeai first (preferred based on probe output)
+    # Hot path: call the resolved entrypoint directly on a cached handle
+    plan = resolve_plan()
+    if plan is not None:
+        resp = guarded_call(
+            lambda seconds: invoke(plan, _handles.get(MODEL), MODEL, prompt, max_tokens=max_output_tokens,
+                                   timeout=seconds),
+            breaker, timeout, max_retries=MAX_RETRIES,
+            error_prefix=f"Gemini call failed via {plan['sdk']} ({plan['entrypoint']})",
+        )
+        return _coerce_to_text(resp)
+
+    # Fallback probing: try google.generativeai first (preferred based on probe output)
     ga_result = _use_google_generativeai(prompt, max_output_tokens=max_output_tokens)
     if not (isinstance(ga_result, tuple) and ga_result and ga_result[0].startswith("__NO")):
         # success (could return raw SDK object) -> coerce
@@ -0,0 +1,189 @@
+# loadtest.py
+"""
+Offline load test for the Flask generation service.
+
+Swaps a StubAdapter (configurable latency and jitter) in for the Gemini adapter and
+drives /api/generate, /api/chat/start and /api/chat/message in-process at a target
+request rate, then reports throughput and p50/p95/p99 latency per route. Nothing
+touches the network, so runs are repeatable and can gate throughput regressions in
+the rate limiter, the session store and the adapter glue.
+
+Typical usage:
+    python loadtest.py --rate 200 --duration 10 --latency-ms 50 --jitter-ms 20
+    python loadtest.py --rate 500 --duration 5 --mix generate=1 --json
+
+Latency is measured from each request's scheduled send time (open-loop), so time
+spent queued behind a saturated worker pool shows up in the percentiles.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parse "generate=0.6,chat=0.4" into normalized weights."""
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name:
+            weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0 or not set(weights) <= {"generate", "chat"}:
+        raise ValueError(f"invalid mix: {spec!r} (use generate=<w>,chat=<w>)")
+    return {k: v / total for k, v in weights.items()}
+
+class Recorder:
+    """Thread-safe collection of per-route latencies and status codes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+
+    def record(self, route: str, status: int, seconds: float):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            codes = self.statuses.setdefault(route, {})
+            codes[status] = codes.get(status, 0) + 1
+
+    def summary(self) -> Dict[str, Dict]:
+        out = {}
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            codes = self.statuses[route]
+            out[route] = {
+                "count": len(values),
+                "errors": sum(n for code, n in codes.items() if code >= 400),
+                "status": {str(code): n for code, n in sorted(codes.items())},
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+        return out
+
+def install_stub(app_module, stub):
+    """Point both the app routes and the blueprints at the stub adapter."""
+    app_module.adapter = stub
+    app_module.app.extensions["model_adapter"] = stub
+
+def run_load(rate: float = 100.0, duration: float = 5.0, mix: str = "generate=0.6,chat=0.4",
+             workers: int = 64, clients: int = 1000, prompt_pool: int = 1000, temperature: float = 0.0,
+             latency_ms: float = 50.0, jitter_ms: float = 10.0, fail_rate: float = 0.0, seed: int = 0) -> Dict:
+    import app as app_module
+    from adapters.stub_adapter import StubAdapter
+
+    stub = StubAdapter(latency_ms=latency_ms, jitter_ms=jitter_ms, fail_rate=fail_rate, seed=seed)
+    original = app_module.adapter
+    install_stub(app_module, stub)
+
+    weights = parse_mix(mix)
+    rng = random.Random(seed)
+    recorder = Recorder()
+    local = threading.local()
+    sessions: Dict[int, str] = {}
+    sessions_lock = threading.Lock()
+
+    def client():
+        if not hasattr(local, "client"):
+            local.client = app_module.app.test_client()
+        return local.client
+
+    def post(route, payload, ip, scheduled):
+        rv = client().post(route, data=json.dumps(payload), content_type="application/json",
+                           environ_overrides={"REMOTE_ADDR": ip})
+        recorder.record(route, rv.status_code, time.perf_counter() - scheduled)
+        return rv
+
+    def job(kind, client_id, prompt, scheduled):
+        ip = f"10.{client_id // 65536 % 256}.{client_id // 256 % 256}.{client_id % 256}"
+        if kind == "generate":
+            post("/api/generate", {"prompt": prompt, "temperature": temperature}, ip, scheduled)
+            return
+        with sessions_lock:
+            sid = sessions.get(client_id)
+        if sid is None:
+            rv = post("/api/chat/start", {}, ip, scheduled)
+            sid = (rv.get_json(silent=True) or {}).get("session_id")
+            if not sid:
+                return
+            with sessions_lock:
+                sessions[client_id] = sid
+            return
+        post("/api/chat/message", {"session_id": sid, "message": prompt}, ip, scheduled)
+
+    kinds = list(weights)
+    cum_weights = [sum(weights[k] for k in kinds[:i + 1]) for i in range(len(kinds))]
+    total = int(rate * duration)
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for n in range(total):
+                scheduled = start + n / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                kind = rng.choices(kinds, cum_weights=cum_weights)[0]
+                pool.submit(job, kind, rng.randrange(clients), f"load test prompt #{rng.randrange(prompt_pool)}", scheduled)
+        # measured after the pool drains, so in-flight requests count toward elapsed time
+        elapsed = time.perf_counter() - start
+    finally:
+        install_stub(app_module, original)
+
+    routes = recorder.summary()
+    completed = sum(r["count"] for r in routes.values())
+    return {
+        "target_rate": rate,
+        "duration_s": round(elapsed, 3),
+        "completed": completed,
+        "throughput_rps": round(completed / elapsed, 2) if elapsed else 0.0,
+        "stub": {"latency_ms": latency_ms, "jitter_ms": jitter_ms, "fail_rate": fail_rate, "calls": stub.calls},
+        "routes": routes,
+    }
+
+def _print_report(report: Dict):
+    print(f"target {report['target_rate']} req/s for {report['duration_s']}s -> "
+          f"{report['completed']} requests, {report['throughput_rps']} req/s "
+          f"({report['stub']['calls']} stub model calls)")
+    print(f"{'route':<22}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for route, r in report["routes"].items():
+        print(f"{route:<22}{r['count']:>8}{r['errors']:>8}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['max_ms']:>10}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline load test with a stub model backend")
+    ap.add_argument("--rate", type=float, default=100.0, help="target requests per second")
+    ap.add_argument("--duration", type=float, default=5.0, help="seconds to generate load")
+    ap.add_argument("--mix", default="generate=0.6,chat=0.4", help="traffic mix weights")
+    ap.add_argument("--workers", type=int, default=64, help="concurrent request threads")
+    ap.add_argument("--clients", type=int, default=1000, help="distinct client IPs / chat sessions")
+    ap.add_argument("--prompt-pool", type=int, default=1000, help="distinct prompts (smaller = more cache hits)")
+    ap.add_argument("--temperature", type=float, default=0.0, help="temperature for /api/generate (0 is cacheable)")
+    ap.add_argument("--latency-ms", type=float, default=50.0, help="stub model latency")
+    ap.add_argument("--jitter-ms", type=float, default=10.0, help="stub latency jitter (uniform +/-)")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fraction of stub calls that fail")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = ap.parse_args()
+
+    report = run_load(
+        rate=args.rate, duration=args.duration, mix=args.mix, workers=args.workers, clients=args.clients,
+        prompt_pool=args.prompt_pool, temperature=args.temperature, latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms, fail_rate=args.fail_rate, seed=args.seed,
+    )
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -36,6 +36,30 @@ def safe_call(obj, call_name, *args, **kwargs):
         traceback.print_exc(limit=5)
         return None
 
+def write_dispatch_manifest():
+    """
+    Resolve the dispatch plan the Flask app loads at startup, verify it with one
+    real call, and save it to the manifest (see adapters/dispatch.py).
+    """
+    from adapters.dispatch import resolve_plan, build_handle, configure_sdk, invoke, save_manifest, manifest_path
+    plan = resolve_plan(refresh=True)
+    if plan is None:
+        print("\nNo dispatch plan could be resolved")
+        return None
+    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+    try:
+        configure_sdk(plan, api_key)
+        handle = build_handle(plan, MODEL, api_key=api_key)
+        res = invoke(plan, handle, MODEL, "Hello from probe", max_tokens=32)
+        print("\nDispatch plan call OK -> repr:", repr(res)[:1000])
+        plan["verified"] = True
+    except Exception:
+        print("\nDispatch plan call ERROR:")
+        traceback.print_exc(limit=5)
+    save_manifest(plan)
+    print(f"Dispatch plan saved to {manifest_path()}:", json.dumps(plan, indent=2))
+    return plan
+
 def main():
     print("ENV MODEL:", MODEL)
     ggen = try_import("google.generativeai")
@@ -86,6 +110,7 @@ def main():
                 print(" -> OK type", type(r), "repr:", repr(r)[:1000])
             except Exception:
                 traceback.print_exc()
+    write_dispatch_manifest()
     print("\nPROBE DONE")
 
 if __name__ == "__main__":
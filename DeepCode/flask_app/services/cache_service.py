@@ -0,0 +1,142 @@
+# services/cache_service.py
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Configurable cache behavior
+CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_SIZE", "1024"))
+CACHE_TTL_SECONDS = float(os.getenv("GENERATION_CACHE_TTL", str(60 * 60)))
+CACHE_DB_PATH = os.getenv("GENERATION_CACHE_DB")  # unset -> in-process tier only
+CACHE_PURGE_INTERVAL = float(os.getenv("GENERATION_CACHE_PURGE_INTERVAL", "60"))  # seconds between disk sweeps
+
+_LINE_END_SPACE = re.compile(r"[ \t]+(?=\r?\n)")
+_INNER_SPACE = re.compile(r"(?<=\S)[ \t]{2,}(?=\S)")
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Trim the prompt, spaces at line ends and repeated spaces between words, so trivially
+    different prompts share an entry. Newlines and indentation are kept: they can change the answer.
+    """
+    return _INNER_SPACE.sub(" ", _LINE_END_SPACE.sub("", prompt.strip()))
+
+def is_cacheable(temperature: float) -> bool:
+    """Only deterministic (temperature 0) generations are cached."""
+    return float(temperature) == 0.0
+
+def cache_key(prompt: str, model: str, max_tokens: int, temperature: float) -> str:
+    raw = json.dumps([normalize_prompt(prompt), model, int(max_tokens), float(temperature)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    Two-tier cache for generated text: an in-process LRU with TTL and an
+    optional SQLite tier that survives restarts. Safe to share across threads:
+    the lock only guards the in-process tier, and each thread has its own SQLite
+    connection (WAL mode), so disk lookups never hold up memory hits. Expired
+    rows are swept from disk on write, at most once per purge_interval.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS,
+                 db_path: Optional[str] = CACHE_DB_PATH, purge_interval: float = CACHE_PURGE_INTERVAL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.purge_interval = purge_interval
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+        self._local = threading.local()
+        self._next_purge = 0.0
+        if db_path:
+            db = self._conn()
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires)")
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, isolation_level=None)  # autocommit
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+        row = None
+        if self.db_path:
+            row = self._conn().execute(
+                "SELECT value, expires FROM responses WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone()
+        with self._lock:
+            if row is not None:
+                self._remember(key, row[0], row[1])
+                self._stats["disk_hits"] += 1
+                return row[0]
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        expires = now + self.ttl
+        with self._lock:
+            self._remember(key, value, expires)
+            purge = self.db_path and now >= self._next_purge
+            if purge:
+                self._next_purge = now + self.purge_interval
+        if self.db_path:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires) VALUES (?, ?, ?)", (key, value, expires)
+            )
+            if purge:
+                self.purge_expired(now)
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Delete expired rows from the disk tier; returns how many were removed."""
+        if not self.db_path:
+            return 0
+        now = time.time() if now is None else now
+        return self._conn().execute("DELETE FROM responses WHERE expires <= ?", (now,)).rowcount
+
+    def _remember(self, key: str, value: str, expires: float):
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+        if self.db_path:
+            self._conn().execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hits = self._stats["hits"] + self._stats["disk_hits"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "disk_tier": bool(self.db_path),
+            }
+
+# module-level cache shared by the WSGI and ASGI entrypoints
+response_cache = ResponseCache()
@@ -1,11 +1,14 @@
 # services/chat_service.py
 import uuid
 import time
-from typing import Dict, List, Any, Optional
+import heapq
+import itertools
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Any, Optional, Tuple
 
-# Simple in-memory session store for conversation state.
-# Structure: sessions[session_id] = {"created": ts, "last_active": ts, "messages": [ {"role": "user"/"assistant", "text": "..."} ]}
-sessions: Dict[str, Dict[str, Any]] = {}
+from services.context_service import ContextWindow
+from services.state_service import kv as state_kv
 
 # Configurable session behavior
 SESSION_TTL_SECONDS = 60 * 60 * 24  # 24 hours lifetime
@@ -17,52 +20,211 @@ class ChatError(RuntimeError):
 def _now() -> float:
     return time.time()
 
-def create_session(initial_user_message: Optional[str] = None) -> str:
-    session_id = str(uuid.uuid4())
-    ts = _now()
-    sessions[session_id] = {
-        "created": ts,
-        "last_active": ts,
-        "messages": []
+class Session:
+    """One conversation: bounded message history and model context, guarded by its own lock."""
+    __slots__ = ("created", "last_active", "messages", "total", "context", "lock")
+
+    def __init__(self, ts: float, max_messages: int):
+        self.created = ts
+        self.last_active = ts
+        self.messages: Deque[Dict[str, str]] = deque(maxlen=max_messages)
+        self.total = 0  # messages ever pushed; message i keeps index i after older ones are dropped
+        self.context = ContextWindow()
+        self.lock = threading.Lock()
+
+def _page(messages, total: int, since: Optional[int], limit: Optional[int]) -> Dict[str, Any]:
+    """
+    Slice retained messages by absolute index. Returns the page (each message with its
+    index), the oldest retained index, the total ever pushed and the next index to ask for.
+    """
+    first = total - len(messages)
+    start = first if since is None else min(max(since, first), total)
+    end = total if limit is None else min(total, start + max(0, limit))
+    window = itertools.islice(messages, start - first, end - first)
+    return {
+        "messages": [dict(m, index=i) for i, m in enumerate(window, start)],
+        "first_index": first,
+        "total": total,
+        "next": end,
     }
+
+class SessionStore:
+    """
+    Thread-safe in-memory session store.
+
+    Expiry uses a min-heap of (deadline, session_id). Touching a session only
+    updates last_active; stale heap entries are re-pushed with the real deadline
+    when they surface, so cleanup only visits sessions whose deadline has passed.
+    Message pushes are O(1): the per-session deque drops the oldest message itself.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_messages: Optional[int] = None):
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.sessions: Dict[str, Session] = {}
+        self._expiry: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def _ttl(self) -> float:
+        return SESSION_TTL_SECONDS if self.ttl is None else self.ttl
+
+    def create(self) -> str:
+        session_id = str(uuid.uuid4())
+        ts = _now()
+        max_messages = MAX_HISTORY_MESSAGES if self.max_messages is None else self.max_messages
+        with self._lock:
+            self.sessions[session_id] = Session(ts, max_messages)
+            heapq.heappush(self._expiry, (ts + self._ttl(), session_id))
+        return session_id
+
+    def get(self, session_id: str) -> Session:
+        s = self.sessions.get(session_id)
+        if s is None:
+            raise ChatError("session_not_found")
+        return s
+
+    def push(self, session_id: str, role: str, text: str):
+        s = self.get(session_id)
+        with s.lock:
+            s.messages.append({"role": role, "text": text})
+            s.total += 1
+            s.context.add(role, text)
+            s.last_active = _now()
+
+    def history(self, session_id: str) -> List[Dict[str, str]]:
+        s = self.get(session_id)
+        with s.lock:
+            return list(s.messages)
+
+    def history_page(self, session_id: str, since: Optional[int] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+        s = self.get(session_id)
+        with s.lock:
+            return _page(s.messages, s.total, since, limit)
+
+    def context_prompt(self, session_id: str) -> str:
+        s = self.get(session_id)
+        with s.lock:
+            return s.context.render()
+
+    def cleanup(self, now: Optional[float] = None) -> int:
+        """Drop expired sessions; returns how many were removed."""
+        now = _now() if now is None else now
+        ttl = self._ttl()
+        removed = 0
+        with self._lock:
+            while self._expiry and self._expiry[0][0] < now:
+                _, sid = heapq.heappop(self._expiry)
+                s = self.sessions.get(sid)
+                if s is None:
+                    continue
+                deadline = s.last_active + ttl
+                if deadline < now:
+                    del self.sessions[sid]
+                    removed += 1
+                else:
+                    heapq.heappush(self._expiry, (deadline, sid))
+        return removed
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.sessions
+
+class SharedSessionStore:
+    """
+    Session store on a shared KVStore (services/state_service.py), so any worker
+    process can serve any session without sticky routing. Each session is one
+    key holding its messages and ContextWindow state; pushes are atomic
+    read-modify-writes and every touch slides the key's TTL.
+    """
+
+    def __init__(self, kv, ttl: Optional[float] = None, max_messages: Optional[int] = None, prefix: str = "session:"):
+        self.kv = kv
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.prefix = prefix
+
+    def _ttl(self) -> float:
+        return SESSION_TTL_SECONDS if self.ttl is None else self.ttl
+
+    def _load(self, session_id: str) -> Dict[str, Any]:
+        state = self.kv.get(self.prefix + session_id)
+        if state is None:
+            raise ChatError("session_not_found")
+        return state
+
+    def create(self) -> str:
+        session_id = str(uuid.uuid4())
+        ts = _now()
+        state = {"created": ts, "last_active": ts, "messages": [], "total": 0, "context": ContextWindow().to_state()}
+        self.kv.set(self.prefix + session_id, state, ttl=self._ttl())
+        return session_id
+
+    def push(self, session_id: str, role: str, text: str):
+        max_messages = MAX_HISTORY_MESSAGES if self.max_messages is None else self.max_messages
+
+        def append(state):
+            if state is None:
+                raise ChatError("session_not_found")
+            state["messages"] = (state["messages"] + [{"role": role, "text": text}])[-max_messages:]
+            state["total"] = state.get("total", 0) + 1
+            context = ContextWindow.from_state(state["context"])
+            context.add(role, text)
+            state["context"] = context.to_state()
+            state["last_active"] = _now()
+            return state, None
+
+        self.kv.update(self.prefix + session_id, append, ttl=self._ttl())
+
+    def history(self, session_id: str) -> List[Dict[str, str]]:
+        return self._load(session_id)["messages"]
+
+    def history_page(self, session_id: str, since: Optional[int] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+        state = self._load(session_id)
+        return _page(state["messages"], state.get("total", len(state["messages"])), since, limit)
+
+    def context_prompt(self, session_id: str) -> str:
+        return ContextWindow.from_state(self._load(session_id)["context"]).render()
+
+    def cleanup(self, now: Optional[float] = None) -> int:
+        """Runs on every chat request, so it only sweeps the store periodically (see KVStore.maybe_purge)."""
+        return self.kv.maybe_purge(now=now)
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.kv.get(self.prefix + session_id) is not None
+
+def make_store(kv=None):
+    """In-memory store for a single process, or a shared one when a KV backend is configured."""
+    return SessionStore() if kv is None else SharedSessionStore(kv)
+
+# Process-wide store (STATE_BACKEND picks the backend); with the in-memory store,
+# `sessions` is the id -> Session mapping for callers/tests
+store = make_store(state_kv)
+sessions = getattr(store, "sessions", None)
+
+def create_session(initial_user_message: Optional[str] = None) -> str:
+    session_id = store.create()
     if initial_user_message:
         push_user_message(session_id, initial_user_message)
     return session_id
 
-def _prune_session_history(session_id: str):
-    s = sessions.get(session_id)
-    if not s:
-        return
-    msgs = s["messages"]
-    if len(msgs) > MAX_HISTORY_MESSAGES:
-        # preserve latest messages
-        sessions[session_id]["messages"] = msgs[-MAX_HISTORY_MESSAGES:]
-
 def push_user_message(session_id: str, text: str):
-    if session_id not in sessions:
-        raise ChatError("session_not_found")
-    sessions[session_id]["messages"].append({"role": "user", "text": text})
-    sessions[session_id]["last_active"] = _now()
-    _prune_session_history(session_id)
+    store.push(session_id, "user", text)
 
 def push_assistant_message(session_id: str, text: str):
-    if session_id not in sessions:
-        raise ChatError("session_not_found")
-    sessions[session_id]["messages"].append({"role": "assistant", "text": text})
-    sessions[session_id]["last_active"] = _now()
-    _prune_session_history(session_id)
+    store.push(session_id, "assistant", text)
 
 def get_history(session_id: str) -> List[Dict[str, str]]:
-    s = sessions.get(session_id)
-    if not s:
-        raise ChatError("session_not_found")
-    return list(s["messages"])
+    return store.history(session_id)
+
+def get_history_page(session_id: str, since: Optional[int] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+    """Messages with index >= since (all retained when None), at most limit of them."""
+    return store.history_page(session_id, since, limit)
+
+def get_context_prompt(session_id: str) -> str:
+    """Token-budgeted prompt for the session: running summary plus recent turns."""
+    return store.context_prompt(session_id)
 
 def cleanup_expired_sessions():
-    now = _now()
-    expired = [sid for sid, s in sessions.items() if (s["last_active"] + SESSION_TTL_SECONDS) < now]
-    for sid in expired:
-        del sessions[sid]
+    store.cleanup()
 
 def session_exists(session_id: str) -> bool:
-    return session_id in sessions
+    return session_id in store
@@ -0,0 +1,90 @@
+# services/context_service.py
+import os
+import re
+from collections import deque
+from typing import Deque, Tuple
+
+from services.token_service import count_tokens
+
+# Configurable context behavior
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))  # recent turns
+SUMMARY_TOKEN_BUDGET = int(os.getenv("CONTEXT_SUMMARY_TOKEN_BUDGET", "256"))  # running summary
+SUMMARY_LINE_CHARS = 160
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+def _gist(turn: str) -> str:
+    """First sentence of a turn, truncated: one line of the running summary."""
+    first = _SENTENCE_END.split(turn.replace("\n", " "), 1)[0]
+    if len(first) > SUMMARY_LINE_CHARS:
+        first = first[: SUMMARY_LINE_CHARS - 3] + "..."
+    return f"- {first}"
+
+class ContextWindow:
+    """
+    Incrementally assembled model prompt for one chat session.
+
+    Turns are serialized once when added and appended to a cached prefix. When the
+    recent turns exceed the token budget, the oldest ones are dropped from the
+    prefix and folded into a bounded running summary, so the rendered prompt stays
+    roughly constant in size however long the conversation gets.
+    """
+
+    def __init__(self, budget: int = None, summary_budget: int = None):
+        self.budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+        self.summary_budget = SUMMARY_TOKEN_BUDGET if summary_budget is None else summary_budget
+        self._turns: Deque[Tuple[str, int]] = deque()  # (serialized turn, tokens)
+        self._tokens = 0
+        self._serialized = ""
+        self._summary: Deque[Tuple[str, int]] = deque()
+        self._summary_tokens = 0
+        self._summary_text = ""
+
+    def add(self, role: str, text: str):
+        turn = f"{role}: {text}"
+        tokens = count_tokens(turn)
+        self._turns.append((turn, tokens))
+        self._tokens += tokens
+        self._serialized = f"{self._serialized}\n{turn}" if self._serialized else turn
+        # always keep the newest turn, even if it alone is over budget
+        while self._tokens > self.budget and len(self._turns) > 1:
+            old, old_tokens = self._turns.popleft()
+            self._tokens -= old_tokens
+            self._serialized = self._serialized[len(old) + 1:]
+            self._fold_into_summary(old)
+
+    def _fold_into_summary(self, turn: str):
+        line = _gist(turn)
+        tokens = count_tokens(line)
+        self._summary.append((line, tokens))
+        self._summary_tokens += tokens
+        while self._summary_tokens > self.summary_budget and len(self._summary) > 1:
+            _, dropped = self._summary.popleft()
+            self._summary_tokens -= dropped
+        self._summary_text = "\n".join(line for line, _ in self._summary)
+
+    @property
+    def tokens(self) -> int:
+        return self._tokens + self._summary_tokens
+
+    def to_state(self) -> dict:
+        """JSON-serializable snapshot, for session stores shared across processes."""
+        return {"turns": list(self._turns), "summary": list(self._summary)}
+
+    @classmethod
+    def from_state(cls, state: dict, budget: int = None, summary_budget: int = None) -> "ContextWindow":
+        window = cls(budget, summary_budget)
+        for turn, tokens in state.get("turns", ()):
+            window._turns.append((turn, tokens))
+            window._tokens += tokens
+        window._serialized = "\n".join(turn for turn, _ in window._turns)
+        for line, tokens in state.get("summary", ()):
+            window._summary.append((line, tokens))
+            window._summary_tokens += tokens
+        window._summary_text = "\n".join(line for line, _ in window._summary)
+        return window
+
+    def render(self) -> str:
+        if not self._summary_text:
+            return self._serialized
+        return f"Summary of earlier conversation:\n{self._summary_text}\n\nRecent turns:\n{self._serialized}"
@@ -0,0 +1,69 @@
+# services/generation_service.py
+"""
+The non-streaming generate path shared by the WSGI routes (app.py) and the ASGI
+server (asgi.py): validation, the response cache, token counters and the
+scheduler slot around one adapter call. Each server only wraps it in its own
+request/response handling, so the two cannot drift apart.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+from services.prompt_service import validate_and_prepare
+from services.cache_service import response_cache, cache_key, is_cacheable
+from services.metrics_service import metrics
+from services.token_service import count_tokens
+
+def prepare(data: Dict[str, Any], model: Optional[str]) -> Dict[str, Any]:
+    """Validate a {"prompt"|"text", "max_output_tokens"|"max_tokens", "temperature"} body; raises ValidationError."""
+    with metrics.span("validate"):
+        return validate_and_prepare(
+            data.get("prompt") or data.get("text") or "",
+            max_tokens=data.get("max_output_tokens") or data.get("max_tokens"),
+            temperature=data.get("temperature"),
+            model=model,
+        )
+
+def _lookup(adapter, prepared) -> Tuple[Optional[str], Optional[str]]:
+    """(cache key, cached output); the key is None for non-deterministic requests."""
+    if not is_cacheable(prepared["temperature"]):
+        return None, None
+    with metrics.span("cache_lookup"):
+        key = cache_key(prepared["prompt"], adapter.cache_identity, prepared["max_tokens"], prepared["temperature"])
+        return key, response_cache.get(key)
+
+def _sent(prepared):
+    metrics.inc("tokens_in_total", prepared["prompt_tokens"], help="Estimated prompt tokens sent upstream")
+
+def _received(key: Optional[str], out: str) -> Tuple[str, bool]:
+    if out:
+        metrics.inc("tokens_out_total", count_tokens(out), help="Estimated completion tokens received")
+        if key is not None:
+            response_cache.put(key, out)
+    return out, False
+
+def generate_prepared(adapter, scheduler, prepared, route_class: str = "generate", client=None) -> Tuple[str, bool]:
+    """Generate for a validated request, using the response cache for deterministic ones.
+    Upstream calls wait for a slot on `scheduler`. Returns (output, served_from_cache)."""
+    key, cached = _lookup(adapter, prepared)
+    if cached is not None:
+        return cached, True
+    _sent(prepared)
+    with scheduler.slot(route_class, client), metrics.span("adapter"):
+        out = adapter.generate(prepared["prompt"], max_tokens=prepared["max_tokens"],
+                               temperature=prepared["temperature"])
+    return _received(key, out)
+
+async def agenerate_prepared(adapter, scheduler, prepared, route_class: str = "generate",
+                             client=None) -> Tuple[str, bool]:
+    """Async counterpart of generate_prepared()."""
+    key, cached = _lookup(adapter, prepared)
+    if cached is not None:
+        return cached, True
+    _sent(prepared)
+    async with scheduler.aslot(route_class, client):
+        with metrics.span("adapter"):
+            out = await adapter.agenerate(prepared["prompt"], max_tokens=prepared["max_tokens"],
+                                          temperature=prepared["temperature"])
+    return _received(key, out)
+
+def output_payload(out: str, cached: bool) -> Dict[str, Any]:
+    return {"output": out, "cached": True} if cached else {"output": out}
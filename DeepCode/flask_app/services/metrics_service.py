@@ -0,0 +1,121 @@
+# services/metrics_service.py
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+# Latency histogram buckets (seconds), Prometheus-style upper bounds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(**labels) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+class Metrics:
+    """
+    Minimal in-process metrics registry: labeled counters and latency histograms,
+    rendered in the Prometheus text exposition format. Recording costs a lock and
+    a bisect, so it is cheap enough for the request hot path.
+    """
+
+    def __init__(self, prefix: str = "deepcode"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    def inc(self, name: str, value: float = 1, help: str = "", **labels):
+        key = _labels(**labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            if help:
+                self._help.setdefault(name, help)
+
+    def observe(self, name: str, seconds: float, help: str = "", **labels):
+        key = _labels(**labels)
+        slot = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = _Histogram()
+            hist.counts[slot] += 1
+            hist.sum += seconds
+            hist.count += 1
+            if help:
+                self._help.setdefault(name, help)
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        """Time a block into the stage latency histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_latency_seconds", time.perf_counter() - start,
+                         help="Latency of request stages", stage=stage, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = f"{self.prefix}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{full}{_format_labels(labels)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                full = f"{self.prefix}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                for labels, hist in sorted(series.items()):
+                    cumulative = 0
+                    for bound, n in zip(LATENCY_BUCKETS, hist.counts):
+                        cumulative += n
+                        le = _format_labels(labels, 'le="%g"' % bound)
+                        lines.append(f"{full}_bucket{le} {cumulative}")
+                    le = _format_labels(labels, 'le="+Inf"')
+                    lines.append(f"{full}_bucket{le} {hist.count}")
+                    lines.append(f"{full}_sum{_format_labels(labels)} {hist.sum:.6f}")
+                    lines.append(f"{full}_count{_format_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# process-wide registry
+metrics = Metrics()
+
+def record_request(route: str, status: int, latency: Optional[float] = None):
+    """Request-level series for one served API request, shared by the WSGI and ASGI paths."""
+    if latency is not None:
+        metrics.observe("request_latency_seconds", latency, help="End-to-end request latency", route=route)
+    metrics.inc("requests_total", help="API requests", route=route, status=status)
+    if status == 429:
+        metrics.inc("rate_limited_total", help="Requests rejected by the rate limiter", route=route)
+    elif status >= 500:
+        metrics.inc("errors_total", help="Requests that failed with a server error", route=route)
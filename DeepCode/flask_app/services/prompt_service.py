@@ -1,10 +1,19 @@
 # services/prompt_service.py
+import os
 import re
 
+from services.token_service import count_tokens, context_window, trim_to_tokens
+
 # Service-level defaults and limits
 DEFAULT_MAX_TOKENS = 256
 MAX_ALLOWED_TOKENS = 1024
-MAX_PROMPT_LENGTH = 5000  # characters
+# Cheap length guard before token counting: no prompt needs more characters than this
+# many per token of the model's context window
+PROMPT_MAX_CHARS_PER_TOKEN = int(os.getenv("PROMPT_MAX_CHARS_PER_TOKEN", "8"))
+MIN_OUTPUT_TOKENS = 16  # smallest completion worth sending upstream
+# What to do when prompt + MIN_OUTPUT_TOKENS would overflow the model's context window:
+# "reject" (400) or "trim" (keep the end of the prompt)
+PROMPT_OVERFLOW = os.getenv("PROMPT_OVERFLOW", "reject")
 MIN_TEMPERATURE = 0.0
 MAX_TEMPERATURE = 1.0
 
@@ -21,19 +30,43 @@ def sanitize_prompt(prompt: str) -> str:
     s = CONTROL_CHARS.sub("", s)
     return s
 
-def validate_and_prepare(prompt: str, max_tokens=None, temperature=None):
+def fit_to_context(prompt: str, max_tokens: int, model=None, overflow=None):
+    """
+    Make prompt + completion fit the model's context window.
+    Returns (prompt, prompt_tokens, max_tokens, trimmed); raises ValidationError on overflow
+    unless the overflow policy is "trim".
+    """
+    window = context_window(model)
+    trim = (overflow or PROMPT_OVERFLOW) == "trim"
+    max_chars = window * PROMPT_MAX_CHARS_PER_TOKEN
+    trimmed = False
+    if len(prompt) > max_chars:
+        if not trim:
+            raise ValidationError(f"prompt too long for model context ({len(prompt)} chars, window {window} tokens)")
+        prompt = prompt[-max_chars:].lstrip()  # bound the work trim_to_tokens does below
+        trimmed = True
+    prompt_tokens = count_tokens(prompt)
+    if prompt_tokens + MIN_OUTPUT_TOKENS > window:
+        if not trim:
+            raise ValidationError(
+                f"prompt too long for model context (~{prompt_tokens} tokens, window {window})"
+            )
+        prompt = trim_to_tokens(prompt, window - MIN_OUTPUT_TOKENS)
+        prompt_tokens = count_tokens(prompt)
+        trimmed = True
+    return prompt, prompt_tokens, min(max_tokens, window - prompt_tokens), trimmed
+
+def validate_and_prepare(prompt: str, max_tokens=None, temperature=None, model=None, overflow=None):
     """
-    Validate and return a dict with sanitized prompt, max_tokens (int), temperature (float).
-    Raises ValidationError on invalid input.
+    Validate and return a dict with sanitized prompt, max_tokens (int), temperature (float),
+    prompt_tokens (estimate) and trimmed (bool). max_tokens is reduced so prompt + output
+    fits the model's context window. Raises ValidationError on invalid input.
     """
     if prompt is None or (isinstance(prompt, str) and prompt.strip() == ""):
         raise ValidationError("prompt is required")
 
     s_prompt = sanitize_prompt(prompt)
 
-    if len(s_prompt) > MAX_PROMPT_LENGTH:
-        raise ValidationError(f"prompt too long (max {MAX_PROMPT_LENGTH} chars)")
-
     # Validate max_tokens
     try:
         if max_tokens is None:
@@ -62,8 +95,12 @@ def validate_and_prepare(prompt: str, max_tokens=None, temperature=None):
     if temperature > MAX_TEMPERATURE:
         temperature = MAX_TEMPERATURE
 
+    s_prompt, prompt_tokens, max_tokens, trimmed = fit_to_context(s_prompt, max_tokens, model, overflow)
+
     return {
         "prompt": s_prompt,
         "max_tokens": max_tokens,
         "temperature": temperature,
+        "prompt_tokens": prompt_tokens,
+        "trimmed": trimmed,
     }
@@ -0,0 +1,112 @@
+# services/rate_limit_service.py
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+def parse_route_budgets(spec: str) -> Dict[str, Tuple[int, float]]:
+    """
+    Parse "prefix=max/window,..." (e.g. "/api/chat/=60/60,/api/generate=10/60")
+    into {prefix: (max_requests, window_seconds)}. Malformed entries are skipped.
+    """
+    budgets = {}
+    for part in (spec or "").split(","):
+        prefix, _, budget = part.strip().partition("=")
+        limit, _, window = budget.partition("/")
+        try:
+            budgets[prefix.strip()] = (int(limit), float(window))
+        except ValueError:
+            continue
+    return budgets
+
+def budget_for(path: str, routes: Dict[str, Tuple[int, float]], default: Tuple[int, float]) -> Tuple[str, int, float]:
+    """Return (route_class, max_requests, window) using the longest matching prefix."""
+    best = None
+    for prefix in routes:
+        if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    if best is None:
+        return "default", default[0], default[1]
+    return best, routes[best][0], routes[best][1]
+
+class TokenBucketLimiter:
+    """
+    Token-bucket rate limiter with O(1) cost per request.
+
+    Each key holds [tokens, last_refill]; a bucket starts full at `capacity` and
+    refills at capacity/window tokens per second. Buckets are kept in LRU order and
+    the least recently seen key is evicted once max_keys is reached, so memory stays
+    bounded however many clients show up (an evicted client simply starts full).
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: Hashable, capacity: int, window: float, now: Optional[float] = None) -> float:
+        """Take one token. Returns 0.0 when allowed, else seconds until a token is available."""
+        now = time.time() if now is None else now
+        rate = capacity / window
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(capacity), now]
+                self._buckets[key] = bucket
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(float(capacity), bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return 0.0
+            return (1.0 - bucket[0]) / rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+class SharedTokenBucketLimiter:
+    """
+    TokenBucketLimiter with its buckets in a shared KVStore (services/state_service.py),
+    so every worker process draws from the same budget. Idle buckets expire after
+    one window, when they would have refilled anyway, and the periodic KV sweep
+    removes them, so storage stays proportional to recently active clients.
+    """
+
+    def __init__(self, kv, prefix: str = "rl:"):
+        self.kv = kv
+        self.prefix = prefix
+
+    def _key(self, key: Hashable) -> str:
+        parts = key if isinstance(key, tuple) else (key,)
+        return self.prefix + "|".join(str(p) for p in parts)
+
+    def acquire(self, key: Hashable, capacity: int, window: float, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        rate = capacity / window
+
+        def take(bucket):
+            if bucket is None:
+                tokens = float(capacity)
+            else:
+                tokens = min(float(capacity), bucket[0] + (now - bucket[1]) * rate)
+            if tokens >= 1.0:
+                return [tokens - 1.0, now], 0.0
+            return [tokens, now], (1.0 - tokens) / rate
+
+        wait = self.kv.update(self._key(key), take, ttl=window)
+        self.kv.maybe_purge()
+        return wait
+
+    def clear(self):
+        self.kv.purge_expired(self.prefix, now=float("inf"))
+
+def retry_after_header(wait: float) -> str:
+    return str(max(1, math.ceil(wait)))
@@ -0,0 +1,21 @@
+# services/request_service.py
+from flask import request, jsonify
+
+from services.rate_limit_service import retry_after_header
+
+def client_key() -> str:
+    """Identity used for rate limiting and fair scheduling."""
+    return request.remote_addr or request.headers.get("X-Forwarded-For", "unknown")
+
+def overloaded_body(e):
+    """(payload, Retry-After value or None) for a request the scheduler did not admit."""
+    retry_after = retry_after_header(e.retry_after) if e.retry_after else None
+    return {"error": "overloaded", "reason": e.reason, "detail": str(e)}, retry_after
+
+def overloaded_response(e):
+    """503 for a request the scheduler did not admit, with Retry-After when it has an estimate."""
+    payload, retry_after = overloaded_body(e)
+    resp = jsonify(payload)
+    if retry_after:
+        resp.headers["Retry-After"] = retry_after
+    return resp, 503
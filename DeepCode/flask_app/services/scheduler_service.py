@@ -0,0 +1,309 @@
+# services/scheduler_service.py
+"""
+Admission scheduler in front of the model adapter.
+
+At most max_inflight generations run at once. Callers beyond that wait in a
+self-clocked weighted fair queue: every (route class, client) pair is a flow
+whose requests get finish tags start + 1/weight, and the smallest tag runs next.
+A heavier route class (chat) therefore gets proportionally more slots than bulk
+generate/batch traffic, and within a class no single client can monopolize it.
+
+Queues are bounded (per class), and a waiting request is dropped as soon as its
+deadline leaves less time than a typical generation takes. Admission also sheds
+load early: when the predicted queue wait (requests ahead x EWMA generation time /
+max_inflight) exceeds LOAD_SHED_SLO_SECONDS, the request is rejected with a
+retry_after hint instead of joining a queue it would time out in.
+"""
+import os
+import time
+import heapq
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Hashable, Iterable, Iterator, Optional
+
+from services.metrics_service import metrics
+
+def parse_class_values(spec: str) -> Dict[str, float]:
+    """Parse "chat=4,generate=1" into {class: value}. Malformed entries are skipped."""
+    values = {}
+    for part in (spec or "").split(","):
+        name, _, value = part.strip().partition("=")
+        try:
+            values[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return values
+
+# Configurable scheduling behavior
+SCHEDULER_MAX_INFLIGHT = int(os.getenv("SCHEDULER_MAX_INFLIGHT", "32"))
+SCHEDULER_WEIGHTS = {"chat": 4.0, "generate": 2.0, "batch": 1.0,
+                     **parse_class_values(os.getenv("SCHEDULER_WEIGHTS", ""))}
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "256"))  # waiting requests per route class
+SCHEDULER_DEADLINES = {"chat": 30.0, "generate": 60.0, "batch": 300.0,
+                       **parse_class_values(os.getenv("SCHEDULER_DEADLINES", ""))}  # seconds from arrival
+LOAD_SHED_SLO_SECONDS = float(os.getenv("LOAD_SHED_SLO_SECONDS", "10"))  # 0 disables shedding
+SERVICE_TIME_ALPHA = 0.2  # EWMA weight for observed generation time
+MAX_IDLE_FLOWS = 10000
+
+class SchedulerRejected(RuntimeError):
+    """Raised when a request is not admitted: reason is "queue_full", "deadline" or "shed"."""
+
+    def __init__(self, reason: str, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.reason = reason
+        self.retry_after = retry_after  # seconds, when the client should try again
+
+class _Waiter:
+    __slots__ = ("route_class", "deadline", "granted", "cancelled", "event", "loop", "future")
+
+    def __init__(self, route_class: str, deadline: Optional[float], loop=None):
+        self.route_class = route_class
+        self.deadline = deadline
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def _wake(self, error: Optional[BaseException] = None):
+        if self.loop is None:
+            self.event.set()
+            return
+        def resolve():
+            if not self.future.done():
+                if error is None:
+                    self.future.set_result(True)
+                else:
+                    self.future.set_exception(error)
+        self.loop.call_soon_threadsafe(resolve)
+
+class FairScheduler:
+    def __init__(self, max_inflight: Optional[int] = None, weights: Optional[Dict[str, float]] = None,
+                 max_queue: Optional[int] = None, deadlines: Optional[Dict[str, float]] = None,
+                 slo: Optional[float] = None):
+        self.max_inflight = SCHEDULER_MAX_INFLIGHT if max_inflight is None else max_inflight
+        self.weights = dict(SCHEDULER_WEIGHTS if weights is None else weights)
+        self.max_queue = SCHEDULER_MAX_QUEUE if max_queue is None else max_queue
+        self.deadlines = dict(SCHEDULER_DEADLINES if deadlines is None else deadlines)
+        self.slo = LOAD_SHED_SLO_SECONDS if slo is None else slo
+        self._lock = threading.Lock()
+        self._heap = []  # (finish tag, seq, waiter)
+        self._seq = 0
+        self._flows: Dict[Hashable, float] = {}  # flow -> finish tag of its last request
+        self._virtual = 0.0
+        self._inflight = 0
+        self._queued: Dict[str, int] = {}
+        self._service_time: Optional[float] = None  # EWMA seconds per generation
+        self.dropped: Dict[str, int] = {"queue_full": 0, "deadline": 0, "shed": 0}
+
+    def deadline_for(self, route_class: str, now: Optional[float] = None) -> Optional[float]:
+        seconds = self.deadlines.get(route_class)
+        if not seconds:
+            return None
+        return (time.monotonic() if now is None else now) + seconds
+
+    def expected_service_time(self) -> float:
+        return self._service_time or 0.0
+
+    def _predicted_wait_locked(self) -> float:
+        """Little's law estimate of queue wait for a request joining now."""
+        if not self._service_time or self.max_inflight <= 0:
+            return 0.0
+        ahead = sum(self._queued.values()) + 1
+        return ahead * self._service_time / self.max_inflight
+
+    def predicted_wait(self) -> float:
+        with self._lock:
+            return self._predicted_wait_locked()
+
+    def _reject(self, route_class: str, reason: str, detail: str, retry_after: Optional[float] = None) -> SchedulerRejected:
+        with self._lock:
+            return self._reject_locked(route_class, reason, detail, retry_after)
+
+    def _reject_locked(self, route_class: str, reason: str, detail: str,
+                       retry_after: Optional[float] = None) -> SchedulerRejected:
+        self.dropped[reason] += 1
+        metrics.inc("scheduler_dropped_total", help="Requests dropped by the scheduler",
+                    route_class=route_class, reason=reason)
+        return SchedulerRejected(reason, detail, retry_after)
+
+    def _enqueue(self, route_class: str, client: Hashable, deadline: Optional[float], loop=None) -> Optional[_Waiter]:
+        """Admit immediately (returns None) or queue a waiter; raises SchedulerRejected."""
+        with self._lock:
+            if self._inflight < self.max_inflight and not self._heap:
+                self._inflight += 1  # a free slot starts now, whatever the typical generation time
+                return None
+            if deadline is not None and deadline - time.monotonic() < self.expected_service_time():
+                raise self._reject_locked(route_class, "deadline", "deadline too short for current generation time")
+            predicted = self._predicted_wait_locked()
+            if self.slo and predicted > self.slo:
+                # retry once the backlog ahead has drained back under the SLO
+                raise self._reject_locked(route_class, "shed",
+                                          f"predicted wait {predicted:.1f}s exceeds SLO {self.slo:g}s",
+                                          retry_after=predicted - self.slo)
+            if self._queued.get(route_class, 0) >= self.max_queue:
+                raise self._reject_locked(route_class, "queue_full",
+                                          f"{route_class} queue is full ({self.max_queue} waiting)",
+                                          retry_after=predicted or None)
+            flow = (route_class, client)
+            start = max(self._virtual, self._flows.get(flow, 0.0))
+            finish = start + 1.0 / self.weights.get(route_class, 1.0)
+            self._flows[flow] = finish
+            if len(self._flows) > MAX_IDLE_FLOWS:
+                # flows whose last tag is behind virtual time would restart there anyway
+                self._flows = {f: tag for f, tag in self._flows.items() if tag > self._virtual}
+            waiter = _Waiter(route_class, deadline, loop)
+            self._seq += 1
+            heapq.heappush(self._heap, (finish, self._seq, waiter))
+            self._queued[route_class] = self._queued.get(route_class, 0) + 1
+            return waiter
+
+    def _dispatch_locked(self):
+        now = time.monotonic()
+        while self._inflight < self.max_inflight and self._heap:
+            finish, _, waiter = heapq.heappop(self._heap)
+            if waiter.cancelled:
+                continue  # already taken off the queue count by _abandon
+            self._queued[waiter.route_class] -= 1
+            if waiter.deadline is not None and waiter.deadline - now < self.expected_service_time():
+                waiter.cancelled = True
+                waiter._wake(self._reject_locked(waiter.route_class, "deadline", "deadline passed while queued"))
+                continue
+            self._virtual = finish
+            self._inflight += 1
+            waiter.granted = True
+            waiter._wake()
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Give up waiting; returns True if the slot was granted meanwhile (caller must release it)."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            if not waiter.cancelled:
+                waiter.cancelled = True
+                self._queued[waiter.route_class] -= 1
+            return False
+
+    def release(self, service_seconds: Optional[float] = None):
+        with self._lock:
+            if service_seconds is not None:
+                prev = self._service_time
+                self._service_time = service_seconds if prev is None else (
+                    (1 - SERVICE_TIME_ALPHA) * prev + SERVICE_TIME_ALPHA * service_seconds)
+            self._inflight -= 1
+            self._dispatch_locked()
+
+    def acquire(self, route_class: str, client: Hashable = None, deadline: Optional[float] = None):
+        """Block until a slot is granted; raises SchedulerRejected."""
+        started = time.monotonic()
+        waiter = self._enqueue(route_class, client, deadline)
+        if waiter is not None:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not waiter.event.wait(timeout) and not self._abandon(waiter):
+                raise self._reject(route_class, "deadline", "deadline passed while queued")
+            if not waiter.granted:
+                # woken without a grant: the dispatcher dropped it for its deadline
+                raise SchedulerRejected("deadline", "deadline passed while queued")
+        self._observe_wait(route_class, started)
+
+    async def aacquire(self, route_class: str, client: Hashable = None, deadline: Optional[float] = None):
+        """Async acquire; waiting does not block the event loop."""
+        started = time.monotonic()
+        waiter = self._enqueue(route_class, client, deadline, loop=asyncio.get_running_loop())
+        if waiter is not None:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter):
+                    raise self._reject(route_class, "deadline", "deadline passed while queued")
+            except asyncio.CancelledError:
+                if self._abandon(waiter):
+                    self.release()
+                raise
+        self._observe_wait(route_class, started)
+
+    def _observe_wait(self, route_class: str, started: float):
+        metrics.observe("queue_wait_seconds", time.monotonic() - started,
+                        help="Time spent waiting for a generation slot", route_class=route_class)
+
+    @contextmanager
+    def slot(self, route_class: str, client: Hashable = None, deadline: Optional[float] = None,
+             observe: bool = True):
+        """Hold a slot for the block; its duration feeds the service-time EWMA when observe is set."""
+        self.acquire(route_class, client, deadline if deadline is not None else self.deadline_for(route_class))
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started if observe else None)
+
+    @asynccontextmanager
+    async def aslot(self, route_class: str, client: Hashable = None, deadline: Optional[float] = None):
+        await self.aacquire(route_class, client, deadline if deadline is not None else self.deadline_for(route_class))
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stream(self, chunks: Iterable[str], route_class: str, client: Hashable = None) -> "HeldStream":
+        """
+        Acquire a slot now, so a rejection (SchedulerRejected) surfaces before any
+        response headers are sent, and return the chunks as a HeldStream that keeps
+        the slot until it is exhausted or closed.
+        """
+        self.acquire(route_class, client, self.deadline_for(route_class))
+        return HeldStream(self, chunks)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "inflight": self._inflight,
+                "max_inflight": self.max_inflight,
+                "queued": {k: v for k, v in self._queued.items() if v},
+                "service_time_s": round(self._service_time, 3) if self._service_time is not None else None,
+                "predicted_wait_s": round(self._predicted_wait_locked(), 3),
+                "slo_s": self.slo,
+                "dropped": dict(self.dropped),
+            }
+
+class HeldStream:
+    """Chunk iterator owning one scheduler slot; exhaustion, an error or close() releases it once."""
+
+    def __init__(self, scheduler: FairScheduler, chunks: Iterable[str]):
+        self._scheduler = scheduler
+        self._chunks = iter(chunks)
+        self._held = True
+        self._lock = threading.Lock()
+
+    def __iter__(self) -> Iterator[str]:
+        return self
+
+    def __next__(self) -> str:
+        try:
+            return next(self._chunks)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        with self._lock:
+            if not self._held:
+                return
+            self._held = False
+        try:
+            close = getattr(self._chunks, "close", None)
+            if close is not None:
+                close()
+        finally:
+            # a stream lasts as long as the client keeps reading; that is not a generation-time sample
+            self._scheduler.release()
+
+    def __del__(self):
+        # safety net for a response that is dropped before it is ever iterated or closed
+        self.close()
+
+# process-wide scheduler shared by the WSGI and ASGI entrypoints
+scheduler = FairScheduler()
@@ -0,0 +1,34 @@
+# services/serialization_service.py
+import os
+import gzip
+import json
+from flask import Response, request
+
+try:  # optional (requirements-optional.txt): several times faster than the stdlib encoder for large payloads
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson installed
+    orjson = None
+
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))  # smaller bodies are not worth compressing
+GZIP_LEVEL = 5
+
+def dumps(payload) -> bytes:
+    """Compact UTF-8 JSON, via orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def accepts_gzip() -> bool:
+    return "gzip" in (request.headers.get("Accept-Encoding") or "").lower()
+
+def json_response(payload, status: int = 200, headers=None) -> Response:
+    """JSON response, gzip-compressed when the client accepts it and the body is large enough."""
+    body = dumps(payload)
+    resp = Response(body, status=status, mimetype="application/json")
+    resp.headers["Vary"] = "Accept-Encoding"
+    if len(body) >= GZIP_MIN_BYTES and accepts_gzip():
+        resp.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        resp.headers["Content-Encoding"] = "gzip"
+    for name, value in (headers or {}).items():
+        resp.headers[name] = value
+    return resp
@@ -0,0 +1,222 @@
+# services/state_service.py
+"""
+Pluggable key-value backends for state that must be shared by every worker process
+(chat sessions, rate-limit buckets).
+
+STATE_BACKEND selects the backend:
+    memory              per-process structures (default; one worker only)
+    local               LocalKV: in-process stand-in with the semantics of a networked
+                        KV store (JSON values, TTLs, atomic read-modify-write)
+    sqlite:///path.db   SQLiteKV: one WAL-mode database file shared by all workers on a host
+
+Values are JSON-serializable objects. update() is the only primitive writers need:
+it runs fn(old_value) -> (new_value, result) atomically for one key.
+"""
+import os
+import json
+import time
+import heapq
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("STATE_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+STATE_PURGE_INTERVAL = float(os.getenv("STATE_PURGE_INTERVAL", "60"))  # seconds between expiry sweeps
+
+# fn(old value or None) -> (new value or None to delete, result returned to the caller)
+Updater = Callable[[Optional[Any]], Tuple[Optional[Any], Any]]
+
+class KVStore(ABC):
+    _next_purge = 0.0
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, key: str, fn: Updater, ttl: Optional[float] = None) -> Any:
+        """Atomically replace key's value with fn's and refresh its TTL; returns fn's result."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def purge_expired(self, prefix: str = "", now: Optional[float] = None) -> int:
+        """Remove expired keys under prefix; returns how many were removed."""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.update(key, lambda _old: (value, None), ttl=ttl)
+
+    def maybe_purge(self, now: Optional[float] = None) -> int:
+        """
+        Remove expired keys under every prefix, at most once per STATE_PURGE_INTERVAL.
+        Callers on the request path use this instead of purge_expired, so keys nobody
+        reads again (idle rate-limit buckets, abandoned sessions) still go away.
+        """
+        now = time.time() if now is None else now
+        if now < self._next_purge:
+            return 0
+        self._next_purge = now + STATE_PURGE_INTERVAL
+        return self.purge_expired("", now=now)
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__}
+
+class LocalKV(KVStore):
+    """
+    In-process KV store with networked-store semantics: values round-trip through
+    JSON (so callers cannot share mutable objects by accident) and expire by TTL.
+    Use it to develop and test against the shared-state code paths on one process.
+
+    Expiry uses a min-heap of (expires, key) with one entry per key: sliding a TTL
+    forward leaves the entry in place, and it is re-pushed with the real deadline
+    when it surfaces, so a purge only visits keys that may have expired.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}  # key -> (json, expires)
+        self._expiry: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            raw = self._live(key, time.time())
+        return None if raw is None else json.loads(raw)
+
+    def update(self, key: str, fn: Updater, ttl: Optional[float] = None) -> Any:
+        now = time.time()
+        with self._lock:
+            raw = self._live(key, now)
+            value, result = fn(None if raw is None else json.loads(raw))
+            if value is None:
+                self._data.pop(key, None)
+            else:
+                expires = now + ttl if ttl else None
+                old = self._data.get(key)
+                self._data[key] = (json.dumps(value), expires)
+                # an existing entry at or before the new deadline already covers this key
+                if expires is not None and (old is None or old[1] is None or expires < old[1]):
+                    heapq.heappush(self._expiry, (expires, key))
+        return result
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def purge_expired(self, prefix: str = "", now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        removed = 0
+        keep = []  # expired entries outside prefix
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                deadline, key = heapq.heappop(self._expiry)
+                entry = self._data.get(key)
+                if entry is None or entry[1] is None:
+                    continue  # deleted, or no longer has a TTL
+                if entry[1] > now:
+                    heapq.heappush(self._expiry, (entry[1], key))  # TTL slid forward since
+                elif key.startswith(prefix):
+                    del self._data[key]
+                    removed += 1
+                else:
+                    keep.append((deadline, key))
+            for item in keep:
+                heapq.heappush(self._expiry, item)
+        return removed
+
+class SQLiteKV(KVStore):
+    """
+    KV store in a SQLite database in WAL mode, shared by every process that opens
+    the same file. Each thread gets its own connection; update() runs inside
+    BEGIN IMMEDIATE, so read-modify-write is atomic across processes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        db = self._conn()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires)")
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # autocommit mode; transactions are opened explicitly in update()
+            db = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000.0, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def update(self, key: str, fn: Updater, ttl: Optional[float] = None) -> Any:
+        db = self._conn()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, now)
+            ).fetchone()
+            value, result = fn(None if row is None else json.loads(row[0]))
+            if value is None:
+                db.execute("DELETE FROM kv WHERE key = ?", (key,))
+            else:
+                db.execute(
+                    "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), now + ttl if ttl else None),
+                )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return result
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def purge_expired(self, prefix: str = "", now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        cur = self._conn().execute(
+            "DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ? AND key >= ? AND key < ?",
+            (now, prefix, prefix + "\U0010ffff"),
+        )
+        return cur.rowcount
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": "SQLiteKV", "path": self.path}
+
+def make_kv(spec: Optional[str] = None) -> Optional[KVStore]:
+    """KV store for a STATE_BACKEND spec, or None for per-process memory state."""
+    spec = (STATE_BACKEND if spec is None else spec).strip()
+    if spec in ("", "memory"):
+        return None
+    if spec == "local":
+        return LocalKV()
+    if spec.startswith("sqlite:///") and len(spec) > len("sqlite:///"):
+        # sqlite:///relative.db or sqlite:////absolute/path.db
+        return SQLiteKV(spec[len("sqlite:///"):])
+    raise ValueError(f"Unknown STATE_BACKEND: {spec!r}")
+
+# process-wide shared state (None when STATE_BACKEND=memory)
+kv = make_kv()
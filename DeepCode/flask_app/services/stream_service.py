@@ -0,0 +1,62 @@
+# services/stream_service.py
+import json
+from typing import Callable, Iterable, Iterator, Optional
+
+SSE_MIMETYPE = "text/event-stream"
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+def wants_stream(data: dict, args=None) -> bool:
+    """Streaming is opt-in via {"stream": true} in the body or ?stream=1."""
+    flag = data.get("stream")
+    if flag is None and args is not None:
+        flag = args.get("stream")
+    if isinstance(flag, str):
+        return flag.lower() in ("1", "true", "yes")
+    return bool(flag)
+
+def stream_format(accept_header: Optional[str]) -> str:
+    """Chunked JSON lines when the client asks for them, SSE otherwise."""
+    if accept_header and NDJSON_MIMETYPE in accept_header:
+        return "ndjson"
+    return "sse"
+
+def mimetype_for(fmt: str) -> str:
+    return NDJSON_MIMETYPE if fmt == "ndjson" else SSE_MIMETYPE
+
+def encode_event(payload: dict, fmt: str) -> str:
+    data = json.dumps(payload, ensure_ascii=False)
+    if fmt == "ndjson":
+        return data + "\n"
+    return f"data: {data}\n\n"
+
+def relay(
+    chunks: Iterable[str],
+    fmt: str,
+    on_complete: Optional[Callable[[str], None]] = None,
+    extra: Optional[dict] = None,
+) -> Iterator[str]:
+    """
+    Encode text chunks as they arrive, then a final {"done": true, "output": ...} event.
+    on_complete receives the assembled text before the final event is sent; any
+    failure (generation or on_complete) is reported as an error event.
+    """
+    parts = []
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            yield encode_event({"delta": chunk}, fmt)
+        output = "".join(parts)
+        if on_complete is not None:
+            on_complete(output)
+    except Exception as e:
+        yield encode_event({"error": "generation_failed", "detail": str(e)}, fmt)
+        return
+    finally:
+        # a client that disconnects mid-stream closes us; pass that on to the source
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+    final = {"done": True, "output": output}
+    if extra:
+        final.update(extra)
+    yield encode_event(final, fmt)
@@ -0,0 +1,69 @@
+# services/token_service.py
+import os
+import re
+from functools import lru_cache
+from typing import Optional
+
+# Context windows (prompt + output tokens) of the models we route to
+MODEL_CONTEXT_WINDOWS = {
+    "gemini-1.0-pro": 30720,
+    "gemini-pro": 30720,
+    "gemini-1.5-flash": 1048576,
+    "gemini-1.5-pro": 2097152,
+    "gemini-2.0-flash": 1048576,
+    "llama3": 8192,
+    "stub": 8192,
+}
+DEFAULT_CONTEXT_WINDOW = 32768
+CONTEXT_WINDOW_OVERRIDE = os.getenv("MODEL_CONTEXT_TOKENS")  # force one window for every model
+# The estimate errs high on purpose; the margin covers tokenizer differences between models
+TOKEN_ESTIMATE_MARGIN = float(os.getenv("TOKEN_ESTIMATE_MARGIN", "1.1"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+
+# Letter runs, digit groups of up to 3, newline runs, and any other single character
+_PIECES = re.compile(r"[A-Za-z]+|\d{1,3}|\n+|[^\sA-Za-z\d]")
+
+def _estimate(text: str) -> int:
+    """
+    BPE-like count without a tokenizer: a word costs one token per 6 letters (at
+    least one), digit groups and punctuation one each, non-ASCII characters one
+    each, and spaces are free (they merge into the following word).
+    """
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        if piece[0].isalpha() and piece.isascii():
+            tokens += 1 + len(piece) // 6
+        else:
+            tokens += 1
+    return int(tokens * TOKEN_ESTIMATE_MARGIN) + 1
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def count_tokens(text: str) -> int:
+    """Memoized token estimate; repeated prompts (retries, cached system text) cost a dict lookup."""
+    return _estimate(text)
+
+def context_window(model: Optional[str]) -> int:
+    """Context size for a model name, matching the longest known prefix ("models/gemini-1.5-flash-002")."""
+    if CONTEXT_WINDOW_OVERRIDE:
+        return int(CONTEXT_WINDOW_OVERRIDE)
+    name = (model or "").lower()
+    if name.startswith("models/"):
+        name = name[len("models/"):]
+    best = None
+    for known in MODEL_CONTEXT_WINDOWS:
+        if name.startswith(known) and (best is None or len(known) > len(best)):
+            best = known
+    return MODEL_CONTEXT_WINDOWS[best] if best else DEFAULT_CONTEXT_WINDOW
+
+def trim_to_tokens(text: str, budget: int) -> str:
+    """Keep the end of text (the most recent content) within budget tokens."""
+    if count_tokens(text) <= budget:
+        return text
+    lo, hi = 0, len(text)  # find the smallest cut whose tail fits
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _estimate(text[mid:]) <= budget:
+            hi = mid
+        else:
+            lo = mid + 1
+    return text[lo:].lstrip()
@@ -0,0 +1,115 @@
+# startup_profile.py
+"""
+Startup profiling for the Flask app.
+
+Imports app.py in a fresh interpreter with `-X importtime`, then reports:
+- time until /api/health answers (import + first request, warm-up disabled),
+- how long adapter.warm_up() takes to load the model SDK afterwards,
+- the slowest modules and top-level packages by cumulative import time,
+- the modules whose import was deferred to the warm-up.
+
+Typical usage:
+    python startup_profile.py
+    python startup_profile.py --top 25 --json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MARKER = "-- startup complete --"
+
+# Runs in the child interpreter; prints one JSON line of timings on stdout
+_CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+status = app.app.test_client().get("/api/health").status_code
+t2 = time.perf_counter()
+sys.stderr.write("%s\\n" % MARKER)
+sys.stderr.flush()
+app.adapter.warm_up()
+t3 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "health_s": t2 - t0, "health_status": status, "warmup_s": t3 - t2}))
+"""
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Parse `-X importtime` lines into {module, self_us, cumulative_us, depth}."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            rows.append({
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip())) // 2,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            })
+        except ValueError:
+            continue
+    return rows
+
+def by_package(rows: List[Dict]) -> Dict[str, float]:
+    """Self time summed per top-level package (google.generativeai -> google), in ms."""
+    totals: Dict[str, float] = {}
+    for row in rows:
+        root = row["module"].split(".")[0]
+        totals[root] = totals.get(root, 0.0) + row["self_us"] / 1000.0
+    return dict(sorted(totals.items(), key=lambda kv: kv[1], reverse=True))
+
+def profile(top: int = 15) -> Dict:
+    env = dict(os.environ, ADAPTER_WARMUP="0")
+    child = _CHILD.replace("MARKER", repr(MARKER))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", child], cwd=HERE, env=env,
+                          capture_output=True, text=True)
+    timings_line = next((l for l in reversed(proc.stdout.splitlines()) if l.startswith("{")), None)
+    if proc.returncode != 0 or timings_line is None:
+        raise RuntimeError(f"profiling run failed (exit {proc.returncode}): {proc.stderr[-2000:]}")
+    timings = json.loads(timings_line)
+    # imports before the marker are on the path to /api/health; the rest are the deferred SDK load
+    startup_log, _, warmup_log = proc.stderr.partition(MARKER)
+    rows = parse_importtime(startup_log)
+    slowest = sorted(rows, key=lambda r: r["cumulative_us"], reverse=True)[:top]
+    warmup_rows = [r for r in parse_importtime(warmup_log) if r["depth"] == 0]
+    return {
+        "import_ms": round(timings["import_s"] * 1000, 1),
+        "health_ms": round(timings["health_s"] * 1000, 1),
+        "health_status": timings["health_status"],
+        "warmup_ms": round(timings["warmup_s"] * 1000, 1),
+        "modules": [{"module": r["module"], "cumulative_ms": round(r["cumulative_us"] / 1000, 1),
+                     "self_ms": round(r["self_us"] / 1000, 1)} for r in slowest],
+        "packages_ms": {k: round(v, 1) for k, v in list(by_package(rows).items())[:top]},
+        "deferred": [{"module": r["module"], "cumulative_ms": round(r["cumulative_us"] / 1000, 1)}
+                     for r in sorted(warmup_rows, key=lambda r: r["cumulative_us"], reverse=True)[:top]],
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Report per-module import time for app startup")
+    ap.add_argument("--top", type=int, default=15, help="number of modules/packages to list")
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = ap.parse_args()
+
+    report = profile(top=args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"import app: {report['import_ms']} ms, /api/health answered ({report['health_status']}) "
+          f"after {report['health_ms']} ms, SDK warm-up: {report['warmup_ms']} ms")
+    print(f"\n{'module':<60}{'cumulative ms':>15}{'self ms':>10}")
+    for m in report["modules"]:
+        print(f"{m['module']:<60}{m['cumulative_ms']:>15}{m['self_ms']:>10}")
+    print(f"\n{'package':<30}{'self ms (sum)':>15}")
+    for pkg, ms in report["packages_ms"].items():
+        print(f"{pkg:<30}{ms:>15}")
+    print(f"\n{'deferred to warm-up':<60}{'cumulative ms':>15}")
+    for m in report["deferred"]:
+        print(f"{m['module']:<60}{m['cumulative_ms']:>15}")
+
+if __name__ == "__main__":
+    main()
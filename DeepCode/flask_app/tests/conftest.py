@@ -0,0 +1,18 @@
+import os
+import atexit
+import shutil
+import tempfile
+import pytest
+
+# Set before app is imported: adapter warm-up resolves (and saves) the dispatch plan
+_manifest_dir = tempfile.mkdtemp(prefix="deepcode-tests-")
+atexit.register(shutil.rmtree, _manifest_dir, ignore_errors=True)
+os.environ["GEMINI_DISPATCH_MANIFEST"] = os.path.join(_manifest_dir, "dispatch.json")
+
+import app as app_module
+
+@pytest.fixture(autouse=True)
+def _fresh_rate_limits():
+    """Every test client shares 127.0.0.1's bucket; start each test with a full one."""
+    app_module.RATE_LIMIT.clear()
+    yield
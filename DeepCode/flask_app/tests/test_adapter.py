@@ -1,3 +1,4 @@
+import os
 import json
 import time
 import pytest
@@ -103,3 +104,183 @@ def test_rate_limit(client, monkeypatch):
         app_module.RATE_LIMIT_MAX = orig_max
         # clear RATE_LIMIT store to avoid polluting other tests
         app_module.RATE_LIMIT.clear()
+
+def test_model_handle_built_once_and_reused():
+    from adapters.dispatch import HandleCache
+    built = []
+
+    def factory(name):
+        built.append(name)
+        return object()
+
+    cache = HandleCache(factory)
+    first = cache.get("gemini-1.5-flash")
+    assert cache.get("gemini-1.5-flash") is first
+    assert built == ["gemini-1.5-flash"]
+
+def test_dispatch_manifest_roundtrip(tmp_path):
+    from adapters.dispatch import probe_plan, save_manifest, load_manifest
+    plan = probe_plan()
+    if plan is None:
+        pytest.skip("no Gemini SDK installed")
+    path = str(tmp_path / "dispatch.json")
+    save_manifest(plan, path)
+    loaded = load_manifest(path)
+    assert loaded["sdk"] == plan["sdk"]
+    assert loaded["entrypoint"] == plan["entrypoint"]
+
+def test_dispatch_manifest_stays_out_of_the_source_tree(tmp_path, monkeypatch):
+    from adapters import dispatch
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(dispatch.__file__)))
+    assert not os.path.abspath(dispatch.DEFAULT_MANIFEST_PATH).startswith(package_dir + os.sep)
+    path = str(tmp_path / "nested" / "dispatch.json")
+    monkeypatch.setenv("GEMINI_DISPATCH_MANIFEST", path)
+    assert dispatch.manifest_path() == path
+    dispatch.save_manifest({"sdk": "google.genai", "entrypoint": "generate_text"})
+    assert os.path.exists(path)
+
+def test_manifest_with_unverifiable_entrypoint_is_reprobed(tmp_path):
+    from adapters.dispatch import save_manifest, load_manifest
+    path = str(tmp_path / "dispatch.json")
+    save_manifest({"sdk": "google.generativeai", "entrypoint": "get_model.generate_content"}, path)
+    assert load_manifest(path) is None
+
+def test_generate_text_entrypoint_honours_timeout():
+    import threading
+    from adapters.dispatch import invoke
+    release = threading.Event()
+
+    class Handle:
+        def generate_text(self, **kwargs):
+            release.wait(2)
+            return "late"
+    started = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        invoke({"entrypoint": "generate_text"}, Handle(), "m", "p", timeout=0.05)
+    assert time.perf_counter() - started < 1
+    release.set()
+    assert invoke({"entrypoint": "generate_text"}, Handle(), "m", "p", timeout=1) == "late"
+
+def test_generate_stream_sse(client, monkeypatch):
+    def fake_stream(prompt, max_tokens=256, temperature=0.0):
+        yield "Hello "
+        yield "world"
+    monkeypatch.setattr(adapter, "generate_stream", fake_stream)
+
+    rv = client.post("/api/generate", data=json.dumps({"prompt": "hi", "stream": True}), content_type="application/json")
+    assert rv.status_code == 200
+    assert rv.mimetype == "text/event-stream"
+    events = [json.loads(line[len("data: "):]) for line in rv.get_data(as_text=True).split("\n\n") if line]
+    assert [e.get("delta") for e in events[:-1]] == ["Hello ", "world"]
+    assert events[-1] == {"done": True, "output": "Hello world"}
+
+def test_repeat_prompt_served_from_cache(client, monkeypatch):
+    from services.cache_service import response_cache
+    response_cache.clear()
+    calls = []
+
+    def counting_generate(prompt, max_tokens=256, temperature=0.0):
+        calls.append(prompt)
+        return "CACHED-ONCE"
+    monkeypatch.setattr(adapter, "generate", counting_generate)
+
+    for _ in range(3):
+        rv = client.post("/api/generate", data=json.dumps({"prompt": "cache  me"}), content_type="application/json")
+        assert rv.get_json()["output"] == "CACHED-ONCE"
+    assert len(calls) == 1
+
+    stats = client.get("/api/health").get_json()["cache"]
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+def test_identical_inflight_generations_are_coalesced(monkeypatch):
+    import threading
+    from adapters.gemini_adapter import GeminiAdapter
+
+    a = GeminiAdapter()
+    a.client = a.client or object()
+    calls = []
+    release = threading.Event()
+
+    def slow_once(prompt, max_tokens, temperature):
+        calls.append(prompt)
+        release.wait(2)
+        return "shared"
+    monkeypatch.setattr(a, "_generate_once", slow_once)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(a.generate("same prompt"))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    deadline = time.time() + 2
+    while a.info()["coalesced"] < 4 and time.time() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert results == ["shared"] * 5
+    assert calls == ["same prompt"]
+    assert a.info()["coalesced"] == 4
+
+def test_cancelled_leader_does_not_cancel_coalesced_followers():
+    import asyncio
+    from adapters.singleflight import SingleFlight
+
+    flight = SingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "shared"
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.ado("k", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.ado("k", slow))
+        await asyncio.sleep(0.01)
+        leader.cancel()  # e.g. the leader lost a hedge
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == "shared"
+    assert calls == [1]
+    assert flight.collapsed == 1
+
+def test_generate_batch_per_item_results(client, monkeypatch):
+    def fake_generate(prompt, max_tokens=256, temperature=0.0):
+        if prompt == "boom":
+            raise RuntimeError("upstream down")
+        return f"{prompt}:{max_tokens}"
+    monkeypatch.setattr(adapter, "generate", fake_generate)
+
+    payload = {"items": [
+        {"prompt": "batch one", "max_output_tokens": 10, "temperature": 0.5},
+        {"prompt": ""},
+        {"prompt": "boom", "temperature": 0.5},
+        {"prompt": "batch four", "max_output_tokens": 999999, "temperature": 0.5},
+    ], "parallelism": 2}
+    rv = client.post("/api/generate/batch", data=json.dumps(payload), content_type="application/json")
+    assert rv.status_code == 200
+    results = rv.get_json()["results"]
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert results[0]["output"] == "batch one:10"
+    assert results[1]["error"] == "invalid_input"
+    assert results[2]["error"] == "generation_failed"
+    assert results[3]["output"] == "batch four:1024"
+
+def test_metrics_endpoint_reports_stages_and_counters(client, monkeypatch):
+    monkeypatch.setattr(adapter, "generate", lambda prompt, max_tokens=256, temperature=0.0: "metered output")
+    client.post("/api/generate", data=json.dumps({"prompt": "metrics please", "temperature": 0.3}), content_type="application/json")
+
+    rv = client.get("/api/metrics")
+    assert rv.status_code == 200
+    assert rv.content_type.startswith("text/plain")
+    body = rv.get_data(as_text=True)
+    assert 'deepcode_requests_total{route="/api/generate",status="200"}' in body
+    for stage in ("validate", "adapter", "serialize"):
+        assert f'deepcode_stage_latency_seconds_count{{stage="{stage}"}}' in body
+    assert "deepcode_tokens_in_total" in body
+    assert "deepcode_tokens_out_total" in body
@@ -0,0 +1,87 @@
+import json
+import asyncio
+import pytest
+
+pytest.importorskip("asgiref")
+
+from app import adapter
+from asgi import application
+
+def _call(method, path, payload=None, query=b""):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    scope = {
+        "type": "http", "method": method, "path": path, "raw_path": path.encode(),
+        "query_string": query,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+        "scheme": "http", "http_version": "1.1", "root_path": "",
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    status = sent[0]["status"]
+    data = b"".join(m.get("body", b"") for m in sent[1:])
+    if dict(sent[0]["headers"]).get(b"content-type", b"").startswith(b"text/event-stream"):
+        return status, data.decode()
+    return status, json.loads(data)
+
+def test_asgi_generate_uses_agenerate(monkeypatch):
+    async def fake_agenerate(prompt, max_tokens=256, temperature=0.0):
+        return f"ASYNC: {prompt}"
+    monkeypatch.setattr(adapter, "agenerate", fake_agenerate)
+
+    status, j = _call("POST", "/api/generate", {"prompt": "Hello async"})
+    assert status == 200
+    assert j["output"] == "ASYNC: Hello async"
+
+def test_asgi_backend_cancellation_becomes_500(monkeypatch):
+    async def cancelled_agenerate(prompt, max_tokens=256, temperature=0.0):
+        raise asyncio.CancelledError()
+    monkeypatch.setattr(adapter, "agenerate", cancelled_agenerate)
+
+    status, j = _call("POST", "/api/generate", {"prompt": "Hello cancelled"})
+    assert status == 500
+    assert j["error"] == "generation_failed"
+
+def test_asgi_delegates_other_routes_to_flask():
+    status, j = _call("GET", "/api/health")
+    assert status == 200
+    assert j.get("ok") is True
+
+def test_asgi_stream_query_parameter_streams(monkeypatch):
+    async def not_expected(*args, **kwargs):
+        raise AssertionError("?stream=1 must not take the non-streaming path")
+    monkeypatch.setattr(adapter, "agenerate", not_expected)
+    monkeypatch.setattr(adapter, "generate_stream", lambda prompt, **kw: iter(["Hel", "lo"]))
+
+    status, body = _call("POST", "/api/generate", {"prompt": "Hello"}, query=b"stream=1")
+    assert status == 200
+    assert "Hel" in body and "lo" in body
+
+def test_asgi_and_wsgi_share_the_generate_path(monkeypatch):
+    import app as app_module
+    from services.cache_service import response_cache
+    from services.scheduler_service import FairScheduler
+    monkeypatch.setattr(adapter, "generate", lambda prompt, max_tokens=256, temperature=0.0: f"SYNC: {prompt}")
+    response_cache.clear()
+    with app_module.app.test_client() as client:
+        client.post("/api/generate", data=json.dumps({"prompt": "shared path"}), content_type="application/json")
+    status, j = _call("POST", "/api/generate", {"prompt": "shared path"})
+    assert (status, j) == (200, {"output": "SYNC: shared path", "cached": True})
+    response_cache.clear()
+
+    s = FairScheduler(max_inflight=1, deadlines={}, slo=1.0)
+    s.acquire("generate", "a")
+    s.release(service_seconds=5.0)
+    s.acquire("generate", "a")
+    monkeypatch.setattr(app_module, "scheduler", s)
+    status, j = _call("POST", "/api/generate", {"prompt": "shed me", "temperature": 0.5})
+    assert status == 503
+    assert j == {"error": "overloaded", "reason": "shed", "detail": "predicted wait 5.0s exceeds SLO 1s"}
@@ -0,0 +1,67 @@
+from services.cache_service import ResponseCache, cache_key
+
+def test_key_normalizes_whitespace():
+    assert cache_key("hello   world ", "m", 256, 0.0) == cache_key("hello world", "m", 256, 0.0)
+    assert cache_key("hello world", "m", 256, 0.0) != cache_key("hello world", "m", 128, 0.0)
+
+def test_lru_eviction_and_ttl():
+    cache = ResponseCache(max_entries=2, ttl=60, db_path=None)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")          # a is now most recently used
+    cache.put("c", "3")     # evicts b
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+
+    expired = ResponseCache(max_entries=2, ttl=-1, db_path=None)
+    expired.put("a", "1")
+    assert expired.get("a") is None
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    db = str(tmp_path / "cache.sqlite3")
+    ResponseCache(db_path=db).put("k", "persisted")
+
+    fresh = ResponseCache(db_path=db)
+    assert fresh.get("k") == "persisted"
+    assert fresh.stats()["disk_hits"] == 1
+    assert fresh.get("k") == "persisted"
+    assert fresh.stats()["hits"] == 1
+
+def test_key_keeps_newlines_and_indentation():
+    code = "def f():\n    return 1"
+    assert cache_key(code, "m", 256, 0.0) != cache_key("def f(): return 1", "m", 256, 0.0)
+    assert cache_key(code, "m", 256, 0.0) != cache_key("def f():\n  return 1", "m", 256, 0.0)
+    assert cache_key("  a  b \nc\n", "m", 256, 0.0) == cache_key("a b\nc", "m", 256, 0.0)
+
+def _sql(db, statement, *params):
+    import sqlite3
+    conn = sqlite3.connect(db, isolation_level=None)
+    try:
+        return conn.execute(statement, params).fetchall()
+    finally:
+        conn.close()
+
+def test_expired_disk_rows_are_purged_on_write(tmp_path):
+    db = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(db_path=db, ttl=60, purge_interval=3600)
+    for i in range(5):
+        _sql(db, "INSERT INTO responses VALUES (?, 'x', 1.0)", f"old{i}")
+    cache.put("new", "y")
+    assert _sql(db, "SELECT key FROM responses") == [("new",)]
+
+    _sql(db, "INSERT INTO responses VALUES ('old5', 'x', 1.0)")
+    cache.put("new2", "y")  # within the purge interval: no sweep
+    assert len(_sql(db, "SELECT key FROM responses")) == 3
+    assert cache.purge_expired() == 1
+
+def test_disk_tier_shared_across_threads(tmp_path):
+    import threading
+    cache = ResponseCache(db_path=str(tmp_path / "cache.sqlite3"), max_entries=1)
+    def writer(i):
+        cache.put(f"k{i}", f"v{i}")
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [cache.get(f"k{i}") for i in range(8)] == [f"v{i}" for i in range(8)]
@@ -0,0 +1,78 @@
+import json
+import asyncio
+import pytest
+from app import app as flask_app
+from adapters.cascade import CascadeAdapter, build_cascade, classify, check_answer
+from adapters.stub_adapter import StubAdapter
+
+@pytest.fixture
+def client():
+    flask_app.config["TESTING"] = True
+    with flask_app.test_client() as c:
+        yield c
+
+class Scripted(StubAdapter):
+    """Stub that returns a fixed answer."""
+    def __init__(self, answer, model):
+        super().__init__(latency_ms=0, model=model)
+        self.answer = answer
+
+    def _reply(self, prompt):
+        return self.answer
+
+def test_classify_by_length_and_structure():
+    assert classify("What is the capital of France?")[0] == "simple"
+    assert classify("Please refactor this:\n```py\nx=1\n```")[0] == "complex"
+    assert classify("word " * 500) == ("complex", "long")
+
+def test_check_answer():
+    assert check_answer("hi", "") == "empty"
+    assert check_answer("hi", "I'm not sure about that.") == "low_confidence"
+    assert check_answer("return json", "{\"a\": 1}") is None
+    assert check_answer("return json", "```json\n{\"a\": 1}\n```") is None
+    assert check_answer("return json", "a: 1") == "format"
+    assert check_answer("code", "```py\nprint(1)") == "truncated"
+
+def test_simple_prompt_answered_by_fast_tier():
+    fast, big = Scripted("Paris", "fast"), Scripted("Paris.", "big")
+    cascade = CascadeAdapter([("fast", fast), ("big", big)])
+    assert cascade.generate("Capital of France?") == "Paris"
+    assert (fast.calls, big.calls) == (1, 0)
+    assert cascade.model == "big"
+
+def test_escalates_on_failed_check_and_complex_starts_high():
+    fast, big = Scripted("I don't know.", "fast"), Scripted("{\"ok\": true}", "big")
+    cascade = CascadeAdapter([("fast", fast), ("big", big)])
+    assert cascade.generate("Give me json") == "{\"ok\": true}"
+    assert (fast.calls, big.calls) == (1, 1)
+    assert asyncio.run(cascade.agenerate("Please analyze this carefully")) == "{\"ok\": true}"
+    assert (fast.calls, big.calls) == (1, 2)
+
+def test_tier_recorded_in_metrics(client, monkeypatch):
+    import app as app_module
+    cascade = build_cascade("stub:fast@0,stub:big@0")
+    monkeypatch.setattr(app_module, "adapter", cascade)
+    rv = client.post("/api/generate", data=json.dumps({"prompt": "cascade metrics probe", "temperature": 0.5}),
+                     content_type="application/json")
+    assert rv.status_code == 200
+    body = client.get("/api/metrics").data.decode()
+    assert 'deepcode_cascade_answers_total{start_reason="short",tier="stub:fast@0"}' in body
+
+def test_repeated_prompt_served_from_cache(client, monkeypatch):
+    import app as app_module
+    from services.cache_service import response_cache, cache_key
+    fast, big = Scripted("Paris", "fast"), Scripted("Paris.", "big")
+    cascade = CascadeAdapter([("fast", fast), ("big", big)])
+    monkeypatch.setattr(app_module, "adapter", cascade)
+    response_cache.clear()
+    for _ in range(3):
+        rv = client.post("/api/generate", data=json.dumps({"prompt": "Capital of France?"}),
+                         content_type="application/json")
+        assert rv.get_json()["output"] == "Paris"
+    assert rv.get_json()["cached"] is True
+    assert (fast.calls, big.calls) == (1, 0)
+    # never filed under a single tier's model
+    assert response_cache.get(cache_key("Capital of France?", "big", 256, 0.0)) is None
+    assert response_cache.get(cache_key("Capital of France?", "fast", 256, 0.0)) is None
+    assert asyncio.run(cascade.agenerate_with_model("Capital of France?")) == ("Paris", "fast")
+    response_cache.clear()
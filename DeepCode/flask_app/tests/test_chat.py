@@ -49,3 +49,138 @@ def test_chat_missing_fields(client):
     # missing session_id / message
     rv = client.post("/api/chat/message", data=json.dumps({}), content_type="application/json")
     assert rv.status_code == 400
+
+def test_chat_message_stream_stores_reply(client, monkeypatch):
+    def fake_stream(prompt, max_tokens=256, temperature=0.0):
+        yield "streamed "
+        yield "reply"
+    monkeypatch.setattr(adapter, "generate_stream", fake_stream)
+
+    sid = client.post("/api/chat/start", data=json.dumps({}), content_type="application/json").get_json()["session_id"]
+    rv = client.post(
+        "/api/chat/message",
+        data=json.dumps({"session_id": sid, "message": "Hi", "stream": True}),
+        content_type="application/json",
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert rv.status_code == 200
+    lines = [json.loads(l) for l in rv.get_data(as_text=True).splitlines() if l]
+    assert lines[-1]["done"] is True
+    assert lines[-1]["output"] == "streamed reply"
+
+    hist = client.get(f"/api/chat/history/{sid}").get_json()["history"]
+    assert hist[-1] == {"role": "assistant", "text": "streamed reply"}
+
+def test_session_expiry_only_drops_idle_sessions():
+    store = cs.SessionStore(ttl=10, max_messages=3)
+    idle = store.create()
+    active = store.create()
+    created = store.sessions[active].created
+
+    # touching a session pushes its deadline out without re-sorting the heap
+    store.sessions[active].last_active = created + 8
+    assert store.cleanup(now=created + 11) == 1
+    assert idle not in store
+    assert active in store
+    assert store.cleanup(now=created + 19) == 1
+    assert active not in store
+
+def test_history_is_bounded():
+    store = cs.SessionStore(ttl=10, max_messages=3)
+    sid = store.create()
+    for i in range(5):
+        store.push(sid, "user", f"m{i}")
+    assert [m["text"] for m in store.history(sid)] == ["m2", "m3", "m4"]
+
+def test_chat_prompt_includes_new_message_once(client, monkeypatch):
+    prompts = []
+
+    def capturing_generate(prompt, max_tokens=256, temperature=0.0):
+        prompts.append(prompt)
+        return "ack"
+    monkeypatch.setattr(adapter, "generate", capturing_generate)
+
+    sid = client.post("/api/chat/start", data=json.dumps({}), content_type="application/json").get_json()["session_id"]
+    client.post("/api/chat/message", data=json.dumps({"session_id": sid, "message": "first turn"}), content_type="application/json")
+    client.post("/api/chat/message", data=json.dumps({"session_id": sid, "message": "second turn"}), content_type="application/json")
+    assert prompts[-1] == "user: first turn\nassistant: ack\nuser: second turn"
+
+def test_context_window_stays_within_budget():
+    from services.context_service import ContextWindow
+    from services.token_service import count_tokens
+    window = ContextWindow(budget=50, summary_budget=30)
+    for i in range(200):
+        window.add("user", f"Message number {i}. Some more words that pad the turn out.")
+    rendered = window.render()
+    assert rendered.startswith("Summary of earlier conversation:")
+    assert rendered.endswith("user: Message number 199. Some more words that pad the turn out.")
+    assert window.tokens <= 50 + 30
+    assert count_tokens(rendered) < 120
+
+def test_chat_enforces_model_context_window(client, monkeypatch):
+    import services.token_service as ts
+    calls = []
+    def capturing_generate(prompt, max_tokens=256, temperature=0.0):
+        calls.append((prompt, max_tokens))
+        return "ack"
+    monkeypatch.setattr(adapter, "generate", capturing_generate)
+    monkeypatch.setattr(ts, "CONTEXT_WINDOW_OVERRIDE", "120")
+
+    sid = client.post("/api/chat/start", data=json.dumps({}), content_type="application/json").get_json()["session_id"]
+    huge = " ".join(f"word{i}" for i in range(300))
+    rv = client.post("/api/chat/message", data=json.dumps({"session_id": sid, "message": huge}),
+                     content_type="application/json")
+    assert rv.status_code == 400
+    assert cs.get_history(sid) == []  # refused before it entered the history
+
+    for i in range(6):
+        rv = client.post("/api/chat/message", data=json.dumps({"session_id": sid, "message": f"turn {i} " * 8}),
+                         content_type="application/json")
+        assert rv.status_code == 200
+    prompt, max_tokens = calls[-1]
+    assert ts.count_tokens(prompt) + max_tokens <= 120
+    assert prompt.endswith("user: " + "turn 5 " * 8)
+
+def _session_with_messages(n):
+    sid = cs.create_session()
+    for i in range(n):
+        cs.push_user_message(sid, f"m{i}")
+    return sid
+
+def test_history_since_delta_and_pagination(client):
+    sid = _session_with_messages(5)
+    full = client.get(f"/api/chat/history/{sid}").get_json()
+    assert full["history"][0] == {"role": "user", "text": "m0"}
+    assert full["next_since"] == 5 and "next_cursor" not in full
+    assert [m["index"] for m in client.get(f"/api/chat/history/{sid}?since=0").get_json()["history"]] == [0, 1, 2, 3, 4]
+
+    delta = client.get(f"/api/chat/history/{sid}?since=3").get_json()
+    assert [m["text"] for m in delta["history"]] == ["m3", "m4"]
+
+    page = client.get(f"/api/chat/history/{sid}?limit=2").get_json()
+    assert [m["text"] for m in page["history"]] == ["m0", "m1"]
+    page2 = client.get(f"/api/chat/history/{sid}?limit=2&cursor={page['next_cursor']}").get_json()
+    assert [m["text"] for m in page2["history"]] == ["m2", "m3"]
+
+    assert client.get(f"/api/chat/history/{sid}?since=x").status_code == 400
+
+def test_history_indices_survive_trimming():
+    store = cs.SessionStore(max_messages=3)
+    sid = store.create()
+    for i in range(5):
+        store.push(sid, "user", f"m{i}")
+    page = store.history_page(sid, since=0)
+    assert page["first_index"] == 2
+    assert [(m["index"], m["text"]) for m in page["messages"]] == [(2, "m2"), (3, "m3"), (4, "m4")]
+
+def test_history_etag_and_gzip(client):
+    import gzip
+    sid = _session_with_messages(40)
+    rv = client.get(f"/api/chat/history/{sid}", headers={"Accept-Encoding": "gzip"})
+    assert rv.headers["Content-Encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(rv.data))["history"]) == 40
+
+    etag = rv.headers["ETag"]
+    assert client.get(f"/api/chat/history/{sid}", headers={"If-None-Match": etag}).status_code == 304
+    cs.push_user_message(sid, "new")
+    assert client.get(f"/api/chat/history/{sid}", headers={"If-None-Match": etag}).status_code == 200
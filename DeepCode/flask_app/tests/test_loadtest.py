@@ -0,0 +1,21 @@
+import app as app_module
+from loadtest import run_load, percentile, parse_mix
+
+def test_percentile_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 95) == 0.0
+
+def test_parse_mix_normalizes():
+    assert parse_mix("generate=3,chat=1") == {"generate": 0.75, "chat": 0.25}
+
+def test_run_load_with_stub_adapter():
+    original = app_module.adapter
+    report = run_load(rate=100, duration=0.3, workers=8, clients=50, latency_ms=1, jitter_ms=0)
+    assert app_module.adapter is original
+    assert report["completed"] == 30
+    assert "/api/generate" in report["routes"]
+    for route in report["routes"].values():
+        assert route["errors"] == 0
+        assert route["p50_ms"] <= route["p95_ms"] <= route["p99_ms"] <= route["max_ms"]
@@ -0,0 +1,23 @@
+from services.rate_limit_service import TokenBucketLimiter, parse_route_budgets, budget_for
+
+def test_token_bucket_refills():
+    limiter = TokenBucketLimiter()
+    for _ in range(3):
+        assert limiter.acquire("ip", 3, 3, now=100.0) == 0.0
+    wait = limiter.acquire("ip", 3, 3, now=100.0)
+    assert wait > 0
+    # one token per second refills
+    assert limiter.acquire("ip", 3, 3, now=101.0) == 0.0
+
+def test_tracked_keys_are_capped_with_lru_eviction():
+    limiter = TokenBucketLimiter(max_keys=100)
+    for i in range(1000):
+        limiter.acquire(f"ip-{i}", 30, 60, now=0.0)
+    assert len(limiter) == 100
+
+def test_route_budgets_use_longest_prefix():
+    routes = parse_route_budgets("/api/=30/60, /api/chat/=5/10, bogus")
+    assert routes == {"/api/": (30, 60.0), "/api/chat/": (5, 10.0)}
+    assert budget_for("/api/chat/message", routes, (1, 1)) == ("/api/chat/", 5, 10.0)
+    assert budget_for("/api/generate", routes, (1, 1)) == ("/api/", 30, 60.0)
+    assert budget_for("/other", routes, (1, 1)) == ("default", 1, 1)
@@ -0,0 +1,95 @@
+import time
+import asyncio
+from adapters.registry import AdapterRegistry, build_registry
+from adapters.stub_adapter import StubAdapter
+
+def test_hedge_returns_fast_secondary():
+    reg = AdapterRegistry(default_delay=0.02)
+    slow, fast = StubAdapter(latency_ms=500), StubAdapter(latency_ms=5)
+    reg.register("slow", slow, primary=True)
+    reg.register("fast", fast)
+    start = time.perf_counter()
+    assert reg.generate("hello") == "stub reply to: hello"
+    assert time.perf_counter() - start < 0.3
+    assert reg.hedged == 1
+    assert reg.info()["backends"]["fast"]["wins"] == 1
+
+def test_failed_primary_fails_over():
+    reg = AdapterRegistry(default_delay=5.0)
+    reg.register("broken", StubAdapter(latency_ms=1, fail_rate=1.0))
+    reg.register("ok", StubAdapter(latency_ms=1))
+    start = time.perf_counter()
+    assert reg.generate("x").startswith("stub reply")
+    assert time.perf_counter() - start < 1.0
+    assert reg.info()["backends"]["broken"]["errors"] == 1
+
+def test_async_hedge_and_no_hedge_failover():
+    reg = AdapterRegistry(default_delay=0.02)
+    reg.register("slow", StubAdapter(latency_ms=500))
+    reg.register("fast", StubAdapter(latency_ms=5))
+    assert asyncio.run(reg.agenerate("hi")).startswith("stub reply")
+    assert reg.hedged == 1
+
+    plain = AdapterRegistry(hedge=False)
+    plain.register("broken", StubAdapter(latency_ms=1, fail_rate=1.0))
+    plain.register("ok", StubAdapter(latency_ms=1))
+    assert plain.generate("x").startswith("stub reply")
+    assert asyncio.run(plain.agenerate("x")).startswith("stub reply")
+    assert plain.hedged == 0
+
+def test_build_registry_from_spec():
+    reg = build_registry("stub:a@1, stub:b@2")
+    assert reg.route() == ["stub:a@1", "stub:b@2"]
+    assert reg.model == "a"
+    assert reg.info()["policy"] == "hedged"
+
+def test_hedge_timer_starts_when_primary_runs():
+    reg = AdapterRegistry(default_delay=0.2, max_workers=2)
+    reg.register("primary", StubAdapter(latency_ms=50, model="a"), primary=True)
+    reg.register("backup", StubAdapter(latency_ms=5, model="b"))
+    # both pool threads are busy for 0.3s; the primary waits for one, then answers within its delay
+    for _ in range(2):
+        reg._pool.submit(time.sleep, 0.3)
+    assert reg.generate_with_model("q") == ("stub reply to: q", "a")
+    assert reg.hedged == 0
+
+def test_saturated_pool_falls_through_to_secondary():
+    reg = AdapterRegistry(default_delay=0.05, max_workers=1)
+    reg.register("primary", StubAdapter(latency_ms=5, model="a"), primary=True)
+    reg.register("backup", StubAdapter(latency_ms=5, model="b"))
+    reg._pool.submit(time.sleep, 0.5)  # the only hedge thread is stuck
+    started = time.perf_counter()
+    assert reg.generate_with_model("q") == ("stub reply to: q", "b")
+    assert time.perf_counter() - started < 0.4
+    assert reg.hedged == 1
+
+def test_hedged_answer_served_from_cache_on_repeat(monkeypatch):
+    import json
+    import app as app_module
+    from services.cache_service import response_cache, cache_key
+    reg = AdapterRegistry(default_delay=0.02)
+    slow, fast = StubAdapter(latency_ms=500, model="a"), StubAdapter(latency_ms=5, model="b")
+    reg.register("slow", slow, primary=True)
+    reg.register("fast", fast)
+    monkeypatch.setattr(app_module, "adapter", reg)
+    response_cache.clear()
+    with app_module.app.test_client() as client:
+        for _ in range(3):
+            rv = client.post("/api/generate", data=json.dumps({"prompt": "hedge me"}), content_type="application/json")
+            assert rv.get_json()["output"] == "stub reply to: hedge me"
+    assert rv.get_json()["cached"] is True
+    assert (fast.calls, reg.hedged) == (1, 1)
+    # keyed on the backend set, never on the primary's model alone
+    assert response_cache.get(cache_key("hedge me", "a", 256, 0.0)) is None
+    assert response_cache.get(cache_key("hedge me", reg.cache_identity, 256, 0.0)) == "stub reply to: hedge me"
+    response_cache.clear()
+
+def test_backend_cancelled_from_inside_counts_as_failure():
+    class Cancelling(StubAdapter):
+        async def agenerate(self, prompt, max_tokens=256, temperature=0.0):
+            raise asyncio.CancelledError()
+    reg = AdapterRegistry(default_delay=0.5)
+    reg.register("broken", Cancelling(model="a"), primary=True)
+    reg.register("ok", StubAdapter(latency_ms=5, model="b"))
+    assert asyncio.run(reg.agenerate_with_model("q")) == ("stub reply to: q", "b")
+    assert reg.info()["backends"]["broken"]["errors"] == 1
@@ -0,0 +1,191 @@
+import json
+import asyncio
+import pytest
+from app import app as flask_app
+from adapters.resilience import CircuitBreaker, CircuitOpenError, AdaptiveTimeout, RetryBudget, is_transient
+from adapters.registry import AdapterRegistry
+from adapters.stub_adapter import StubAdapter
+
+@pytest.fixture
+def client():
+    flask_app.config["TESTING"] = True
+    with flask_app.test_client() as c:
+        yield c
+
+def test_breaker_opens_and_half_opens():
+    b = CircuitBreaker("t", failure_threshold=2, reset_seconds=0.05)
+    b.record_failure()
+    assert b.allow()
+    b.record_failure()
+    assert b.state == "open"
+    with pytest.raises(CircuitOpenError):
+        b.check()
+    import time
+    time.sleep(0.06)
+    assert b.allow()          # single half-open probe
+    assert not b.allow()
+    b.record_success()
+    assert b.state == "closed"
+
+def test_only_the_probe_owner_releases_the_probe():
+    b = CircuitBreaker("t", failure_threshold=1, reset_seconds=0)
+    early = b.allow()         # let through while closed
+    b.record_failure()
+    probe = b.allow()
+    assert probe and not b.allow()
+    b.release_probe(early)    # a call that never held the probe finishing first
+    assert not b.allow()
+    b.release_probe(probe)
+    assert b.allow()
+
+def test_transient_classification():
+    class ServiceUnavailable(Exception):
+        pass
+    class APIError(Exception):
+        def __init__(self, code):
+            super().__init__("upstream said no")
+            self.code = code
+    assert is_transient(RuntimeError("503 Service Unavailable"))
+    assert is_transient(RuntimeError("request failed: status=429"))
+    assert is_transient(TimeoutError()) and is_transient(ConnectionResetError())
+    assert is_transient(ServiceUnavailable("x")) and is_transient(APIError(500))
+    assert not is_transient(APIError(400))
+    assert not is_transient(RuntimeError("400 invalid argument: max 500 tokens"))
+    assert not is_transient(RuntimeError("prompt mentions 5003 widgets"))
+
+def test_adaptive_timeout_tracks_latency():
+    t = AdaptiveTimeout(minimum=0.1, maximum=10)
+    assert t.current == 10
+    for _ in range(50):
+        t.observe(0.5)
+    assert 0.5 <= t.current < 1.0
+
+def test_retry_budget_caps_retries():
+    budget = RetryBudget(ratio=0.1, window=10, min_per_second=0)
+    for _ in range(20):
+        budget.record_request(now=100.0)
+    assert budget.try_acquire(now=100.0)
+    assert budget.try_acquire(now=100.0)
+    assert not budget.try_acquire(now=100.0)
+    assert budget.snapshot()["denied"] == 1
+
+def _gemini_adapter(monkeypatch, attempt):
+    from adapters.gemini_adapter import GeminiAdapter
+    a = GeminiAdapter()
+    a.client = a.client or object()
+    a.breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=60)
+    monkeypatch.setattr(a, "_attempt", attempt)
+    return a
+
+def test_transient_error_is_retried(monkeypatch):
+    calls = []
+    def flaky(prompt, max_tokens, temperature, timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            raise RuntimeError("503 Service Unavailable")
+        return "ok"
+    a = _gemini_adapter(monkeypatch, flaky)
+    assert a.generate("p") == "ok"
+    assert len(calls) == 2
+    assert a.info()["breaker"]["state"] == "closed"
+
+def test_breaker_stops_calls_and_shows_in_health(client, monkeypatch):
+    import app as app_module
+    calls = []
+    def broken(prompt, max_tokens, temperature, timeout):
+        calls.append(prompt)
+        raise RuntimeError("503 Service Unavailable")
+    a = _gemini_adapter(monkeypatch, broken)
+    a.max_retries = 0
+    for i in range(2):
+        with pytest.raises(RuntimeError):
+            a.generate(f"p{i}")
+    with pytest.raises(CircuitOpenError):
+        a.generate("p3")
+    assert len(calls) == 2
+
+    monkeypatch.setattr(app_module, "adapter", a)
+    data = json.loads(client.get("/api/health").data)
+    assert data["adapter"]["breaker"]["state"] == "open"
+
+def test_client_errors_do_not_open_breaker(monkeypatch):
+    calls = []
+    def rejected(prompt, max_tokens, temperature, timeout):
+        calls.append(prompt)
+        raise RuntimeError("400 invalid argument")
+    a = _gemini_adapter(monkeypatch, rejected)
+    for i in range(5):
+        with pytest.raises(RuntimeError):
+            a.generate(f"p{i}")
+    assert len(calls) == 5  # not retried either
+    assert a.breaker.state == "closed"
+
+def test_cancelled_probe_is_released(monkeypatch):
+    from adapters.gemini_adapter import GeminiAdapter
+    a = GeminiAdapter()
+    a.client = a.client or object()
+    a.breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=0)
+    a.breaker.record_failure()
+    async def hang(prompt, max_tokens, temperature, timeout):
+        await asyncio.sleep(10)
+    monkeypatch.setattr(a, "_aattempt", hang)
+
+    async def cancel_probe():
+        task = asyncio.ensure_future(a.agenerate("p"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    asyncio.run(cancel_probe())
+    assert a.breaker.allow()  # the next probe is let through
+
+def test_stream_goes_through_breaker(monkeypatch):
+    import adapters.gemini_adapter as ga
+    timeouts = []
+    def fake_stream(plan, handle, model, prompt, max_tokens=256, temperature=0.0, timeout=None):
+        timeouts.append(timeout)
+        raise RuntimeError("503 Service Unavailable")
+    monkeypatch.setattr(ga, "invoke_stream", fake_stream)
+    a = _gemini_adapter(monkeypatch, None)
+    monkeypatch.setattr(a._handles, "get", lambda name: object())
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            list(a.generate_stream("p"))
+    assert timeouts == [a.timeout.current] * 2
+    with pytest.raises(CircuitOpenError):
+        list(a.generate_stream("p"))
+    assert len(timeouts) == 2
+
+def test_registry_routes_around_open_breaker():
+    reg = AdapterRegistry(hedge=False)
+    first, second = StubAdapter(latency_ms=1, model="a"), StubAdapter(latency_ms=1, model="b")
+    first.breaker = CircuitBreaker("a", failure_threshold=1)
+    first.breaker.record_failure()
+    reg.register("a", first)
+    reg.register("b", second)
+    assert reg.route() == ["b", "a"]
+    asyncio.run(reg.agenerate("x"))
+    assert second.calls == 1 and first.calls == 0
+
+def test_async_semaphore_caps_concurrent_calls(monkeypatch):
+    from adapters.gemini_adapter import GeminiAdapter, DEFAULT_MAX_CONCURRENCY
+    from services.scheduler_service import SCHEDULER_MAX_INFLIGHT
+    assert DEFAULT_MAX_CONCURRENCY == SCHEDULER_MAX_INFLIGHT
+
+    a = GeminiAdapter(max_concurrency=3)
+    a.client = a.client or object()
+    a.breaker = CircuitBreaker("test", failure_threshold=100)
+    active, peak = 0, 0
+    async def attempt(prompt, max_tokens, temperature, timeout):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return prompt
+    monkeypatch.setattr(a, "_aattempt", attempt)
+
+    async def burst():
+        return await asyncio.gather(*(a.agenerate(f"p{i}") for i in range(12)))
+    assert asyncio.run(burst()) == [f"p{i}" for i in range(12)]
+    assert peak == 3
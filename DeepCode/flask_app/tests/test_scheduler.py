@@ -0,0 +1,175 @@
+import json
+import time
+import asyncio
+import threading
+import pytest
+import app as app_module
+from app import app as flask_app
+from services.scheduler_service import FairScheduler, SchedulerRejected, parse_class_values
+
+@pytest.fixture
+def client():
+    flask_app.config["TESTING"] = True
+    with flask_app.test_client() as c:
+        yield c
+
+def _wait_queued(s, n):
+    deadline = time.time() + 2
+    while sum(s.stats()["queued"].values()) < n and time.time() < deadline:
+        time.sleep(0.005)
+
+def test_parse_class_values():
+    assert parse_class_values("chat=4, batch=0.5,bad") == {"chat": 4.0, "batch": 0.5}
+
+def test_weighted_fair_order_favors_chat():
+    s = FairScheduler(max_inflight=1, weights={"chat": 4, "batch": 1}, deadlines={})
+    s.acquire("batch", "bulk-client")
+    order = []
+
+    def worker(route_class, name):
+        s.acquire(route_class, "bulk-client" if route_class == "batch" else name)
+        order.append(name)
+        s.release()
+
+    threads = []
+    for name, route_class in [("b1", "batch"), ("b2", "batch"), ("b3", "batch"), ("c1", "chat"), ("c2", "chat")]:
+        t = threading.Thread(target=worker, args=(route_class, name))
+        t.start()
+        threads.append(t)
+        _wait_queued(s, len(threads))
+    s.release()
+    for t in threads:
+        t.join()
+    # chat turns queued behind a bulk client's backlog still go first
+    assert order == ["c1", "c2", "b1", "b2", "b3"]
+
+def test_queue_depth_limit():
+    s = FairScheduler(max_inflight=0, max_queue=0, deadlines={})
+    with pytest.raises(SchedulerRejected) as exc:
+        s.acquire("generate", "x")
+    assert exc.value.reason == "queue_full"
+    assert s.stats()["dropped"]["queue_full"] == 1
+
+def test_deadline_drops_waiting_request():
+    s = FairScheduler(max_inflight=1, deadlines={})
+    s.acquire("generate", "a")
+    with pytest.raises(SchedulerRejected) as exc:
+        s.acquire("generate", "b", deadline=time.monotonic() + 0.05)
+    assert exc.value.reason == "deadline"
+    s.release()
+    assert s.stats()["inflight"] == 0 and s.stats()["queued"] == {}
+
+def test_dispatch_skips_requests_that_cannot_finish():
+    s = FairScheduler(max_inflight=1, deadlines={})
+    s.acquire("generate", "a")
+    errors = []
+
+    def waiter():
+        try:
+            s.acquire("generate", "b", deadline=time.monotonic() + 5)
+        except SchedulerRejected as e:
+            errors.append(e.reason)
+
+    t = threading.Thread(target=waiter)
+    t.start()
+    _wait_queued(s, 1)
+    s.release(service_seconds=10.0)  # typical generation now exceeds the waiter's remaining time
+    t.join()
+    assert errors == ["deadline"]
+
+def test_async_slot():
+    s = FairScheduler(max_inflight=1, deadlines={})
+
+    async def main():
+        async def job(i):
+            async with s.aslot("generate", i):
+                await asyncio.sleep(0.01)
+                return i
+        return await asyncio.gather(*(job(i) for i in range(4)))
+
+    assert asyncio.run(main()) == [0, 1, 2, 3]
+    assert s.stats()["inflight"] == 0
+
+def test_generate_returns_503_when_queue_full(client, monkeypatch):
+    monkeypatch.setattr(app_module, "scheduler", FairScheduler(max_inflight=0, max_queue=0, deadlines={}))
+    rv = client.post("/api/generate", data=json.dumps({"prompt": "hi", "temperature": 0.5}),
+                     content_type="application/json")
+    assert rv.status_code == 503
+    assert json.loads(rv.data)["reason"] == "queue_full"
+
+def test_queue_wait_in_metrics(client, monkeypatch):
+    monkeypatch.setattr(app_module.adapter, "generate", lambda prompt, max_tokens=256, temperature=0.0: "ok")
+    client.post("/api/generate", data=json.dumps({"prompt": "queue wait metric", "temperature": 0.5}),
+                content_type="application/json")
+    body = client.get("/api/metrics").data.decode()
+    assert 'deepcode_queue_wait_seconds_count{route_class="generate"}' in body
+
+def _saturated(slo):
+    s = FairScheduler(max_inflight=1, deadlines={}, slo=slo)
+    s.acquire("generate", "a")
+    s.release(service_seconds=5.0)
+    s.acquire("generate", "a")  # the only slot is busy and generations take ~5s
+    return s
+
+def test_sheds_when_predicted_wait_exceeds_slo():
+    s = _saturated(slo=1.0)
+    assert s.predicted_wait() == pytest.approx(5.0)
+    with pytest.raises(SchedulerRejected) as exc:
+        s.acquire("generate", "b")
+    assert exc.value.reason == "shed"
+    assert exc.value.retry_after == pytest.approx(4.0)
+    assert s.stats()["queued"] == {}
+
+def test_shed_response_has_retry_after(client, monkeypatch):
+    monkeypatch.setattr(app_module, "scheduler", _saturated(slo=1.0))
+    rv = client.post("/api/generate", data=json.dumps({"prompt": "shed me", "temperature": 0.5}),
+                     content_type="application/json")
+    assert rv.status_code == 503
+    assert rv.headers["Retry-After"] == "4"
+    assert json.loads(rv.data)["reason"] == "shed"
+
+def test_free_slot_admits_despite_slow_history():
+    s = FairScheduler(max_inflight=2)
+    s.acquire("batch", "a")
+    s.release(service_seconds=200.0)  # one very slow generation
+    for route_class in ("chat", "generate", "batch"):
+        with s.slot(route_class, "a"):  # nothing in flight, so the class deadline cannot be missed
+            pass
+    assert s.stats()["dropped"]["deadline"] == 0
+
+def test_stream_time_not_recorded_as_service_time():
+    s = FairScheduler(max_inflight=1, deadlines={})
+    chunks = s.stream(iter(["a", "b"]), "generate", "x")
+    assert list(chunks) == ["a", "b"]
+    assert s.stats()["service_time_s"] is None
+    assert s.stats()["inflight"] == 0
+
+def test_stream_rejection_is_503_before_headers(client, monkeypatch):
+    monkeypatch.setattr(app_module, "scheduler", _saturated(slo=1.0))
+    rv = client.post("/api/generate", data=json.dumps({"prompt": "stream me", "stream": True}),
+                     content_type="application/json")
+    assert rv.status_code == 503
+    assert rv.headers["Retry-After"] == "4"
+    assert json.loads(rv.data)["reason"] == "shed"
+
+def test_chat_stream_rejection_is_503(client, monkeypatch):
+    import chat
+    monkeypatch.setattr(chat, "scheduler", _saturated(slo=1.0))
+    sid = client.post("/api/chat/start", data=json.dumps({}), content_type="application/json").get_json()["session_id"]
+    rv = client.post("/api/chat/message", data=json.dumps({"session_id": sid, "message": "hi", "stream": True}),
+                     content_type="application/json")
+    assert rv.status_code == 503
+    assert rv.headers["Retry-After"] == "4"
+
+def test_stream_slot_released_when_response_closes(client, monkeypatch):
+    s = FairScheduler(max_inflight=1, deadlines={})
+    monkeypatch.setattr(app_module, "scheduler", s)
+    monkeypatch.setattr(app_module.adapter, "generate_stream",
+                        lambda prompt, max_tokens=256, temperature=0.0: iter(["a", "b", "c"]))
+    rv = client.post("/api/generate", data=json.dumps({"prompt": "hold", "stream": True}),
+                     content_type="application/json", buffered=False)
+    assert rv.status_code == 200
+    assert s.stats()["inflight"] == 1  # held while the body is being sent
+    next(rv.response)  # the client reads one event, then goes away
+    rv.close()
+    assert s.stats()["inflight"] == 0
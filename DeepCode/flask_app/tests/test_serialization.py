@@ -0,0 +1,11 @@
+import json
+import services.serialization_service as ser
+
+PAYLOAD = {"ok": True, "text": "héllo ☃", "items": [1, 2.5, None], "nested": {"a": "b"}}
+
+def test_dumps_without_orjson_matches(monkeypatch):
+    fast = ser.dumps(PAYLOAD)
+    monkeypatch.setattr(ser, "orjson", None)
+    slow = ser.dumps(PAYLOAD)
+    assert json.loads(slow) == json.loads(fast) == PAYLOAD
+    assert b" " not in slow.replace("héllo ☃".encode(), b"")  # compact, UTF-8 as-is
@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+from startup_profile import parse_importtime, by_package
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_app_import_defers_model_sdk():
+    code = "import sys, app; print('google.generativeai' in sys.modules, app.adapter.info()['ready'])"
+    env = dict(os.environ, ADAPTER_WARMUP="0")
+    out = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, env=env, capture_output=True, text=True)
+    assert out.stdout.split() == ["False", "False"]
+
+def test_warm_up_is_idempotent():
+    from adapters.gemini_adapter import GeminiAdapter
+    a = GeminiAdapter()
+    assert a.info()["ready"] is False
+    a.warm_up()
+    a.warm_up()
+    assert a.info()["ready"] is True
+
+def test_parse_importtime():
+    log = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       100 |        100 |   google.protobuf\n"
+        "import time:       500 |        600 | google\n"
+        "import time:       250 |        250 | flask\n"
+    )
+    rows = parse_importtime(log)
+    assert [r["module"] for r in rows] == ["google.protobuf", "google", "flask"]
+    assert rows[0]["depth"] == 1 and rows[1]["depth"] == 0
+    assert by_package(rows) == {"google": 0.6, "flask": 0.25}
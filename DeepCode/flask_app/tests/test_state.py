@@ -0,0 +1,95 @@
+import time
+import threading
+import pytest
+from services.state_service import LocalKV, SQLiteKV, make_kv
+from services.rate_limit_service import SharedTokenBucketLimiter
+from services.chat_service import SharedSessionStore, ChatError
+
+@pytest.fixture(params=["local", "sqlite"])
+def kv_pair(request, tmp_path):
+    """Two handles on the same state, standing in for two worker processes."""
+    if request.param == "local":
+        kv = LocalKV()
+        return kv, kv
+    path = str(tmp_path / "state.db")
+    return SQLiteKV(path), SQLiteKV(path)
+
+def test_make_kv_specs(tmp_path):
+    assert make_kv("memory") is None
+    assert isinstance(make_kv("local"), LocalKV)
+    assert isinstance(make_kv(f"sqlite:///{tmp_path}/s.db"), SQLiteKV)
+    with pytest.raises(ValueError):
+        make_kv("redis://nope")
+
+def test_shared_limiter_budget_spans_workers(kv_pair):
+    a, b = SharedTokenBucketLimiter(kv_pair[0]), SharedTokenBucketLimiter(kv_pair[1])
+    results = [lim.acquire(("1.2.3.4", "default"), 4, 60, now=100.0) for lim in (a, b, a, b, a)]
+    assert results[:4] == [0.0] * 4
+    assert results[4] == pytest.approx(15.0)
+    # refill is shared too
+    assert b.acquire(("1.2.3.4", "default"), 4, 60, now=115.0) == 0.0
+
+def test_shared_limiter_is_atomic_under_threads(kv_pair):
+    limiter = SharedTokenBucketLimiter(kv_pair[1])
+    allowed = []
+    def worker():
+        for _ in range(10):
+            if limiter.acquire("ip", 25, 3600) == 0.0:
+                allowed.append(1)
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(allowed) == 25
+
+def test_shared_sessions_visible_to_every_worker(kv_pair):
+    w1 = SharedSessionStore(kv_pair[0], max_messages=3)
+    w2 = SharedSessionStore(kv_pair[1], max_messages=3)
+    sid = w1.create()
+    assert sid in w2
+    for i in range(5):
+        (w1 if i % 2 else w2).push(sid, "user", f"m{i}")
+    assert [m["text"] for m in w1.history(sid)] == ["m2", "m3", "m4"]
+    assert w2.context_prompt(sid).endswith("user: m4")
+    with pytest.raises(ChatError):
+        w2.push("missing", "user", "x")
+
+def test_shared_sessions_expire(kv_pair):
+    store = SharedSessionStore(kv_pair[0], ttl=10)
+    sid = store.create()
+    assert store.cleanup(now=0) == 0
+    assert store.cleanup(now=float("inf")) == 1
+    assert sid not in store
+
+def test_idle_rate_limit_buckets_are_swept(kv_pair):
+    kv = kv_pair[0]
+    limiter = SharedTokenBucketLimiter(kv)
+    for i in range(50):
+        limiter.acquire((f"10.0.0.{i}", "default"), 5, 60, now=100.0)
+    kv.set("session:keep", {"x": 1})  # no TTL
+    # the periodic sweep covers every prefix, not just chat sessions
+    assert kv.maybe_purge(now=10 ** 12) == 50
+    assert kv.get("rl:10.0.0.1|default") is None
+    assert kv.get("session:keep") == {"x": 1}
+
+def test_maybe_purge_runs_at_most_once_per_interval(kv_pair):
+    kv = kv_pair[0]
+    kv.set("a", 1, ttl=1)
+    assert kv.maybe_purge(now=10 ** 10) == 1
+    kv.set("b", 1, ttl=1)
+    assert kv.maybe_purge(now=10 ** 10 + 1) == 0  # within the interval: no sweep
+    assert kv.maybe_purge(now=10 ** 11) == 1
+
+def test_local_purge_visits_only_due_keys():
+    kv = LocalKV()
+    for i in range(100):
+        kv.set(f"k{i}", i, ttl=10 ** 6)
+    for _ in range(10):
+        kv.set("k0", 0, ttl=10 ** 6)  # sliding a TTL does not add heap entries
+    assert len(kv._expiry) == 100
+    assert kv.purge_expired(now=0) == 0
+    kv.set("soon", 1, ttl=0.001)
+    time.sleep(0.01)
+    assert kv.purge_expired() == 1
+    assert kv.purge_expired("k", now=float("inf")) == 100
@@ -0,0 +1,64 @@
+import json
+import pytest
+from app import app as flask_app
+from services import prompt_service
+from services.prompt_service import validate_and_prepare, ValidationError, MIN_OUTPUT_TOKENS
+from services.token_service import count_tokens, context_window, trim_to_tokens
+
+@pytest.fixture
+def client():
+    flask_app.config["TESTING"] = True
+    with flask_app.test_client() as c:
+        yield c
+
+def test_count_tokens_is_memoized_and_monotonic():
+    count_tokens.cache_clear()
+    short, long = "hello world", "hello world, " * 50
+    assert 0 < count_tokens(short) < count_tokens(long)
+    count_tokens(short)
+    assert count_tokens.cache_info().hits >= 1
+
+def test_context_window_lookup():
+    assert context_window("gemini-1.5-flash") == 1048576
+    assert context_window("models/gemini-1.5-pro-002") == 2097152
+    assert context_window("llama3") == 8192
+    assert context_window("something-else") > 0
+
+def test_max_tokens_reduced_to_fit_context():
+    prompt = "word " * 900
+    prepared = validate_and_prepare(prompt, max_tokens=1024, model="stub")  # 8192-token window
+    assert prepared["prompt_tokens"] + prepared["max_tokens"] <= context_window("stub")
+    assert prepared["trimmed"] is False
+
+def test_context_window_is_the_binding_limit():
+    # no fixed character cap in front of the window: 6000 chars is fine for an 8192-token model
+    assert validate_and_prepare("word " * 1200, model="stub")["trimmed"] is False
+    with pytest.raises(ValidationError, match="tokens, window 8192"):
+        validate_and_prepare("word " * 9000, model="stub")
+
+def test_overflowing_prompt_rejected_or_trimmed(monkeypatch):
+    monkeypatch.setattr(prompt_service, "context_window", lambda model: 200)
+    prompt = "first sentence. " + "filler words here " * 200 + "final question?"
+    with pytest.raises(ValidationError):
+        validate_and_prepare(prompt, model="tiny")
+    prepared = validate_and_prepare(prompt, model="tiny", overflow="trim")
+    assert prepared["trimmed"] is True
+    assert prepared["prompt"].endswith("final question?")
+    assert prepared["prompt_tokens"] + prepared["max_tokens"] <= 200
+    assert prepared["max_tokens"] >= MIN_OUTPUT_TOKENS
+
+def test_trim_to_tokens_keeps_tail():
+    text = " ".join(f"w{i}" for i in range(500))
+    out = trim_to_tokens(text, 50)
+    assert count_tokens(out) <= 50 and out.endswith("w499")
+
+def test_overflow_never_reaches_adapter(client, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(prompt_service, "context_window", lambda model: 100)
+    def fail(*a, **k):
+        raise AssertionError("adapter must not be called")
+    monkeypatch.setattr(app_module.adapter, "generate", fail)
+    rv = client.post("/api/generate", data=json.dumps({"prompt": "many tokens " * 200}),
+                     content_type="application/json")
+    assert rv.status_code == 400
+    assert "context" in json.loads(rv.data)["detail"]
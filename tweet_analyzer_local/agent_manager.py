@@ -1,21 +1,43 @@
 # agent_manager.py
 import os
 import time
+import weakref
+import tempfile
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import Counter
+from collections.abc import Sequence
 import pandas as pd
 from dotenv import load_dotenv
 
 load_dotenv()  # project .env
 
-from utils import parse_datetime_safe
-from gemini_wrapper import call_gemini
+from utils import parse_datetime_series, infer_column_format
+from gemini_wrapper import call_gemini, current_model
+from rate_limiter import AdaptiveTokenBucket
+from summary_cache import SummaryCache, chunk_key
 
 # Config
 TWEET_CSV = os.environ.get("TWEET_CSV_PATH", "./tweets.csv")
 RESULTS_PATH = os.environ.get("RESULTS_PATH", "./results.csv")
 MAX_TWEETS_PER_PROMPT = int(os.environ.get("MAX_TWEETS_PER_PROMPT", "10"))
-SLEEP_BETWEEN_CALLS = float(os.environ.get("SLEEP_BETWEEN_CALLS", "0.5"))
+SLEEP_BETWEEN_CALLS = float(os.environ.get("SLEEP_BETWEEN_CALLS", "0.5"))  # sets the starting call rate
+SUMMARY_CONCURRENCY = int(os.environ.get("SUMMARY_CONCURRENCY", "8"))
+SUMMARY_MAX_RPS = float(os.environ.get("SUMMARY_MAX_RPS", "10"))
+SUMMARY_TARGET_LATENCY = float(os.environ.get("SUMMARY_TARGET_LATENCY", "30"))  # seconds; slower calls back off
+SUMMARY_MAX_RETRIES = int(os.environ.get("SUMMARY_MAX_RETRIES", "5"))  # per chunk, on 429/503
+SUMMARY_CACHE_PATH = os.environ.get("SUMMARY_CACHE_PATH", "")  # SQLite file to cache summaries in; off when empty
+SUMMARY_PROMPT_TEMPLATE = (
+    "You are a concise analyst. Summarize these tweets in 3 short bullets. "
+    "Mention main topics and sentiment briefly.\n\n{tweets}\n\nSummary:"
+)
 RUN_SUMMARIES = os.environ.get("RUN_SUMMARIES", "false").lower() in ("1", "true", "yes")
 ALT_GEMINI_MODEL = os.environ.get("ALT_GEMINI_MODEL", "text-bison-001")
+# Streaming ingest: read the CSV this many rows at a time (0 = load it whole)
+INGEST_CHUNK_ROWS = int(os.environ.get("INGEST_CHUNK_ROWS", "0"))
+SPILL_DIR = os.environ.get("SPILL_DIR") or None  # where streamed tweet texts are spilled (default: temp dir)
+CANCEL_POLL_SECONDS = 0.5  # how often summarize_groups checks for cancellation while calls are in flight
 
 def _detect_columns(df: pd.DataFrame):
     cols = df.columns
@@ -29,27 +51,93 @@ def _detect_columns(df: pd.DataFrame):
     text_col = find(["text", "tweet", "content", "message"])
     return date_col, user_col, text_col
 
-def load_and_prepare():
+class TextSpill:
+    """
+    Append-only temp file of tweet texts. Streaming ingest writes each text once and
+    keeps only its (offset, length); the file is deleted when the spill is collected.
+    """
+
+    def __init__(self, directory=None):
+        fd, self.path = tempfile.mkstemp(prefix="tweets-", suffix=".spill", dir=directory or SPILL_DIR)
+        self._fh = os.fdopen(fd, "w+b")
+        self._lock = threading.Lock()  # appends and reads share one file position
+        self._end = 0
+        self._finalizer = weakref.finalize(self, TextSpill._remove, self._fh, self.path)
+
+    @staticmethod
+    def _remove(fh, path):
+        fh.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def append(self, text: str):
+        data = text.encode("utf-8")
+        with self._lock:
+            self._fh.seek(self._end)
+            self._fh.write(data)
+            offset = self._end
+            self._end += len(data)
+        return offset, len(data)
+
+    def read(self, offset: int, length: int) -> str:
+        with self._lock:
+            self._fh.flush()
+            self._fh.seek(offset)
+            return self._fh.read(length).decode("utf-8")
+
+    def close(self):
+        self._finalizer()
+
+class SpilledTexts(Sequence):
+    """One group's texts as offsets into a TextSpill; indexing and slicing read them back."""
+    __slots__ = ("spill", "offsets", "lengths")
+
+    def __init__(self, spill: TextSpill):
+        self.spill = spill
+        self.offsets = array("q")
+        self.lengths = array("q")
+
+    def add(self, text: str):
+        offset, length = self.spill.append(text)
+        self.offsets.append(offset)
+        self.lengths.append(length)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.spill.read(o, n) for o, n in zip(self.offsets[index], self.lengths[index])]
+        return self.spill.read(self.offsets[index], self.lengths[index])
+
+    def __repr__(self):
+        return f"<{len(self)} spilled texts>"
+
+def _check_input():
     if not os.path.exists(TWEET_CSV):
         raise FileNotFoundError(f"Input CSV not found at {TWEET_CSV}")
-    try:
-        df = pd.read_csv(TWEET_CSV, dtype=str)
-    except Exception as e:
-        raise RuntimeError(f"Failed to read CSV: {e}")
 
+def _required_columns(df: pd.DataFrame):
     date_col, user_col, text_col = _detect_columns(df)
     if date_col is None or user_col is None:
         raise KeyError(f"Couldn't detect 'date' and 'user' columns. Found columns: {list(df.columns)}")
+    return date_col, user_col, text_col
 
+def load_and_prepare():
+    _check_input()
+    try:
+        df = pd.read_csv(TWEET_CSV, dtype=str)
+    except Exception as e:
+        raise RuntimeError(f"Failed to read CSV: {e}")
+    date_col, user_col, text_col = _required_columns(df)
+    return _prepare_frame(df, date_col, user_col, text_col)
+
+def _prepare_frame(df: pd.DataFrame, date_col, user_col, text_col, date_format=None):
     df["_raw_date"] = df[date_col].astype(str)
-    parsed = []
-    for s in df["_raw_date"]:
-        try:
-            dt = parse_datetime_safe(s)
-            parsed.append(pd.to_datetime(dt))
-        except Exception:
-            parsed.append(pd.NaT)
-    df["_parsed_dt"] = pd.to_datetime(parsed)
+    # one vectorized pass; only rows that miss the inferred format hit the fuzzy parser
+    df["_parsed_dt"] = parse_datetime_series(df["_raw_date"], fmt=date_format)
     df["_group_date"] = df["_parsed_dt"].dt.date
     df = df.dropna(subset=[user_col, "_group_date"]).copy()
     df[user_col] = df[user_col].astype(str).str.strip()
@@ -59,13 +147,75 @@ def load_and_prepare():
     df[text_col] = df[text_col].astype(str)
     return df, user_col, text_col
 
-def compute_counts_and_maxes():
-    df, user_col, text_col = load_and_prepare()
-    grouped = df.groupby([user_col, "_group_date"])
+def _read_chunks(chunk_rows: int):
+    _check_input()
+    try:
+        yield from pd.read_csv(TWEET_CSV, dtype=str, chunksize=chunk_rows)
+    except Exception as e:
+        raise RuntimeError(f"Failed to read CSV: {e}")
+
+def _stream_groups(chunk_rows: int, keep_texts: bool, progress=None):
+    """
+    Read TWEET_CSV chunk by chunk and count tweets per (user, date) as it goes.
+    Memory is bounded by one chunk plus the counters; texts, when kept, go to a
+    spill file and each group holds only their offsets.
+    """
+    counts = Counter()
+    texts = {}
+    spill = TextSpill() if keep_texts else None
+    columns = date_format = None
+    rows_read = 0
+    for chunk in _read_chunks(chunk_rows):
+        rows_read += len(chunk)
+        if progress:
+            progress(rows_read, None)  # total unknown until the file is read
+        if columns is None:
+            columns = _required_columns(chunk)
+            # inferred from the first chunk only, so every chunk reads ambiguous dates the same way
+            date_format = infer_column_format(chunk[columns[0]])
+        chunk, user_col, text_col = _prepare_frame(chunk, *columns, date_format=date_format)
+        if chunk.empty:
+            continue
+        grouped = chunk.groupby([user_col, "_group_date"], sort=False)
+        counts.update(grouped[text_col].count().to_dict())  # missing texts are not counted
+        if keep_texts:
+            values = chunk[text_col].to_numpy()
+            for key, positions in grouped.indices.items():
+                group = texts.get(key)
+                if group is None:
+                    group = texts[key] = SpilledTexts(spill)
+                for text in values[positions]:
+                    if not pd.isna(text):
+                        group.add(text)
     rows = []
-    for (user, gdate), gdf in grouped:
-        texts = gdf[text_col].dropna().astype(str).tolist()
-        rows.append({"user": user, "date": str(gdate), "num_tweets": len(texts), "texts": texts})
+    for key in sorted(counts):
+        row = {"user": key[0], "date": str(key[1]), "num_tweets": counts[key]}
+        if keep_texts:
+            row["texts"] = texts[key]
+        rows.append(row)
+    return rows
+
+def compute_counts_and_maxes(chunk_rows: int = None, keep_texts: bool = True, progress=None):
+    """
+    Tweets per (user, date) plus each user's busiest day. With chunk_rows (or
+    INGEST_CHUNK_ROWS) set, the CSV is streamed instead of loaded whole; pass
+    keep_texts=False when the texts will not be summarized. progress(rows_read, total)
+    is called after each chunk (once, after loading, when not streaming).
+    """
+    chunk_rows = INGEST_CHUNK_ROWS if chunk_rows is None else chunk_rows
+    if chunk_rows and chunk_rows > 0:
+        rows = _stream_groups(chunk_rows, keep_texts, progress)
+    else:
+        df, user_col, text_col = load_and_prepare()
+        if progress:
+            progress(len(df), len(df))
+        rows = []
+        for (user, gdate), gdf in df.groupby([user_col, "_group_date"]):
+            texts = gdf[text_col].dropna().astype(str).tolist()
+            row = {"user": user, "date": str(gdate), "num_tweets": len(texts)}
+            if keep_texts:
+                row["texts"] = texts
+            rows.append(row)
     result_df = pd.DataFrame(rows)
     if not result_df.empty:
         maxes = result_df.groupby("user")["num_tweets"].max().rename("max_per_user").reset_index()
@@ -76,65 +226,164 @@ def compute_counts_and_maxes():
         result_df["is_max_for_user"] = False
     return result_df
 
-def robust_call_gemini(prompt: str, max_output_tokens: int = 256, timeout: int = 60):
+def _call_with_fallback(prompt: str, max_output_tokens: int = 256, timeout: int = 60, cached=None):
     """
-    Try call_gemini once. If REST 404 (model not available), retry with ALT_GEMINI_MODEL.
+    robust_call_gemini, also returning the model that answered. cached(model), if
+    given, is asked for a stored answer before falling back to ALT_GEMINI_MODEL.
     """
-    # first attempt with current env/model
-    out = call_gemini(prompt, max_output_tokens=max_output_tokens, timeout=timeout)
+    model = current_model()
+    out = call_gemini(prompt, max_output_tokens=max_output_tokens, timeout=timeout, model=model)
     # detect REST 404 pattern from gemini_wrapper
     if isinstance(out, str) and out.startswith("[gemini-http-error]") and "status=404" in out:
-        current_model = os.environ.get("GEMINI_MODEL", "")
         alt = os.environ.get("ALT_GEMINI_MODEL", ALT_GEMINI_MODEL)
-        if alt and alt != current_model:
-            print(f"[fallback] primary model '{current_model}' returned 404 — retrying with '{alt}'")
-            old = os.environ.get("GEMINI_MODEL")
-            os.environ["GEMINI_MODEL"] = alt
-            try:
-                out2 = call_gemini(prompt, max_output_tokens=max_output_tokens, timeout=timeout)
-            finally:
-                # restore
-                if old is None:
-                    os.environ.pop("GEMINI_MODEL", None)
-                else:
-                    os.environ["GEMINI_MODEL"] = old
-            return out2
+        if alt and alt != model:
+            hit = cached(alt) if cached else None
+            if hit is not None:
+                return hit, alt
+            print(f"[fallback] primary model '{model}' returned 404 — retrying with '{alt}'")
+            # per-call override rather than swapping os.environ, so concurrent callers are unaffected
+            return call_gemini(prompt, max_output_tokens=max_output_tokens, timeout=timeout, model=alt), alt
+    return out, model
+
+def robust_call_gemini(prompt: str, max_output_tokens: int = 256, timeout: int = 60):
+    """
+    Try call_gemini once. If REST 404 (model not available), retry with ALT_GEMINI_MODEL.
+    """
+    return _call_with_fallback(prompt, max_output_tokens=max_output_tokens, timeout=timeout)[0]
+
+def _is_throttled(out) -> bool:
+    return isinstance(out, str) and out.startswith("[gemini-http-error]") and (
+        "status=429" in out or "status=503" in out)
+
+def _make_limiter() -> AdaptiveTokenBucket:
+    start = 1.0 / SLEEP_BETWEEN_CALLS if SLEEP_BETWEEN_CALLS > 0 else SUMMARY_MAX_RPS
+    return AdaptiveTokenBucket(start, max_rate=SUMMARY_MAX_RPS, target_latency=SUMMARY_TARGET_LATENCY)
+
+_summary_cache = None
+_summary_cache_lock = threading.Lock()
+
+def get_summary_cache():
+    """Process-wide SummaryCache at SUMMARY_CACHE_PATH, or None when caching is off."""
+    global _summary_cache
+    if _summary_cache is None and SUMMARY_CACHE_PATH:
+        with _summary_cache_lock:
+            if _summary_cache is None:
+                _summary_cache = SummaryCache(SUMMARY_CACHE_PATH)
+    return _summary_cache
+
+def summarize_chunk(texts, limiter: AdaptiveTokenBucket, check_cancelled=None, cache: SummaryCache = None) -> str:
+    """
+    One Gemini call under the shared limiter; 429/503 responses slow it down and retry.
+    check_cancelled(), if given, runs before every attempt and aborts by raising.
+    With a cache, the summary is looked up and stored under the model that produced
+    it, so a summary from the 404 fallback model is never filed under the primary.
+    """
+    lookup = None
+    if cache is not None:
+        lookup = lambda model: cache.get(chunk_key(texts, SUMMARY_PROMPT_TEMPLATE, model))
+        hit = lookup(current_model())
+        if hit is not None:
+            return hit
+    prompt = SUMMARY_PROMPT_TEMPLATE.format(tweets="\n\n".join(texts))
+    for _ in range(SUMMARY_MAX_RETRIES + 1):
+        limiter.acquire()
+        if check_cancelled:
+            check_cancelled()
+        started = time.monotonic()
+        out, model = _call_with_fallback(prompt, max_output_tokens=256, cached=lookup)
+        if not _is_throttled(out):
+            limiter.on_success(time.monotonic() - started)
+            if cache is not None:
+                cache.put(chunk_key(texts, SUMMARY_PROMPT_TEMPLATE, model), out)
+            return out
+        limiter.on_throttle()
     return out
 
-def summarize_groups(df_counts: pd.DataFrame, save_results: bool = True):
+def summarize_groups(df_counts: pd.DataFrame, save_results: bool = True, concurrency: int = None, progress=None,
+                     cache: SummaryCache = None, check_cancelled=None):
+    """
+    Summarize every (user, date) group, MAX_TWEETS_PER_PROMPT tweets per call.
+    Chunks run on a thread pool paced by an adaptive token bucket; summaries are
+    reassembled in row and chunk order. Chunks already in the summary cache (same
+    texts, prompt template and model) are not sent again. progress(done, total),
+    if given, is called as groups finish. check_cancelled(), if given, is called
+    before every Gemini call and every CANCEL_POLL_SECONDS; when it raises, queued
+    calls are dropped and the error propagates without waiting for calls in flight.
+    """
     if df_counts.empty:
         return df_counts
-    summaries = []
     total = len(df_counts)
-    for idx, row in df_counts.iterrows():
-        texts = row.get("texts") or []
-        chunks = [texts[i:i+MAX_TWEETS_PER_PROMPT] for i in range(0, len(texts), MAX_TWEETS_PER_PROMPT)] or [[]]
-        chunk_summaries = []
-        for ch in chunks:
-            if not ch:
-                continue
-            prompt = (
-                "You are a concise analyst. Summarize these tweets in 3 short bullets. "
-                "Mention main topics and sentiment briefly.\n\n" + "\n\n".join(ch) + "\n\nSummary:"
-            )
-            out = robust_call_gemini(prompt, max_output_tokens=256)
-            chunk_summaries.append(out)
-            time.sleep(SLEEP_BETWEEN_CALLS)
-        summaries.append("\n\n---\n\n".join(chunk_summaries).strip() or "")
-        if (idx+1) % 10 == 0 or (idx+1) == total:
-            print(f"[{idx+1}/{total}] summarized user={row['user']} date={row['date']} tweets={row['num_tweets']}")
-    df_counts["summary"] = summaries
+    limiter = _make_limiter()
+    cache = get_summary_cache() if cache is None else cache
+    all_texts = [row.get("texts") or [] for _, row in df_counts.iterrows()]
+    chunk_summaries = [[None] * -(-len(texts) // MAX_TWEETS_PER_PROMPT) for texts in all_texts]
+    pending = [len(parts) for parts in chunk_summaries]
+    done = sum(1 for n in pending if n == 0)  # groups without texts have nothing to call
+
+    def run(texts, start):
+        # slice inside the worker so spilled texts are only read when their call runs
+        chunk = texts[start:start + MAX_TWEETS_PER_PROMPT]
+        return summarize_chunk(chunk, limiter, check_cancelled, cache)
+
+    workers = max(1, concurrency or SUMMARY_CONCURRENCY)
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summarize")
+    futures = {
+        pool.submit(run, texts, j * MAX_TWEETS_PER_PROMPT): (i, j)
+        for i, texts in enumerate(all_texts) for j in range(len(chunk_summaries[i]))
+    }
+    try:
+        if progress and done:
+            progress(done, total)
+        remaining = set(futures)
+        while remaining:
+            finished, remaining = wait(remaining, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            if check_cancelled:
+                check_cancelled()
+            for future in finished:
+                i, j = futures[future]
+                chunk_summaries[i][j] = future.result()
+                pending[i] -= 1
+                if pending[i]:
+                    continue
+                done += 1
+                if progress:
+                    progress(done, total)
+                if done % 10 == 0 or done == total:
+                    row = df_counts.iloc[i]
+                    print(f"[{done}/{total}] summarized user={row['user']} date={row['date']} "
+                          f"tweets={row['num_tweets']} limiter={limiter.stats()}"
+                          f"{f' cache={cache.stats()}' if cache is not None else ''}")
+    except BaseException:
+        # drop the queued calls and don't wait for the ones in flight; their results are discarded
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    df_counts["summary"] = ["\n\n---\n\n".join(parts).strip() for parts in chunk_summaries]
     if save_results:
         out_df = df_counts.copy()
         out_df = out_df.drop(columns=["texts"], errors="ignore")
         out_df.to_csv(RESULTS_PATH, index=False)
     return df_counts
 
-def run_full_pipeline(save_results: bool = True, run_summaries: bool = None):
-    df_counts = compute_counts_and_maxes()
+def _stage(progress, name):
+    """Adapt a progress(stage, done, total) callback to one stage's progress(done, total)."""
+    if progress is None:
+        return None
+    return lambda done, total: progress(name, done, total)
+
+def run_full_pipeline(save_results: bool = True, run_summaries: bool = None, progress=None, check_cancelled=None):
+    """
+    Count, optionally summarize, and save. progress(stage, done, total), if given, is
+    called with stage "counting" (rows read) and "summarizing" (groups done); raising
+    from it aborts the run. check_cancelled() is also checked before every Gemini call.
+    """
     run_summaries = RUN_SUMMARIES if run_summaries is None else bool(run_summaries)
+    df_counts = compute_counts_and_maxes(keep_texts=run_summaries, progress=_stage(progress, "counting"))
     if run_summaries:
-        df_counts = summarize_groups(df_counts, save_results=save_results)
+        if progress:
+            progress("summarizing", 0, len(df_counts))
+        df_counts = summarize_groups(df_counts, save_results=save_results, progress=_stage(progress, "summarizing"),
+                                     check_cancelled=check_cancelled)
     else:
         out_df = df_counts.copy()
         out_df = out_df.drop(columns=["texts"], errors="ignore")
@@ -5,6 +5,8 @@ from fastapi.responses import HTMLResponse
 from dotenv import load_dotenv
 load_dotenv()
 
+from job_manager import jobs, QueueFull
+
 app = FastAPI(title="Tweet Analyzer Local")
 
 RESULTS_PATH = os.environ.get("RESULTS_PATH", "./results.csv")
@@ -13,16 +15,45 @@ RESULTS_PATH = os.environ.get("RESULTS_PATH", "./results.csv")
 def root():
     return {"message": "Tweet Analyzer Local - ready"}
 
-@app.post("/run_agents")
+@app.post("/run_agents", status_code=202)
 def run_agents(run_summaries: bool = Query(False, description="Set true to call Gemini for summaries")):
-    try:
-        from agent_manager import run_full_pipeline
-        df = run_full_pipeline(save_results=True, run_summaries=run_summaries)
+    """
+    Queue a pipeline run and return its job id at once; poll GET /jobs/{job_id}
+    for stage progress and the result.
+    """
+    import agent_manager
+    if not os.path.exists(agent_manager.TWEET_CSV):
+        raise HTTPException(status_code=404, detail=f"Input CSV not found at {agent_manager.TWEET_CSV}")
+
+    def run(job):
+        df = agent_manager.run_full_pipeline(save_results=True, run_summaries=run_summaries, progress=job.report,
+                                             check_cancelled=job.check_cancelled)
         return {"rows": len(df), "message": "Pipeline finished", "saved_to": RESULTS_PATH}
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+    try:
+        job = jobs.submit(run, {"run_summaries": run_summaries})
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Too many pipeline runs waiting: {e}")
+    return {"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}
+
+@app.get("/jobs")
+def list_jobs():
+    return {"jobs": [job.to_dict() for job in jobs.list()], **jobs.stats()}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """Queued jobs never start; running jobs stop before their next Gemini call or progress update."""
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
 @app.get("/results")
 def get_results():
@@ -14,6 +14,10 @@ load_dotenv()  # loads project .env, if present
 
 # default base; can override with GEMINI_REST_BASE in .env
 DEFAULT_BASE = "https://generativelanguage.googleapis.com/v1beta2"
+DEFAULT_MODEL = "gemini-2.5-pro"
+
+def current_model() -> str:
+    return os.environ.get("GEMINI_MODEL", DEFAULT_MODEL)
 
 def _extract_from_response_json(j):
     """Return the most likely text from Google Generative response shapes."""
@@ -32,14 +36,15 @@ def _extract_from_response_json(j):
         pass
     return json.dumps(j)
 
-def call_gemini(prompt: str, max_output_tokens: int = 256, timeout: int = 60) -> str:
+def call_gemini(prompt: str, max_output_tokens: int = 256, timeout: int = 60, model: str = None) -> str:
     """
     Call Google Generative REST API using the current environment variables.
     Returns generated text or an error string beginning with [gemini-...].
+    Pass model to override GEMINI_MODEL for this call only (safe across threads).
     """
     # Read API key & model at call time (allows temporary env changes)
     API_KEY = os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
-    MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-pro")
+    MODEL = model or current_model()
     BASE = os.environ.get("GEMINI_REST_BASE", DEFAULT_BASE)
 
     if not API_KEY:
@@ -0,0 +1,137 @@
+# job_manager.py
+"""
+Background execution for pipeline runs.
+
+Submitted jobs run on a small thread pool (RUN_JOBS_MAX_CONCURRENT at a time), so
+a long run never holds an HTTP worker. Each job records its stage and progress
+as the pipeline reports it. Cancellation is cooperative: a queued job never
+starts, and a running one stops at its next progress report or before its next
+Gemini call (see Job.check_cancelled).
+"""
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+RUN_JOBS_MAX_CONCURRENT = int(os.environ.get("RUN_JOBS_MAX_CONCURRENT", "1"))  # runs share RESULTS_PATH
+RUN_JOBS_MAX_QUEUED = int(os.environ.get("RUN_JOBS_MAX_QUEUED", "8"))
+RUN_JOBS_HISTORY = int(os.environ.get("RUN_JOBS_HISTORY", "100"))  # finished jobs kept for status queries
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+class JobCancelled(Exception):
+    pass
+
+class QueueFull(Exception):
+    pass
+
+class Job:
+    def __init__(self, params: dict):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = "queued"
+        self.stage = None
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = threading.Event()
+        self.future = None
+
+    def check_cancelled(self):
+        """Raises JobCancelled once cancellation is requested; the pipeline's workers call it between calls."""
+        if self.cancel_requested.is_set():
+            raise JobCancelled()
+
+    def report(self, stage: str, done: int, total):
+        """Progress callback handed to the pipeline; raises once cancellation is requested."""
+        self.check_cancelled()
+        self.stage, self.done, self.total = stage, done, total
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": {"done": self.done, "total": self.total},
+            "params": self.params,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+class JobManager:
+    def __init__(self, max_concurrent: int = None, max_queued: int = None, history: int = None):
+        self.max_concurrent = RUN_JOBS_MAX_CONCURRENT if max_concurrent is None else max_concurrent
+        self.max_queued = RUN_JOBS_MAX_QUEUED if max_queued is None else max_queued
+        self.history = RUN_JOBS_HISTORY if history is None else history
+        self._pool = ThreadPoolExecutor(max_workers=max(1, self.max_concurrent), thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, params: dict) -> Job:
+        """Queue fn(job) -> result; raises QueueFull when max_queued jobs are already waiting."""
+        job = Job(params)
+        with self._lock:
+            queued = sum(1 for j in self._jobs.values() if j.status == "queued")
+            if queued >= self.max_queued:
+                raise QueueFull(f"{queued} jobs already queued")
+            self._jobs[job.id] = job
+            self._prune_locked()
+            job.future = self._pool.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn):
+        if job.cancel_requested.is_set():
+            job.status, job.finished = "cancelled", time.time()
+            return
+        job.status, job.started = "running", time.time()
+        try:
+            job.result = fn(job)
+            job.status = "succeeded"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str):
+        """Request cancellation; returns the job, or None if unknown."""
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        job.cancel_requested.set()
+        if job.future.cancel():  # never started
+            job.status, job.finished = "cancelled", time.time()
+        return job
+
+    def _prune_locked(self):
+        finished = [j.id for j in self._jobs.values() if j.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {"max_concurrent": self.max_concurrent, "max_queued": self.max_queued, "jobs": counts}
+
+# process-wide job manager for the API
+jobs = JobManager()
@@ -0,0 +1,80 @@
+# rate_limiter.py
+"""
+Adaptive token bucket shared by concurrent Gemini calls.
+
+Tokens refill at `rate` per second up to `burst`. The rate grows geometrically
+until the first 429 (slow start), then climbs additively while calls succeed
+and halves on a 429 (AIMD, like TCP congestion control),
+so the pipeline settles just under the quota instead of guessing a fixed sleep.
+Slow responses also back the rate off a little, since latency rising is the
+first sign of server-side queueing.
+"""
+import time
+import threading
+
+SLOW_START_FACTOR = 1.05  # rate multiplier per success until the first throttle
+
+class AdaptiveTokenBucket:
+    def __init__(self, rate: float, min_rate: float = 0.1, max_rate: float = 20.0,
+                 burst: float = None, increase: float = 0.1, target_latency: float = None):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.burst = burst or max(1.0, self.rate)
+        self.increase = increase  # rate added per successful call
+        self.target_latency = target_latency  # seconds; slower calls reduce the rate
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_cut = float("-inf")
+        self._lock = threading.Lock()
+        self.latency = None  # EWMA seconds
+        self.throttled = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a call may be made."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = max(self._paused_until - now, (1.0 - self._tokens) / self.rate)
+            time.sleep(min(wait, 1.0))
+
+    def on_success(self, latency: float):
+        with self._lock:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            if self.target_latency and self.latency > self.target_latency:
+                self.rate = max(self.min_rate, self.rate * 0.9)
+            elif self.throttled == 0:
+                self.rate = min(self.max_rate, self.rate * SLOW_START_FACTOR)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+            self.burst = max(self.burst, self.rate)
+
+    def on_throttle(self, retry_after: float = None):
+        """A 429/503: halve the rate and stop issuing calls for retry_after (or one refill)."""
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            # calls already in flight when the quota ran out report the same event; cut once per round trip
+            if now - self._last_cut > max(self.latency or 0.0, 1.0 / self.rate):
+                self.rate = max(self.min_rate, self.rate / 2)
+                self._last_cut = now
+            self._tokens = 0.0
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self._paused_until = max(self._paused_until, now + pause)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rate_per_s": round(self.rate, 3),
+                "latency_s": round(self.latency, 3) if self.latency is not None else None,
+                "throttled": self.throttled,
+            }
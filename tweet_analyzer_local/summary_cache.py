@@ -0,0 +1,55 @@
+# summary_cache.py
+"""
+Persistent, content-addressed cache of chunk summaries.
+
+A summary is stored under sha256(model, prompt template, chunk texts), so a rerun
+only calls Gemini for chunks whose tweets (or the prompt/model) changed; unchanged
+chunks are answered from the SQLite file. Error strings are never cached.
+"""
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+def chunk_key(texts, template: str, model: str) -> str:
+    payload = json.dumps([model, template, list(texts)], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class SummaryCache:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()  # one connection shared by the summarize workers
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, summary TEXT NOT NULL, created REAL)"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._db.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, summary: str):
+        if not isinstance(summary, str) or summary.startswith("[gemini-"):
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary, created) VALUES (?, ?, ?)",
+                (key, summary, time.time()),
+            )
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,14 @@
+import os
+import sys
+import pytest
+
+# the app's modules import each other flat ("from utils import ..."), as when run from this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import agent_manager
+
+@pytest.fixture(autouse=True)
+def _no_shared_summary_cache(monkeypatch):
+    """Tests pass their own SummaryCache; never touch one configured in the environment."""
+    monkeypatch.setattr(agent_manager, "SUMMARY_CACHE_PATH", "")
+    monkeypatch.setattr(agent_manager, "_summary_cache", None)
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+import agent_manager
+from utils import parse_datetime_safe, parse_datetime_series, infer_column_format
+
+def _row_wise(values):
+    out = []
+    for v in values:
+        try:
+            ts = pd.Timestamp(parse_datetime_safe(v))
+            out.append(ts.tz_localize(None) if ts.tzinfo is not None else ts)
+        except Exception:
+            out.append(pd.NaT)
+    return out
+
+@pytest.mark.parametrize("values", [
+    ["2024-03-01 10:00:00", "2024-03-02 23:59:59", "2024-03-03", "not a date", "", "nan"],
+    ["Wed Oct 10 20:19:24 +0000 2018", "Thu Oct 11 01:02:03 +0530 2018", "Oct 12, 2018 09:30"],
+    ["2024-01-05T10:00:00+02:00", "2024-01-05T23:30:00-05:00", "2024-01-06T08:00:00Z"],
+    # day-first dominated, with ambiguous dates that dateutil reads month-first
+    ["13/01/2024", "25/12/2023", "01/02/2024", "31/01/2024 10:00", "05/06/2024"],
+])
+def test_vectorized_parse_matches_row_wise(values):
+    parsed = parse_datetime_series(values)
+    assert [None if pd.isna(x) else x for x in parsed] == [None if pd.isna(x) else x for x in _row_wise(values)]
+
+def test_explicit_format_is_used_as_given():
+    assert infer_column_format(["13/01/2024", "25/12/2023"]) == "%d/%m/%Y"
+    assert infer_column_format(["garbage", "nan"]) == "mixed"
+    # a chunk without any day > 12 still reads day-first rows the same way as its neighbours
+    parsed = parse_datetime_series(["01/02/2024", "14/02/2024"], fmt="%d/%m/%Y")
+    assert list(parsed) == [pd.Timestamp("2024-01-02"), pd.Timestamp("2024-02-14")]
+    assert list(parse_datetime_series(["Jan 3 2024"], fmt="mixed")) == [pd.Timestamp("2024-01-03")]
+
+@pytest.fixture
+def tweets_csv(tmp_path, monkeypatch):
+    dates = ["13/01/2024 10:00", "01/02/2024 11:00", "14/01/2024 09:00", "01/02/2024 18:00",
+             "bad date", "25/12/2023 08:00", "02/01/2024 12:00"]
+    users = ["alice", "bob", "alice", "bob", "carol", "alice", "bob"]
+    rows = []
+    for i in range(60):
+        rows.append({"date": dates[i % len(dates)], "user": users[i % len(users)],
+                     "text": None if i % 11 == 0 else f"tweet {i}"})
+    path = tmp_path / "tweets.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+    monkeypatch.setattr(agent_manager, "TWEET_CSV", str(path))
+    monkeypatch.setattr(agent_manager, "SPILL_DIR", str(tmp_path))
+    return path
+
+def _normalized(df):
+    df = df.copy()
+    df["texts"] = df["texts"].map(list)
+    return df.sort_values(["user", "date"]).reset_index(drop=True)
+
+@pytest.mark.parametrize("chunk_rows", [1, 5, 64])
+def test_chunked_ingest_matches_in_memory(tweets_csv, chunk_rows):
+    whole = agent_manager.compute_counts_and_maxes(chunk_rows=0)
+    chunked = agent_manager.compute_counts_and_maxes(chunk_rows=chunk_rows)
+    pd.testing.assert_frame_equal(_normalized(chunked), _normalized(whole))
+    assert "2024-01-02" in set(whole["date"])  # "01/02/2024" read month-first, as dateutil does
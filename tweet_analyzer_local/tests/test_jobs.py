@@ -0,0 +1,79 @@
+import time
+import threading
+import pandas as pd
+import pytest
+import agent_manager
+from job_manager import Job, JobManager, JobCancelled, QueueFull
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_job_runs_to_success():
+    manager = JobManager(max_concurrent=1, max_queued=4)
+    job = manager.submit(lambda j: (j.report("counting", 3, 3), "done")[1], {})
+    _wait_for(lambda: job.status == "succeeded")
+    assert job.result == "done"
+    assert job.to_dict()["progress"] == {"done": 3, "total": 3}
+    assert job.started and job.finished
+
+def test_failed_job_records_error():
+    manager = JobManager(max_concurrent=1)
+    def boom(job):
+        raise ValueError("bad csv")
+    job = manager.submit(boom, {})
+    _wait_for(lambda: job.status == "failed")
+    assert job.error == "ValueError: bad csv"
+
+def test_cancel_queued_and_running_jobs():
+    manager = JobManager(max_concurrent=1, max_queued=1)
+    release = threading.Event()
+    def blocking(job):
+        while not release.wait(0.01):
+            job.check_cancelled()
+    running = manager.submit(blocking, {})
+    _wait_for(lambda: running.status == "running")
+    queued = manager.submit(blocking, {})
+    assert queued.status == "queued"
+    with pytest.raises(QueueFull):
+        manager.submit(blocking, {})
+
+    manager.cancel(queued.id)
+    assert queued.status == "cancelled" and queued.started is None
+    manager.cancel(running.id)
+    _wait_for(lambda: running.status == "cancelled")
+    assert manager.cancel(running.id).status == "cancelled"  # cancelling again is a no-op
+    assert manager.cancel("missing") is None
+    assert manager.stats()["jobs"] == {"cancelled": 2}
+
+def test_report_raises_after_cancel():
+    job = Job({})
+    job.report("counting", 1, None)
+    job.cancel_requested.set()
+    with pytest.raises(JobCancelled):
+        job.report("counting", 2, None)
+
+def test_cancel_stops_summaries_without_draining_the_queue(monkeypatch):
+    calls = []
+    def slow_call(prompt, **kwargs):
+        calls.append(prompt)
+        time.sleep(0.3)
+        return "- summary"
+    monkeypatch.setattr(agent_manager, "call_gemini", slow_call)
+    monkeypatch.setattr(agent_manager, "SLEEP_BETWEEN_CALLS", 0)
+    monkeypatch.setattr(agent_manager, "SUMMARY_MAX_RPS", 1000)
+    df = pd.DataFrame([{"user": f"u{i}", "date": "2024-01-01", "num_tweets": 1, "texts": [f"t{i}"]}
+                       for i in range(40)])
+
+    manager = JobManager(max_concurrent=1)
+    job = manager.submit(lambda j: agent_manager.summarize_groups(
+        df, save_results=False, concurrency=4, cache=None, check_cancelled=j.check_cancelled), {})
+    _wait_for(lambda: len(calls) >= 4)
+    cancelled_at = time.monotonic()
+    manager.cancel(job.id)
+    _wait_for(lambda: job.status == "cancelled")
+    assert time.monotonic() - cancelled_at < 0.3 + agent_manager.CANCEL_POLL_SECONDS
+    time.sleep(0.4)  # calls that were in flight finish, and no new ones start
+    assert len(calls) <= 8
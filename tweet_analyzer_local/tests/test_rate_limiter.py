@@ -0,0 +1,43 @@
+import time
+import agent_manager
+from rate_limiter import AdaptiveTokenBucket
+
+def test_throttle_halves_rate_once_per_round_trip():
+    bucket = AdaptiveTokenBucket(8.0, min_rate=0.5, max_rate=20.0)
+    for _ in range(5):  # calls in flight when the quota ran out all report it
+        bucket.on_throttle(retry_after=0)
+    assert bucket.rate == 4.0
+    assert bucket.stats()["throttled"] == 5
+
+def test_rate_recovers_after_throttle():
+    bucket = AdaptiveTokenBucket(4.0, min_rate=0.5, max_rate=20.0, increase=0.5)
+    for _ in range(10):
+        bucket.on_success(0.01)
+    assert bucket.rate > 4.0 * 1.5  # slow start: geometric growth before any throttle
+    bucket.on_throttle(retry_after=0)
+    cut = bucket.rate
+    for _ in range(4):
+        bucket.on_success(0.01)
+    assert bucket.rate == cut + 4 * 0.5  # then additive increase
+    for _ in range(1000):
+        bucket.on_success(0.01)
+    assert bucket.rate == 20.0
+
+def test_slow_responses_back_off():
+    bucket = AdaptiveTokenBucket(10.0, target_latency=1.0)
+    bucket.on_success(5.0)
+    assert bucket.rate == 9.0
+
+def test_throttle_pauses_acquire():
+    bucket = AdaptiveTokenBucket(100.0, burst=10)
+    bucket.on_throttle(retry_after=0.2)
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.19
+
+def test_summarize_chunk_retries_throttled_calls(monkeypatch):
+    replies = ["[gemini-http-error] status=429 quota", "[gemini-http-error] status=503", "- summary"]
+    monkeypatch.setattr(agent_manager, "call_gemini", lambda prompt, **kwargs: replies.pop(0))
+    bucket = AdaptiveTokenBucket(1000.0, burst=100)
+    assert agent_manager.summarize_chunk(["a", "b"], bucket) == "- summary"
+    assert bucket.throttled == 2
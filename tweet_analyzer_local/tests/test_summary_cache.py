@@ -0,0 +1,78 @@
+import threading
+import pandas as pd
+import pytest
+import agent_manager
+from summary_cache import SummaryCache, chunk_key
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """Fake call_gemini recording (model, prompt); models listed in `missing` answer 404."""
+    calls = []
+    missing = set()
+    def fake(prompt, max_output_tokens=256, timeout=60, model=None):
+        calls.append((model, prompt))
+        if model in missing:
+            return "[gemini-http-error] status=404 body={}"
+        return f"summary by {model}"
+    monkeypatch.setattr(agent_manager, "call_gemini", fake)
+    monkeypatch.setattr(agent_manager, "SLEEP_BETWEEN_CALLS", 0)
+    monkeypatch.setattr(agent_manager, "SUMMARY_MAX_RPS", 1000)
+    monkeypatch.setenv("GEMINI_MODEL", "primary")
+    monkeypatch.setenv("ALT_GEMINI_MODEL", "alt")
+    fake.calls, fake.missing = calls, missing
+    return fake
+
+def _groups(texts_per_user):
+    return pd.DataFrame([{"user": user, "date": "2024-01-01", "num_tweets": len(texts), "texts": texts}
+                         for user, texts in texts_per_user.items()])
+
+def test_rerun_is_served_from_cache(tmp_path, gemini):
+    cache = SummaryCache(str(tmp_path / "s.sqlite"))
+    groups = {"alice": [f"a{i}" for i in range(15)], "bob": ["b0", "b1"]}
+    first = agent_manager.summarize_groups(_groups(groups), save_results=False, cache=cache)
+    assert len(gemini.calls) == 3  # alice needs two chunks of MAX_TWEETS_PER_PROMPT
+
+    reopened = SummaryCache(str(tmp_path / "s.sqlite"))  # survives a restart
+    second = agent_manager.summarize_groups(_groups(groups), save_results=False, cache=reopened)
+    assert len(gemini.calls) == 3
+    assert list(second["summary"]) == list(first["summary"])
+    assert reopened.stats() == {"hits": 3, "misses": 0}
+
+    groups["bob"] = ["b0", "b1 edited"]
+    agent_manager.summarize_groups(_groups(groups), save_results=False, cache=reopened)
+    assert len(gemini.calls) == 4  # only the changed chunk is sent again
+
+def test_errors_are_not_cached(tmp_path):
+    cache = SummaryCache(str(tmp_path / "s.sqlite"))
+    cache.put("k", "[gemini-http-error] status=500")
+    assert cache.get("k") is None
+
+def test_fallback_summary_is_keyed_on_the_model_that_wrote_it(tmp_path, gemini):
+    cache = SummaryCache(str(tmp_path / "s.sqlite"))
+    gemini.missing.add("primary")
+    texts = ["t0", "t1"]
+    template = agent_manager.SUMMARY_PROMPT_TEMPLATE
+    out = agent_manager.summarize_groups(_groups({"u": texts}), save_results=False, cache=cache)
+    assert out["summary"][0] == "summary by alt"
+    assert cache.get(chunk_key(texts, template, "alt")) == "summary by alt"
+    assert cache.get(chunk_key(texts, template, "primary")) is None
+
+    # while the primary still 404s, a rerun finds the fallback's summary instead of calling it again
+    agent_manager.summarize_groups(_groups({"u": texts}), save_results=False, cache=cache)
+    assert [model for model, _ in gemini.calls] == ["primary", "alt", "primary"]
+
+    # once the primary is back, it gets its own summary
+    gemini.missing.clear()
+    again = agent_manager.summarize_groups(_groups({"u": texts}), save_results=False, cache=cache)
+    assert again["summary"][0] == "summary by primary"
+
+def test_cache_is_off_by_default_and_created_once(tmp_path, monkeypatch):
+    assert agent_manager.get_summary_cache() is None
+    monkeypatch.setattr(agent_manager, "SUMMARY_CACHE_PATH", str(tmp_path / "s.sqlite"))
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append(agent_manager.get_summary_cache())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(cache) for cache in seen}) == 1
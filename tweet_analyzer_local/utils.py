@@ -1,9 +1,38 @@
 # utils.py
 import re
+from functools import lru_cache
 from dateutil import parser
 from datetime import datetime
 import pandas as pd
 
+# Layouts tried when inferring a column's timestamp format (month-first before
+# day-first, matching dateutil's default)
+CANDIDATE_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M:%SZ",
+    "%Y-%m-%dT%H:%M:%S.%fZ",
+    "%Y-%m-%d %H:%M:%S%z",
+    "%Y-%m-%dT%H:%M:%S%z",
+    "%Y-%m-%dT%H:%M:%S.%f%z",
+    "%a %b %d %H:%M:%S %z %Y",  # Twitter API v1 created_at
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+    "%m/%d/%Y",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y",
+    "%d-%m-%Y %H:%M",
+    "%b %d, %Y %H:%M",
+)
+# Formats whose day/month order differs from dateutil's month-first reading
+DAY_FIRST_FORMATS = frozenset(fmt for fmt in CANDIDATE_FORMATS if fmt.startswith("%d"))
+FORMAT_SAMPLE_SIZE = 200
+FUZZY_CACHE_SIZE = 65536
+_MISSING = {"", "nan", "none", "nat", "null"}
+
 def _clean_timezone_parts(s):
     if not isinstance(s, str):
         return s
@@ -39,3 +68,88 @@ def parse_datetime_safe(s):
         fallback = re.sub(r'[A-Za-z]{2,6}$', '', text).strip()
         dt = parser.parse(fallback, fuzzy=True)
         return dt
+
+def infer_datetime_format(sample):
+    """Return the candidate format that parses the most sample values (None if none parse)."""
+    sample = pd.Series(list(sample), dtype=object)
+    if sample.empty:
+        return None
+    best, best_hits = None, 0
+    for fmt in CANDIDATE_FORMATS:
+        parsed = _strptime(sample, fmt)
+        hits = int(parsed.notna().sum()) if parsed is not None else 0
+        if hits > best_hits:
+            best, best_hits = fmt, hits
+            if hits == len(sample):
+                break
+    return best
+
+def _strptime(values, fmt):
+    """
+    pd.to_datetime with one format, as naive wall-clock times (timezone dropped, local
+    time kept, as the row-wise parser's callers group on). Returns None when the values
+    mix UTC offsets, which pandas cannot hold in one column; those rows go the fuzzy route.
+    """
+    try:
+        parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+    except ValueError:
+        return None
+    if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+        return parsed.dt.tz_localize(None)
+    if not pd.api.types.is_datetime64_any_dtype(parsed):
+        return None
+    return parsed
+
+@lru_cache(maxsize=FUZZY_CACHE_SIZE)
+def parse_datetime_cached(text):
+    """parse_datetime_safe memoized per raw string, as a naive wall-clock Timestamp (NaT on failure)."""
+    try:
+        ts = pd.Timestamp(parse_datetime_safe(text))
+    except Exception:
+        return pd.NaT
+    return ts.tz_localize(None) if ts.tzinfo is not None else ts
+
+def _split_missing(values):
+    raw = pd.Series(values, dtype=object).astype(str).str.strip()
+    return raw, raw[~raw.str.lower().isin(_MISSING)]
+
+def infer_column_format(values, sample_size=FORMAT_SAMPLE_SIZE):
+    """
+    Format for parse_datetime_series(fmt=...), inferred from a sample of the column's
+    distinct values; "mixed" when no candidate fits, meaning every row is parsed alone.
+    Infer once per file and pass the result to every chunk, so all chunks agree.
+    """
+    _, present = _split_missing(values)
+    return infer_datetime_format(present.drop_duplicates().head(sample_size)) or "mixed"
+
+def parse_datetime_series(values, sample_size=FORMAT_SAMPLE_SIZE, fmt=None):
+    """
+    Vectorized parse_datetime_safe for a column of raw strings.
+
+    The whole column is converted with one pd.to_datetime call using fmt (inferred
+    from a sample of distinct values when None); only rows that fail it go through
+    the fuzzy parser, once per distinct raw string. With a day-first format, dates
+    whose day could also be a month go to the fuzzy parser too, so results always
+    match the row-wise parser. Returns naive datetimes (NaT where unparseable),
+    keeping each value's own wall-clock time like the row-wise parser.
+    """
+    raw, present = _split_missing(values)
+    parsed = pd.Series(pd.NaT, index=raw.index, dtype="datetime64[ns]")
+    if present.empty:
+        return parsed
+
+    if fmt is None:
+        fmt = infer_column_format(present, sample_size)
+    if fmt != "mixed":
+        fast = _strptime(present, fmt)
+        if fast is not None:
+            if fmt in DAY_FIRST_FORMATS:
+                # dateutil reads "01/02/2024" as 2 January; leave those to it
+                fast = fast.where(fast.dt.day > 12)
+            parsed.loc[present.index] = fast
+
+    failed = present[parsed.loc[present.index].isna()]
+    if not failed.empty:
+        fallback = {text: parse_datetime_cached(text) for text in failed.unique()}
+        parsed.loc[failed.index] = failed.map(fallback)
+    return parsed